@@ -0,0 +1,97 @@
+import typer
+from dotenv import load_dotenv
+
+from db.miner_db import MinerDBManager
+from db.partitions import PartitionMaintainer
+from utils.config import get_partition_retention_months
+
+load_dotenv()
+
+app = typer.Typer()
+
+@app.command("migrate")
+def migrate():
+    """Apply pending schema migrations to the miner database."""
+    db_manager = MinerDBManager()
+    applied = db_manager.migrate()
+    print(f'Applied migrations: {applied}' if applied else 'Schema is up to date')
+
+@app.command("index-report")
+def index_report(
+    table: str = typer.Option(None, help="Only report indexes on this table"),
+):
+    """Print index usage and bloat for the miner database."""
+    db_manager = MinerDBManager()
+    print(f"{'table':<20} {'index':<40} {'scans':>12} {'size (MB)':>10} {'bloat %':>8} valid")
+    for row in db_manager.index_report():
+        if table is not None and row['table_name'] != table:
+            continue
+        bloat = '-' if row['bloat_percent'] is None else f"{row['bloat_percent']:.1f}"
+        print(f"{row['table_name']:<20} {row['index_name']:<40} {row['idx_scan']:>12} {row['size_bytes'] / 2**20:>10.1f} {bloat:>8} {row['is_valid']}")
+
+@app.command("enable-timescale")
+def enable_timescale(
+    compress_after_days: int = typer.Option(None, help="Compress chunks older than this many days [default: POSTGRES_MINER_COMPRESS_AFTER_DAYS]"),
+):
+    """Convert metric and event tables into compressed TimescaleDB hypertables."""
+    db_manager = MinerDBManager()
+    db_manager.enable_timescale(compress_after_days)
+    compression_report()
+
+@app.command("enable-partitioning")
+def enable_partitioning():
+    """Range-partition the event tables by block number."""
+    db_manager = MinerDBManager()
+    db_manager.enable_partitioning()
+
+@app.command("maintain-partitions")
+def maintain_partitions():
+    """Create upcoming event partitions and archive those past POSTGRES_MINER_PARTITION_RETENTION_MONTHS."""
+    db_manager = MinerDBManager()
+    maintainer = PartitionMaintainer(db_manager.engine, get_partition_retention_months())
+    maintainer.run_once()
+
+@app.command("compression-report")
+def compression_report():
+    """Print hypertable chunk counts and compression ratios."""
+    db_manager = MinerDBManager()
+    print(f"{'table':<20} {'chunks':>8} {'compressed':>10} {'before (MB)':>12} {'after (MB)':>12}")
+    for row in db_manager.compression_report():
+        before = (row['before_compression_total_bytes'] or 0) / 2**20
+        after = (row['after_compression_total_bytes'] or 0) / 2**20
+        print(f"{row['table_name']:<20} {row['total_chunks']:>8} {row['number_compressed_chunks']:>10} {before:>12.1f} {after:>12.1f}")
+
+@app.command("rebuild-rollups")
+def rebuild_rollups(
+    since: int = typer.Option(0, help="Unix timestamp to rebuild from [default: all history]"),
+):
+    """Backfill the pool and token metric rollups from the raw 5-minute rows."""
+    db_manager = MinerDBManager()
+    db_manager.rebuild_rollups(since)
+
+@app.command("rebuild-snapshots")
+def rebuild_snapshots():
+    """Recompute current_pool_metrics and current_token_metrics from the raw metric tables."""
+    db_manager = MinerDBManager()
+    db_manager.rebuild_current_metrics()
+
+@app.command("backfill-numeric")
+def backfill_numeric(
+    batch_size: int = typer.Option(50000, help="Event ids per transaction"),
+    pause: float = typer.Option(0.0, help="Seconds to sleep between batches to limit load"),
+):
+    """Decode hex event amounts into the NUMERIC and decimal-adjusted columns."""
+    db_manager = MinerDBManager()
+    db_manager.backfill_numeric(batch_size, pause)
+
+@app.command("backfill-log-index")
+def backfill_log_index(
+    batch_size: int = typer.Option(1000, help="Blocks per transaction"),
+    pause: float = typer.Option(0.0, help="Seconds to sleep between batches to limit load"),
+):
+    """Deduplicate events stored before log_index existed, number them and make log_index NOT NULL."""
+    db_manager = MinerDBManager()
+    db_manager.backfill_log_index(batch_size, pause)
+
+if __name__ == "__main__":
+    app()
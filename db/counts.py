@@ -0,0 +1,194 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from typing import Hashable, List, Tuple
+
+from utils.log import log
+
+DAY = 60 * 60 * 24
+
+# exact: count(*) cached until the data behind it changes.
+# estimate: the planner's row estimate, falling back to an exact count for small results.
+# counter: per-pool per-day event counters kept by triggers, exact and independent of range size.
+COUNT_MODES = ['exact', 'estimate', 'counter']
+
+# Below this many estimated rows an exact count is cheap enough to run instead.
+ESTIMATE_THRESHOLD = 10000
+
+# Per event table, the rows counted by seeding rather than by the trigger: ids up to
+# high_water_id existed before the trigger; those up to seeded_id are counted already.
+POOL_EVENT_COUNT_SEEDS_TABLE = """
+CREATE TABLE IF NOT EXISTS pool_event_count_seeds (
+    table_name VARCHAR PRIMARY KEY,
+    high_water_id BIGINT NOT NULL,
+    seeded_id BIGINT NOT NULL
+)
+"""
+
+# Run in the transaction that creates the trigger, so every later row has a larger id and is counted by it.
+RECORD_POOL_EVENT_COUNT_SEED = """
+INSERT INTO pool_event_count_seeds (table_name, high_water_id, seeded_id)
+SELECT '{table}', coalesce(max(id), 0), coalesce(min(id), 1) - 1 FROM {table}
+ON CONFLICT (table_name) DO NOTHING
+"""
+
+# Adds the rows of one id range to the counters. They are locked until the batch commits, so a
+# concurrent delete either waits for it and is then decremented by the trigger, or lands first
+# and the row is never counted.
+SEED_POOL_EVENT_COUNTS = """
+WITH seeded AS (
+    SELECT pool_address, timestamp FROM {table} WHERE id > :start_id AND id <= :end_id FOR KEY SHARE
+)
+INSERT INTO pool_event_counts AS c (table_name, pool_address, day, event_count)
+SELECT '{table}', pool_address, timestamp - timestamp % 86400, count(*)
+FROM seeded
+GROUP BY pool_address, timestamp - timestamp % 86400
+ON CONFLICT (table_name, pool_address, day) DO UPDATE SET event_count = c.event_count + EXCLUDED.event_count
+"""
+
+def seed_pool_event_counts(engine: Engine, tables: List[str], batch_size: int = 100000, pause: float = 0.0) -> None:
+    """
+    Count the rows that predate the counter trigger, one id range per transaction.
+
+    Progress is stored in pool_event_count_seeds, so an interrupted run resumes where it stopped.
+    """
+    for table in tables:
+        with engine.connect() as connection:
+            seed = connection.execute(
+                text('SELECT high_water_id, seeded_id FROM pool_event_count_seeds WHERE table_name = :table'), {'table': table}
+            ).first()
+        if seed is None:
+            continue
+        high_water_id, seeded_id = seed
+        started = time.time()
+        while seeded_id < high_water_id:
+            end_id = min(seeded_id + batch_size, high_water_id)
+            with engine.begin() as connection:
+                connection.execute(text(SEED_POOL_EVENT_COUNTS.format(table=table)), {'start_id': seeded_id, 'end_id': end_id})
+                connection.execute(
+                    text('UPDATE pool_event_count_seeds SET seeded_id = :seeded_id WHERE table_name = :table'),
+                    {'seeded_id': end_id, 'table': table},
+                )
+            seeded_id = end_id
+            if pause:
+                time.sleep(pause)
+        # Every row is counted now; from here on the trigger alone keeps the counters.
+        with engine.begin() as connection:
+            connection.execute(text('DELETE FROM pool_event_count_seeds WHERE table_name = :table'), {'table': table})
+            connection.execute(text('DELETE FROM pool_event_counts WHERE table_name = :table AND event_count <= 0'), {'table': table})
+        log(f'Seeded {table} event counts up to id {high_water_id} in {time.time() - started:.1f}s')
+
+class CountCache:
+    """Exact counts keyed by query parameters and a freshness token, evicted by TTL, size or pool."""
+    def __init__(self, ttl: int = 300, max_entries: int = 4096) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            count, expires_at, _ = entry
+            if expires_at < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return count
+
+    def put(self, key: Hashable, count: int, pool_address: str = None) -> None:
+        with self.lock:
+            self.entries[key] = (count, time.time() + self.ttl, pool_address)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, pool_address: str = None) -> None:
+        """Drop cached counts for one pool, or every cached count when pool_address is None."""
+        with self.lock:
+            if pool_address is None:
+                self.entries.clear()
+                return
+            for key in [key for key, entry in self.entries.items() if entry[2] == pool_address]:
+                del self.entries[key]
+
+class CountService:
+    """Totals for paged endpoints; every count returns (count, is_exact)."""
+    def __init__(self, cache: CountCache = None, estimate_threshold: int = ESTIMATE_THRESHOLD) -> None:
+        self.cache = cache or CountCache()
+        self.estimate_threshold = estimate_threshold
+        # Event tables whose counters cover every row; seeding only ever happens once per table.
+        self.seeded_tables = set()
+
+    def count(self, session, query, mode: str, key: Hashable, pool_address: str = None) -> Tuple[int, bool]:
+        """
+        Count the rows of query.
+
+        key must identify both the query parameters and the state of the data behind it, e.g. the
+        newest timestamp stored for the pool, so fresh ingestion never serves a stale cached count.
+        Modes without a counter for this query fall back to the planner estimate.
+        """
+        if mode not in COUNT_MODES:
+            mode = 'exact'
+        if mode != 'exact':
+            estimate = self.estimate(session, query)
+            if estimate >= self.estimate_threshold:
+                return estimate, False
+        count = self.cache.get(key)
+        if count is None:
+            count = query.order_by(None).count()
+            self.cache.put(key, count, pool_address)
+        return count, True
+
+    def count_events(self, session, query, table: str, pool_address: str, start_timestamp: int, end_timestamp: int, mode: str, key: Hashable) -> Tuple[int, bool]:
+        """Count one pool's events in [start_timestamp, end_timestamp], using the per-day counters in counter mode."""
+        if mode != 'counter':
+            return self.count(session, query, mode, key, pool_address)
+        if not self.counters_seeded(session, table):
+            # The counters still miss rows that predate the trigger.
+            return self.count(session, query, 'estimate', key, pool_address)
+        return self.counter(session, table, pool_address, start_timestamp, end_timestamp), True
+
+    def counters_seeded(self, session, table: str) -> bool:
+        """Whether pool_event_counts covers every row of table, i.e. its seeding has finished."""
+        if table not in self.seeded_tables:
+            pending = session.execute(
+                text('SELECT count(*) > 0 FROM pool_event_count_seeds WHERE table_name = :table'), {'table': table}
+            ).scalar()
+            if pending:
+                return False
+            self.seeded_tables.add(table)
+        return True
+
+    @staticmethod
+    def counter(session, table: str, pool_address: str, start_timestamp: int, end_timestamp: int) -> int:
+        # Whole days come from pool_event_counts; only the partial days at either edge are counted row by row.
+        first_day = -(-start_timestamp // DAY) * DAY
+        end_day = (end_timestamp + 1) // DAY * DAY
+        count_rows = text(
+            f'SELECT count(*) FROM {table} WHERE pool_address = :pool_address AND timestamp >= :start AND timestamp < :end'
+        )
+        if first_day >= end_day:
+            return session.execute(count_rows, {'pool_address': pool_address, 'start': start_timestamp, 'end': end_timestamp + 1}).scalar()
+        full_days = session.execute(
+            text('SELECT coalesce(sum(event_count), 0) FROM pool_event_counts '
+                 'WHERE table_name = :table AND pool_address = :pool_address AND day >= :first_day AND day < :end_day'),
+            {'table': table, 'pool_address': pool_address, 'first_day': first_day, 'end_day': end_day},
+        ).scalar()
+        head = session.execute(count_rows, {'pool_address': pool_address, 'start': start_timestamp, 'end': first_day}).scalar()
+        tail = session.execute(count_rows, {'pool_address': pool_address, 'start': end_day, 'end': end_timestamp + 1}).scalar()
+        return int(full_days) + head + tail
+
+    @staticmethod
+    def estimate(session, query) -> int:
+        """Return the planner's estimated row count for query without running it."""
+        statement = query.order_by(None).statement.compile(dialect=session.bind.dialect, compile_kwargs={'literal_binds': True})
+        plan = session.execute(text(f'EXPLAIN (FORMAT JSON) {statement}')).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
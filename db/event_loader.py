@@ -0,0 +1,122 @@
+import csv
+import io
+import time
+from collections import defaultdict
+from sqlalchemy.engine import Engine
+from typing import Dict, List, Union
+
+from utils.log import log
+from db.event_numeric import numeric_assignments
+
+# Columns shared by every event table, followed by the fields of each event type's "data" payload.
+COMMON_COLUMNS = ['transaction_hash', 'pool_address', 'block_number', 'log_index', 'timestamp']
+EVENT_COLUMNS = {
+    'swap': ['sender', 'to', 'amount0', 'amount1', 'sqrt_price_x96', 'liquidity', 'tick'],
+    'mint': ['sender', 'owner', 'tick_lower', 'tick_upper', 'amount', 'amount0', 'amount1'],
+    'burn': ['owner', 'tick_lower', 'tick_upper', 'amount', 'amount0', 'amount1'],
+    'collect': ['owner', 'recipient', 'tick_lower', 'tick_upper', 'amount0', 'amount1'],
+}
+
+# Replays are deduplicated on this key; block_number is included because unique indexes on
+# hypertables and partitioned tables must contain the partitioning column.
+EVENT_KEY = ['block_number', 'transaction_hash', 'log_index']
+
+def quote(columns: List[str], source: str = None) -> str:
+    prefix = f'{source}.' if source else ''
+    return ', '.join(f'{prefix}"{column}"' for column in columns)
+
+# Hex amounts are decoded, and scaled by the pool's token decimals, on the way out of staging.
+MERGE_EVENTS = """
+WITH inserted AS (
+    INSERT INTO {table} ({columns}, {numeric_columns})
+    SELECT DISTINCT ON ({key}) {staged_columns}, {numeric_expressions}
+    FROM {staging} e
+    LEFT JOIN token_pairs p ON p.pool = e.pool_address
+    LEFT JOIN tokens t0 ON t0.address = p.token0
+    LEFT JOIN tokens t1 ON t1.address = p.token1
+    ON CONFLICT ({conflict_key}) DO NOTHING
+    RETURNING pool_address, timestamp
+), counts AS (
+    INSERT INTO pool_event_counts AS c (table_name, pool_address, day, event_count)
+    SELECT '{table}', pool_address, timestamp - timestamp % 86400, count(*) FROM inserted
+    GROUP BY pool_address, timestamp - timestamp % 86400
+    ON CONFLICT (table_name, pool_address, day) DO UPDATE SET event_count = c.event_count + EXCLUDED.event_count
+)
+SELECT count(*) FROM inserted
+"""
+
+def event_rows(pool_events: Union[Dict, List[Dict]]) -> Dict[str, List[list]]:
+    """
+    Flatten fetcher output into rows per event table.
+
+    Events without a log index get their ordinal among same-type events of the same pool in the
+    transaction, which is stable as long as whole blocks are fetched.
+    """
+    if isinstance(pool_events, dict):
+        pool_events = pool_events.get('data', [])
+    rows = defaultdict(list)
+    ordinals = defaultdict(int)
+    for event in pool_events:
+        event_type = event['event']['type']
+        data = event['event']['data']
+        log_index = event.get('log_index')
+        if log_index is None:
+            ordinal_key = (event['transaction_hash'], event['pool_address'], event_type)
+            log_index = ordinals[ordinal_key]
+            ordinals[ordinal_key] += 1
+        rows[f'{event_type}_event'].append(
+            [event['transaction_hash'], event['pool_address'], event['block_number'], log_index, event['timestamp']]
+            + [data[column] for column in EVENT_COLUMNS[event_type]]
+        )
+    return rows
+
+class EventLoader:
+    """Streams pool events into the event tables with COPY and an idempotent merge."""
+    def __init__(self, engine: Engine, batch_size: int = 100000) -> None:
+        self.engine = engine
+        self.batch_size = batch_size
+
+    def load(self, pool_events: Union[Dict, List[Dict]]) -> Dict[str, int]:
+        """Load events returned by get_pool_events_by_pool_addresses and return the new rows per table."""
+        inserted = {}
+        for table, rows in event_rows(pool_events).items():
+            inserted[table] = 0
+            for start in range(0, len(rows), self.batch_size):
+                inserted[table] += self.load_batch(table, rows[start:start + self.batch_size])
+        return inserted
+
+    def load_batch(self, table: str, rows: List[list]) -> int:
+        columns = COMMON_COLUMNS + EVENT_COLUMNS[table[:-len('_event')]]
+        staging = f'staging_{table}'
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+
+        started = time.time()
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                f'CREATE TEMP TABLE IF NOT EXISTS {staging} ON COMMIT DELETE ROWS AS '
+                f'SELECT {quote(columns)} FROM {table} WITH NO DATA'
+            )
+            # The merge maintains pool_event_counts for the whole batch, so skip the per-row counter trigger.
+            cursor.execute("SET LOCAL velora.bulk_load = 'on'")
+            cursor.copy_expert(f'COPY {staging} ({quote(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+            numeric = numeric_assignments(table)
+            cursor.execute(MERGE_EVENTS.format(
+                table=table, staging=staging, columns=quote(columns), staged_columns=quote(columns, 'e'),
+                key=quote(EVENT_KEY, 'e'), conflict_key=quote(EVENT_KEY),
+                numeric_columns=', '.join(numeric), numeric_expressions=', '.join(numeric.values()),
+            ))
+            inserted = cursor.fetchone()[0]
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+        elapsed = max(time.time() - started, 1e-6)
+        log(f'Loaded {len(rows)} {table} rows ({inserted} new) at {len(rows) / elapsed:.0f} rows/s')
+        return inserted
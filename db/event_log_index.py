@@ -0,0 +1,80 @@
+import time
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from utils.log import log
+from db.event_loader import EVENT_COLUMNS
+from db.miner_migrations import EVENT_TABLES, LOCK_TIMEOUT, is_hypertable, partitions_of
+
+def dedupe_events_sql(table: str) -> str:
+    # Rows equal in every column but id and log_index are replays of the same log. Only rows without a
+    # log index are dropped: the copy that has one, or else the oldest copy, is kept.
+    columns = ['transaction_hash', 'pool_address', 'block_number', 'timestamp'] + EVENT_COLUMNS[table[:-len('_event')]]
+    matches = ' AND '.join(f't."{column}" = d."{column}"' for column in columns)
+    return (
+        f'DELETE FROM {table} t USING {table} d '
+        f'WHERE t.block_number >= :start_block AND t.block_number < :end_block AND t.log_index IS NULL '
+        f'AND t.id <> d.id AND (d.log_index IS NOT NULL OR t.id > d.id) AND {matches}'
+    )
+
+def backfill_log_index_sql(table: str) -> str:
+    # Matches the event loader's fallback when the fetcher gives no log index. All logs of a transaction
+    # share its block, so a block range always covers whole transactions.
+    return (
+        f'UPDATE {table} e SET log_index = o.ordinal FROM ('
+        f'SELECT id, row_number() OVER (PARTITION BY transaction_hash, pool_address ORDER BY id) - 1 AS ordinal '
+        f'FROM {table} WHERE block_number >= :start_block AND block_number < :end_block AND log_index IS NULL) o '
+        f'WHERE e.id = o.id AND NOT EXISTS ('
+        f'SELECT 1 FROM {table} x WHERE x.block_number = e.block_number AND x.transaction_hash = e.transaction_hash '
+        f'AND x.log_index = o.ordinal)'
+    )
+
+def require_log_index(engine: Engine, table: str) -> None:
+    """
+    Make log_index NOT NULL so every row is covered by the unique (block_number, transaction_hash, log_index) index.
+
+    A validated CHECK lets SET NOT NULL skip its full scan under the exclusive lock; the check is
+    validated first under a lock that lets writes continue. Hypertables are altered directly.
+    """
+    with engine.connect() as connection:
+        if connection.execute(text(f'SELECT count(*) > 0 FROM {table} WHERE log_index IS NULL')).scalar():
+            log(f'{table} still has rows without a log index, leaving the column nullable')
+            return
+        relations = [] if is_hypertable(connection, table) else partitions_of(connection, table) or [table]
+    for relation in relations:
+        with engine.begin() as connection:
+            connection.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+            connection.execute(text(f'ALTER TABLE {relation} DROP CONSTRAINT IF EXISTS {relation}_log_index_not_null'))
+            connection.execute(text(f'ALTER TABLE {relation} ADD CONSTRAINT {relation}_log_index_not_null CHECK (log_index IS NOT NULL) NOT VALID'))
+        with engine.begin() as connection:
+            connection.execute(text(f'ALTER TABLE {relation} VALIDATE CONSTRAINT {relation}_log_index_not_null'))
+    with engine.begin() as connection:
+        connection.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        connection.execute(text(f'ALTER TABLE {table} ALTER COLUMN log_index SET NOT NULL'))
+        for relation in relations:
+            connection.execute(text(f'ALTER TABLE {relation} DROP CONSTRAINT {relation}_log_index_not_null'))
+    log(f'{table}.log_index is NOT NULL')
+
+def backfill_log_index(engine: Engine, batch_size: int = 1000, pause: float = 0.0) -> None:
+    """
+    Drop replayed copies of events stored before log_index existed and number the remaining ones.
+
+    Runs in short block-range transactions so ingestion and reads continue while it works; deleted
+    copies are taken off pool_event_counts by the counter trigger. Once no row lacks a log index the
+    column is made NOT NULL.
+    """
+    for table in EVENT_TABLES:
+        with engine.connect() as connection:
+            min_block, max_block = connection.execute(text(f'SELECT min(block_number), max(block_number) FROM {table}')).first()
+        if min_block is not None:
+            started = time.time()
+            deleted = updated = 0
+            for start_block in range(min_block, max_block + 1, batch_size):
+                blocks = {'start_block': start_block, 'end_block': start_block + batch_size}
+                with engine.begin() as connection:
+                    deleted += connection.execute(text(dedupe_events_sql(table)), blocks).rowcount
+                    updated += connection.execute(text(backfill_log_index_sql(table)), blocks).rowcount
+                if pause:
+                    time.sleep(pause)
+            log(f'Removed {deleted} duplicate and numbered {updated} {table} rows in {time.time() - started:.0f}s')
+        require_log_index(engine, table)
@@ -0,0 +1,81 @@
+import time
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from utils.log import log
+
+# Hex-encoded U256/I256 event fields and whether each is two's-complement signed.
+# Each gets a decoded NUMERIC(78,0) column named <field>_value.
+NUMERIC_FIELDS = {
+    'swap_event': [('amount0', True), ('amount1', True), ('sqrt_price_x96', False), ('liquidity', False)],
+    'mint_event': [('amount', False), ('amount0', False), ('amount1', False)],
+    'burn_event': [('amount', False), ('amount0', False), ('amount1', False)],
+    'collect_event': [('amount0', False), ('amount1', False)],
+}
+
+# Same semantics as signed_hex_to_int / unsigned_hex_to_int: the sign bit is the top bit of the hex string as given.
+HEX_TO_NUMERIC = """
+CREATE OR REPLACE FUNCTION hex_to_numeric(hex text, signed boolean DEFAULT false) RETURNS numeric AS $$
+DECLARE
+    digits text := lower(regexp_replace(hex, '^0x', ''));
+    width integer := length(digits);
+    result numeric := 0;
+    i integer;
+BEGIN
+    IF hex IS NULL THEN
+        RETURN NULL;
+    END IF;
+    -- Decode 32 bits at a time; a 256-bit value takes eight steps.
+    digits := lpad(digits, (width + 7) / 8 * 8, '0');
+    FOR i IN 0 .. length(digits) / 8 - 1 LOOP
+        result := result * 4294967296 + ('x' || substr(digits, i * 8 + 1, 8))::bit(32)::bigint;
+    END LOOP;
+    IF signed AND width > 0 AND substr(digits, length(digits) - width + 1, 1) >= '8' THEN
+        result := result - 16::numeric ^ width;
+    END IF;
+    RETURN result;
+END
+$$ LANGUAGE plpgsql IMMUTABLE
+"""
+
+def numeric_assignments(table: str, source: str = 'e') -> dict:
+    """Decoded and decimal-adjusted column expressions for one event table, keyed by target column."""
+    assignments = {}
+    for field, signed in NUMERIC_FIELDS[table]:
+        assignments[f'{field}_value'] = f"hex_to_numeric({source}.{field}, {'true' if signed else 'false'})"
+    for token in ['0', '1']:
+        signed = dict(NUMERIC_FIELDS[table])[f'amount{token}']
+        assignments[f'amount{token}_adjusted'] = (
+            f"(hex_to_numeric({source}.amount{token}, {'true' if signed else 'false'}) / (10::numeric ^ t{token}.decimals))::double precision"
+        )
+    return assignments
+
+def backfill_sql(table: str) -> str:
+    assignments = ', '.join(f'{column} = {expression}' for column, expression in numeric_assignments(table).items())
+    return (
+        f'UPDATE {table} e SET {assignments} '
+        f'FROM token_pairs p JOIN tokens t0 ON t0.address = p.token0 JOIN tokens t1 ON t1.address = p.token1 '
+        f'WHERE p.pool = e.pool_address AND e.id >= :start_id AND e.id < :end_id '
+        f'AND (e.{NUMERIC_FIELDS[table][0][0]}_value IS NULL OR e.amount0_adjusted IS NULL)'
+    )
+
+def backfill_numeric(engine: Engine, batch_size: int = 50000, pause: float = 0.0) -> None:
+    """
+    Decode hex amounts of existing events into the numeric columns.
+
+    Runs in short id-range transactions so ingestion and reads continue while it works; events
+    whose pool or tokens are not synced yet are skipped and picked up by a later run.
+    """
+    for table in NUMERIC_FIELDS:
+        with engine.connect() as connection:
+            min_id, max_id = connection.execute(text(f'SELECT min(id), max(id) FROM {table}')).first()
+        if min_id is None:
+            continue
+        started = time.time()
+        updated = 0
+        for start_id in range(min_id, max_id + 1, batch_size):
+            with engine.begin() as connection:
+                updated += connection.execute(text(backfill_sql(table)), {'start_id': start_id, 'end_id': start_id + batch_size}).rowcount
+            if pause:
+                time.sleep(pause)
+        log(f'Backfilled {updated} {table} rows in {time.time() - started:.0f}s')
@@ -1,10 +1,25 @@
-from sqlalchemy import create_engine, Column, Date, Boolean, MetaData, Table, String, Integer, Float, inspect, func, desc, asc, desc, and_
+from sqlalchemy import create_engine, cast, null, literal_column, Column, Date, Boolean, MetaData, Table, String, Integer, Float, Numeric, LargeBinary, inspect, func, desc, asc, desc, and_, select, true, tuple_
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, aliased
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+import struct
+import time
 from typing import Union, List, Dict
-from utils.config import get_postgres_miner_url
+from utils.config import get_postgres_miner_url, get_miner_storage_mode, get_timescale_compress_after_days, get_partition_retention_months
 from utils.utils import has_stablecoin
-from utils.helpers import get_seconds_from_period
+from utils.helpers import get_seconds_from_period, encode_cursor, decode_cursor
+from utils.merkle import MerkleTree, canonical_leaf, leaf_sort_key
+from utils.log import log
+from db.miner_migrations import apply_migrations, migration_completed, index_report, MigrationRunner, ROLLUP_MIGRATION
+from db.timescale import enable_timescale, missing_hypertables, compression_report
+from db.rollups import get_rollup_resolution, rebuild_rollups
+from db.snapshots import rebuild_snapshots
+from db.counts import CountService
+from db.event_loader import EventLoader
+from db.event_numeric import backfill_numeric
+from db.event_log_index import backfill_log_index
+from db.partitions import partition_table, PartitionMaintainer
 
 from datetime import datetime
 
@@ -14,7 +29,8 @@ class BaseTable(Base):
     __abstract__ = True
     
     def to_dict(self):
-        return {column.name: getattr(self, column.name) for column in self.__table__.columns}
+        # Derived columns duplicate stored fields in another encoding and stay off the wire.
+        return {column.name: getattr(self, column.name) for column in self.__table__.columns if not column.info.get('derived')}
 
 # Define the timetable table
 class Timetable(BaseTable):
@@ -42,6 +58,7 @@ class SwapEventTable(BaseTable):
     transaction_hash = Column(String, nullable=False)
     pool_address = Column(String, nullable=False)
     block_number = Column(Integer, nullable=False)
+    log_index = Column(Integer, nullable=False)  # position of the log in its block, or its ordinal within the transaction
     timestamp = Column(Integer, nullable=False)
     sender = Column(String, nullable=False)
     to = Column(String, nullable=False)
@@ -50,6 +67,12 @@ class SwapEventTable(BaseTable):
     sqrt_price_x96 = Column(String, nullable=False)  # U256 can be stored as String
     liquidity = Column(String, nullable=False)  # U256 can be stored as String
     tick = Column(Integer, nullable=False)  # i32 can be stored as Integer
+    amount0_value = Column(Numeric(78, 0), info={'derived': True})  # decoded amount0
+    amount1_value = Column(Numeric(78, 0), info={'derived': True})  # decoded amount1
+    sqrt_price_x96_value = Column(Numeric(78, 0), info={'derived': True})  # decoded sqrt_price_x96
+    liquidity_value = Column(Numeric(78, 0), info={'derived': True})  # decoded liquidity
+    amount0_adjusted = Column(Float, info={'derived': True})  # amount0 / 10 ** token0 decimals
+    amount1_adjusted = Column(Float, info={'derived': True})  # amount1 / 10 ** token1 decimals
 
 class MintEventTable(BaseTable):
     __tablename__ = 'mint_event'
@@ -57,6 +80,7 @@ class MintEventTable(BaseTable):
     transaction_hash = Column(String, nullable=False)
     pool_address = Column(String, nullable=False)
     block_number = Column(Integer, nullable=False)
+    log_index = Column(Integer, nullable=False)  # position of the log in its block, or its ordinal within the transaction
     timestamp = Column(Integer, nullable=False)
     sender = Column(String, nullable=False)
     owner = Column(String, nullable=False)
@@ -65,6 +89,11 @@ class MintEventTable(BaseTable):
     amount = Column(String, nullable=False)  # U256 can be stored as String
     amount0 = Column(String, nullable=False)  # U256 can be stored as String
     amount1 = Column(String, nullable=False)  # U256 can be stored as String
+    amount_value = Column(Numeric(78, 0), info={'derived': True})  # decoded amount
+    amount0_value = Column(Numeric(78, 0), info={'derived': True})  # decoded amount0
+    amount1_value = Column(Numeric(78, 0), info={'derived': True})  # decoded amount1
+    amount0_adjusted = Column(Float, info={'derived': True})  # amount0 / 10 ** token0 decimals
+    amount1_adjusted = Column(Float, info={'derived': True})  # amount1 / 10 ** token1 decimals
 
 class BurnEventTable(BaseTable):
     __tablename__ = 'burn_event'
@@ -72,6 +101,7 @@ class BurnEventTable(BaseTable):
     transaction_hash = Column(String, nullable=False)
     pool_address = Column(String, nullable=False)
     block_number = Column(Integer, nullable=False)
+    log_index = Column(Integer, nullable=False)  # position of the log in its block, or its ordinal within the transaction
     timestamp = Column(Integer, nullable=False)
     owner = Column(String, nullable=False)
     tick_lower = Column(Integer, nullable=False)  # int24 can be stored as Integer
@@ -79,6 +109,11 @@ class BurnEventTable(BaseTable):
     amount = Column(String, nullable=False)  # U256 can be stored as String
     amount0 = Column(String, nullable=False)  # U256 can be stored as String
     amount1 = Column(String, nullable=False)  # U256 can be stored as String
+    amount_value = Column(Numeric(78, 0), info={'derived': True})  # decoded amount
+    amount0_value = Column(Numeric(78, 0), info={'derived': True})  # decoded amount0
+    amount1_value = Column(Numeric(78, 0), info={'derived': True})  # decoded amount1
+    amount0_adjusted = Column(Float, info={'derived': True})  # amount0 / 10 ** token0 decimals
+    amount1_adjusted = Column(Float, info={'derived': True})  # amount1 / 10 ** token1 decimals
 
 class CollectEventTable(BaseTable):
     __tablename__ = 'collect_event'
@@ -86,6 +121,7 @@ class CollectEventTable(BaseTable):
     transaction_hash = Column(String, nullable=False)
     pool_address = Column(String, nullable=False)
     block_number = Column(Integer, nullable=False)
+    log_index = Column(Integer, nullable=False)  # position of the log in its block, or its ordinal within the transaction
     timestamp = Column(Integer, nullable=False)
     owner = Column(String, nullable=False)
     recipient = Column(String, nullable=False)
@@ -93,6 +129,28 @@ class CollectEventTable(BaseTable):
     tick_upper = Column(Integer, nullable=False)  # int24 can be stored as Integer
     amount0 = Column(String, nullable=False)  # U256 can be stored as String
     amount1 = Column(String, nullable=False)  # U256 can be stored as String
+    amount0_value = Column(Numeric(78, 0), info={'derived': True})  # decoded amount0
+    amount1_value = Column(Numeric(78, 0), info={'derived': True})  # decoded amount1
+    amount0_adjusted = Column(Float, info={'derived': True})  # amount0 / 10 ** token0 decimals
+    amount1_adjusted = Column(Float, info={'derived': True})  # amount1 / 10 ** token1 decimals
+
+class PoolEventCountTable(BaseTable):
+    __tablename__ = 'pool_event_counts'
+    table_name = Column(String, primary_key=True)
+    pool_address = Column(String, primary_key=True)
+    day = Column(Integer, primary_key=True)  # unix timestamp of the UTC day
+    event_count = Column(Integer, nullable=False)
+
+class PoolEventMerkleTreeTable(BaseTable):
+    __tablename__ = 'pool_event_merkle_trees'
+    pool_address = Column(String, primary_key=True)
+    start_block = Column(Integer, primary_key=True)
+    end_block = Column(Integer, primary_key=True)
+    leaf_count = Column(Integer, nullable=False)
+    root = Column(String, nullable=False)  # hex sha256
+    nodes = Column(LargeBinary, nullable=False)  # every tree level, leaves first, 32 bytes per node
+    leaf_refs = Column(LargeBinary, nullable=False)  # per leaf, packed (event table position, row id)
+    built_at = Column(Integer, nullable=False)
 
 class PoolMetricTable(BaseTable):
     __tablename__ = 'pool_metrics'
@@ -104,18 +162,53 @@ class PoolMetricTable(BaseTable):
     volume_token0 = Column(Float)
     volume_token1 = Column(Float)
 
+class PoolMetricRollupTable(BaseTable):
+    __tablename__ = 'pool_metrics_rollup'
+    resolution = Column(Integer, primary_key=True)  # bucket size in seconds
+    pool_address = Column(String, primary_key=True)
+    timestamp = Column(Integer, primary_key=True)  # bucket start
+    last_timestamp = Column(Integer, nullable=False)
+    price = Column(Float)  # last price in the bucket
+    high_price = Column(Float)
+    low_price = Column(Float)
+    liquidity_token0 = Column(Float)  # last value in the bucket
+    liquidity_token1 = Column(Float)
+    volume_token0 = Column(Float)  # running total at the end of the bucket
+    volume_token1 = Column(Float)
+    bucket_volume_token0 = Column(Float)  # volume traded within the bucket
+    bucket_volume_token1 = Column(Float)
+    sample_count = Column(Integer, nullable=False)
+
 class CurrentPoolMetricTable(BaseTable):
     __tablename__ = 'current_pool_metrics'
     pool_address = Column(String, primary_key=True)
+    timestamp = Column(Integer)
     price = Column(Float)
     liquidity_token0 = Column(Float)
     liquidity_token1 = Column(Float)
     volume_token0 = Column(Float)
     volume_token1 = Column(Float)
+    previous_timestamp = Column(Integer)
+    previous_price = Column(Float)
+    previous_liquidity_token0 = Column(Float)
+    previous_liquidity_token1 = Column(Float)
+    previous_volume_token0 = Column(Float)
+    previous_volume_token1 = Column(Float)
+    volume_token0_1day = Column(Float)
+    volume_token1_1day = Column(Float)
+    token0_address = Column(String)
+    token1_address = Column(String)
+    token0_symbol = Column(String)
+    token1_symbol = Column(String)
+    token0_price = Column(Float)
+    token1_price = Column(Float)
+    fee = Column(Integer)
 
 class CurrentTokenMetricTable(Base):
     __tablename__ = "current_token_metrics"
     token_address = Column(String, primary_key=True)
+    timestamp = Column(Integer)
+    symbol = Column(String)
     price = Column(Float)
     total_liquidity = Column(Float)
     total_volume = Column(Float)
@@ -138,14 +231,104 @@ class TokenMetricTable(Base):
     total_volume = Column(Float)
     total_liquidity = Column(Float)
 
+class TokenMetricRollupTable(BaseTable):
+    __tablename__ = 'token_metrics_rollup'
+    resolution = Column(Integer, primary_key=True)  # bucket size in seconds
+    token_address = Column(String, primary_key=True)
+    timestamp = Column(Integer, primary_key=True)  # bucket start
+    last_timestamp = Column(Integer, nullable=False)
+    close_price = Column(Float)
+    high_price = Column(Float)
+    low_price = Column(Float)
+    total_volume = Column(Float)
+    total_liquidity = Column(Float)
+    sample_count = Column(Integer, nullable=False)
+
+class TokenPriceTable(BaseTable):
+    __tablename__ = 'token_prices'
+    token_address = Column(String, primary_key=True)
+    timestamp = Column(Integer, primary_key=True)  # start of the 5-minute bucket
+    price = Column(Float, nullable=False)  # USD price chained along the token's route by the price oracle
+
+POOL_EVENT_TABLES = {'swap': SwapEventTable, 'mint': MintEventTable, 'burn': BurnEventTable, 'collect': CollectEventTable}
+# A Merkle leaf reference: the event table's position in POOL_EVENT_TABLES and the row id.
+LEAF_REF = struct.Struct('>BQ')
+
+def event_leaf(event_type: str, event) -> dict:
+    return {**dict(event._mapping), 'event_type': event_type}
+
+def seek_page(query, key_columns: list, page_limit: int, page_number: int, cursor: str = None, descending: bool = False, key_names: List[str] = None):
+    """
+    Fetch one page ordered by key_columns and the cursor pointing past its last row.
+
+    With a cursor the page starts right after the cursor's key, so any page costs the same as
+    the first; without one it falls back to offset paging by page_number.
+    """
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in key_columns])
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(key_columns):
+            raise Exception("Invalid cursor")
+        query = query.filter(tuple_(*key_columns) < tuple_(*values) if descending else tuple_(*key_columns) > tuple_(*values))
+    else:
+        query = query.offset(page_limit * (page_number - 1))
+    rows = query.limit(page_limit).all()
+    key_names = key_names or [column.key for column in key_columns]
+    next_cursor = encode_cursor([getattr(rows[-1], name) for name in key_names]) if rows and len(rows) == page_limit else None
+    return rows, next_cursor
+
+# Seconds between the raw pool_metrics and token_metrics rows.
+METRIC_INTERVAL = 300
+
+INTERVAL_AGGREGATES = {
+    'last': lambda column, timestamp_column: postgresql.array_agg(aggregate_order_by(column, timestamp_column.desc()))[1],
+    'max': lambda column, timestamp_column: func.max(column),
+    'min': lambda column, timestamp_column: func.min(column),
+}
+
+def interval_query(session, timestamp_column, origin: int, end_timestamp: int, interval: int, step: int, columns: list, filters: list):
+    """
+    Rows of a metrics table aggregated per interval window counted from origin, and the query's time column.
+
+    columns are (aggregate, name, column) with aggregate one of INTERVAL_AGGREGATES. When the
+    interval is the table's own step every row is a window of its own and is read as stored.
+    """
+    filters = [*filters, timestamp_column >= origin, timestamp_column <= end_timestamp]
+    if interval <= step:
+        query = session.query(timestamp_column, *[column.label(name) for _, name, column in columns]).filter(*filters)
+        return query, timestamp_column
+    # Literal integers, so the SELECT and GROUP BY expressions match without bind parameters.
+    window = timestamp_column - (timestamp_column - literal_column(str(int(origin)))) % literal_column(str(int(interval)))
+    windows = (
+        session.query(
+            window.label('timestamp'),
+            *[INTERVAL_AGGREGATES[aggregate](column, timestamp_column).label(name) for aggregate, name, column in columns],
+        )
+        .filter(*filters)
+        .group_by(window)
+        .subquery()
+    )
+    return session.query(windows), windows.c.timestamp
+
+def insert_tokens(session, tokens: List[Dict[str, Union[str, Integer]]]) -> None:
+    """Insert tokens deduplicated by address; relies on the unique index on tokens.address."""
+    rows = {}
+    for token in tokens:
+        rows.setdefault(token["address"], {"address": token["address"], "symbol": token["symbol"], "name": token["name"], "decimals": token["decimals"]})
+    if rows:
+        session.execute(postgresql.insert(TokenTable).on_conflict_do_nothing(index_elements=['address']), list(rows.values()))
+
 class MinerDBManager:
 
-    def __init__(self, url = get_postgres_miner_url()) -> None:
-        # Create the SQLAlchemy engine
-        self.engine = create_engine(url)
+    def __init__(self, url = get_postgres_miner_url(), storage_mode = get_miner_storage_mode(), pool_size: int = 5, max_overflow: int = 10) -> None:
+        # Create the SQLAlchemy engine; size the pool to the number of threads that query concurrently.
+        self.engine = create_engine(url, pool_size=pool_size, max_overflow=max_overflow, pool_pre_ping=True)
+        self.storage_mode = storage_mode
 
         # Create a configured "Session" class
         self.Session = sessionmaker(bind=self.engine)
+        self.counts = CountService()
+        self.rollups_complete = False
 
     def __enter__(self):
         self.session = self.Session()
@@ -154,6 +337,91 @@ class MinerDBManager:
     def __exit__(self, exc_type, exc_value, traceback):
         # Don't forget to close the session
         self.session.close()
+
+    def migrate(self, defer: bool = False, retry_interval: int = 10) -> List[int]:
+        """
+        Bring the schema up to date, building missing indexes without blocking writers.
+
+        With defer, as on miner startup, only the schema statements run here, retried until they get
+        their locks; index builds and backfills continue in self.migration_runner.
+        """
+        while True:
+            try:
+                Base.metadata.create_all(self.engine)
+                applied = apply_migrations(self.engine, defer=defer)
+                break
+            except Exception as e:
+                if not defer:
+                    raise
+                log(f'Applying migrations failed, retrying in {retry_interval}s: {e}')
+                time.sleep(retry_interval)
+        if defer:
+            self.migration_runner = MigrationRunner(self.engine)
+            self.migration_runner.start()
+        if self.storage_mode == 'timescale':
+            # Converting tables locks them for the whole data move, so it is left to `db.cli enable-timescale`.
+            missing = missing_hypertables(self.engine)
+            if missing:
+                log(f'POSTGRES_MINER_STORAGE_MODE is timescale but {", ".join(missing)} are not compressed hypertables yet; '
+                    f'run `python3 -m db.cli enable-timescale` in a maintenance window')
+        elif self.storage_mode == 'partitioned':
+            self.enable_partitioning()
+        return applied
+
+    def rollups_ready(self) -> bool:
+        """Whether the rollups cover the history; until their backfill finishes the metric APIs aggregate raw rows."""
+        if not self.rollups_complete:
+            self.rollups_complete = migration_completed(self.engine, ROLLUP_MIGRATION)
+        return self.rollups_complete
+
+    def enable_partitioning(self) -> None:
+        """Range-partition the event tables by block number, reusing the existing rows and indexes."""
+        for table in [SwapEventTable, MintEventTable, BurnEventTable, CollectEventTable]:
+            partition_table(self.engine, table.__tablename__)
+
+    def start_partition_maintainer(self, interval: int = 60 * 60) -> PartitionMaintainer:
+        """Create upcoming event partitions and archive expired ones in a background thread."""
+        maintainer = PartitionMaintainer(self.engine, get_partition_retention_months(), interval)
+        maintainer.start()
+        return maintainer
+
+    def enable_timescale(self, compress_after_days: int = None) -> None:
+        """Store metrics and events as hypertables and compress chunks older than compress_after_days."""
+        if compress_after_days is None:
+            compress_after_days = get_timescale_compress_after_days()
+        enable_timescale(self.engine, compress_after_days)
+
+    def compression_report(self) -> List[Dict[str, Union[str, int]]]:
+        """Report hypertable chunk counts and sizes before and after compression."""
+        return compression_report(self.engine)
+
+    def rebuild_rollups(self, start_timestamp: int = 0) -> None:
+        """Recompute pool and token metric rollups from the raw rows since start_timestamp."""
+        rebuild_rollups(self.engine, start_timestamp)
+
+    def index_report(self) -> List[Dict[str, Union[str, int, float, bool]]]:
+        """Report index usage and estimated bloat for the miner tables."""
+        return index_report(self.engine)
+
+    def add_pool_events(self, pool_events: Union[Dict, List[Dict]]) -> Dict[str, int]:
+        """Bulk load events from get_pool_events_by_pool_addresses; replayed events are skipped."""
+        inserted = EventLoader(self.engine).load(pool_events)
+        pool_addresses = {event['pool_address'] for event in (pool_events.get('data', []) if isinstance(pool_events, dict) else pool_events)}
+        for pool_address in pool_addresses:
+            self.invalidate_counts(pool_address)
+        return inserted
+
+    def backfill_numeric(self, batch_size: int = 50000, pause: float = 0.0) -> None:
+        """Decode hex amounts of already stored events into the numeric and adjusted columns."""
+        backfill_numeric(self.engine, batch_size, pause)
+
+    def backfill_log_index(self, batch_size: int = 1000, pause: float = 0.0) -> None:
+        """Remove replayed events stored before log_index existed, number the rest and make the column NOT NULL."""
+        backfill_log_index(self.engine, batch_size, pause)
+
+    def invalidate_counts(self, pool_address: str = None) -> None:
+        """Drop cached totals after ingesting data for pool_address, or for every pool when it is None."""
+        self.counts.cache.invalidate(pool_address)
     
     def add_timetable_entry(self, start: Date, end: Date) -> None:
         """Add a new timetable entry to the database."""
@@ -200,62 +468,34 @@ class MinerDBManager:
             return False
         
     def add_tokens(self, tokens: List[Dict[str, Union[str, Integer]]]) -> None:
-        """Add tokens to the corresponding table."""
+        """Add tokens to the corresponding table, skipping addresses that are already stored."""
         with self.Session() as session:
-            for token in tokens:
-                exists = (
-                    session.query(TokenTable)
-                    .filter_by(address=token["address"])
-                    .first()
-                )
-                if not exists:
-                    new_token = TokenTable(
-                        address=token["address"],
-                        symbol=token["symbol"],
-                        name=token["name"],
-                        decimals=token["decimals"],
-                    )
-                    session.add(new_token)
+            insert_tokens(session, tokens)
             session.commit()
 
     def add_token_pairs(
         self, token_pairs: List[Dict[str, Union[str, Integer]]], timestamp: int
     ) -> None:
-        """Add token pairs to the corresponding table."""
+        """Add token pairs and their tokens in one transaction, skipping pools that are already stored."""
         with self.Session() as session:
-            try:
-                last_token_pair = session.query(TokenPairTable).order_by(TokenPairTable.block_number.desc()).first()
-                last_block_number = last_token_pair.block_number
-                last_pool_address = last_token_pair.pool
-            except:
-                last_block_number = 0
-        print(f'Last block number: {last_block_number}')
-        insert_values = [
-            TokenPairTable(
-                token0=token_pair["token0"]["address"],
-                token1=token_pair["token1"]["address"],
-                has_stablecoin=has_stablecoin(token_pair),
-                indexed=False,
-                fee=token_pair["fee"],
-                pool=token_pair["pool_address"],
-                block_number=token_pair["block_number"],
-                completed=False,
-                last_synced_time=timestamp
-            )
-            for token_pair in token_pairs
-            if token_pair['block_number'] > last_block_number
-        ]
-        self.add_tokens(
-            [
-                token
-                for token_pair in token_pairs
-                for token in [token_pair["token0"], token_pair["token1"]]
-            ]
-        )
-
-        with self.Session() as session:
-            session.add_all(insert_values)
+            insert_tokens(session, [token for token_pair in token_pairs for token in [token_pair["token0"], token_pair["token1"]]])
+            rows = {}
+            for token_pair in token_pairs:
+                rows.setdefault(token_pair["pool_address"], {
+                    "token0": token_pair["token0"]["address"],
+                    "token1": token_pair["token1"]["address"],
+                    "has_stablecoin": has_stablecoin(token_pair),
+                    "indexed": False,
+                    "fee": token_pair["fee"],
+                    "pool": token_pair["pool_address"],
+                    "block_number": token_pair["block_number"],
+                    "completed": False,
+                    "last_synced_time": timestamp,
+                })
+            if rows:
+                session.execute(postgresql.insert(TokenPairTable).on_conflict_do_nothing(index_elements=['pool']), list(rows.values()))
             session.commit()
+        print(f'Synced {len(rows)} token pairs')
     
     def fetch_related_tokens(self, token: str):
         with self.Session() as session:
@@ -283,8 +523,8 @@ class MinerDBManager:
     def lastSyncedTimestamp(self):
         with self.Session() as session:
             res = session.query(TokenPairTable).order_by(TokenPairTable.last_synced_time.desc()).first()
-            print(f'Last synced timestamp: {res.last_synced_time}')
             if res is not None:
+                print(f'Last synced timestamp: {res.last_synced_time}')
                 return res.last_synced_time
 
     def fetch_token_pairs(self):
@@ -360,6 +600,95 @@ class MinerDBManager:
         
         return swap_events + mint_events + burn_events + collect_events
         
+    def stream_pool_events(self, pool_address: str, start_block: int, end_block: int, chunk_size: int = 5000):
+        """Yield one pool's events in a block range as dicts, read through a server-side cursor in chunks."""
+        with self.Session() as session:
+            for table in [SwapEventTable, MintEventTable, BurnEventTable, CollectEventTable]:
+                events = (
+                    session.query(*[column for column in table.__table__.columns if not column.info.get('derived')])
+                    .filter(
+                        table.pool_address == pool_address,
+                        table.block_number >= start_block,
+                        table.block_number <= end_block
+                    )
+                    .order_by(table.block_number, table.id)
+                    .execution_options(yield_per=chunk_size)
+                )
+                for event in events:
+                    yield dict(event._mapping)
+
+    def pool_event_merkle_tree(self, pool_address: str, start_block: int, end_block: int) -> Dict[str, Union[MerkleTree, bytes]]:
+        """
+        Return the Merkle tree over one pool's events in a block range, building and storing it when missing.
+
+        Leaves are the canonical events ordered by (block_number, log_index, transaction_hash, event_type).
+        A stored tree is rebuilt when the range has gained events since it was built.
+        """
+        with self.Session() as session:
+            event_count = sum(
+                session.query(func.count(table.id)).filter(
+                    table.pool_address == pool_address,
+                    table.block_number >= start_block,
+                    table.block_number <= end_block
+                ).scalar()
+                for table in POOL_EVENT_TABLES.values()
+            )
+            stored = session.get(PoolEventMerkleTreeTable, (pool_address, start_block, end_block))
+            if stored and stored.leaf_count == event_count:
+                return {'tree': MerkleTree.from_bytes(stored.nodes, stored.leaf_count), 'leaf_refs': stored.leaf_refs}
+
+            leaves = []
+            for position, (event_type, table) in enumerate(POOL_EVENT_TABLES.items()):
+                events = (
+                    session.query(*[column for column in table.__table__.columns if not column.info.get('derived')])
+                    .filter(
+                        table.pool_address == pool_address,
+                        table.block_number >= start_block,
+                        table.block_number <= end_block
+                    )
+                    .execution_options(yield_per=5000)
+                )
+                for event in events:
+                    leaf = event_leaf(event_type, event)
+                    leaves.append(((*leaf_sort_key(leaf), event.id), LEAF_REF.pack(position, event.id), canonical_leaf(leaf)))
+            leaves.sort(key=lambda leaf: leaf[0])
+            tree = MerkleTree.from_leaves([leaf for _, _, leaf in leaves])
+            leaf_refs = b''.join(ref for _, ref, _ in leaves)
+            session.merge(PoolEventMerkleTreeTable(
+                pool_address=pool_address,
+                start_block=start_block,
+                end_block=end_block,
+                leaf_count=tree.leaf_count,
+                root=tree.root.hex(),
+                nodes=tree.to_bytes(),
+                leaf_refs=leaf_refs,
+                built_at=int(datetime.now().timestamp()),
+            ))
+            session.commit()
+        return {'tree': tree, 'leaf_refs': leaf_refs}
+
+    def fetch_committed_merkle_tree(self, pool_address: str, start_block: int, end_block: int, root: str) -> Union[Dict[str, Union[MerkleTree, bytes]], None]:
+        """The stored tree of a range if it still has the given root, i.e. is the one committed to; otherwise None."""
+        with self.Session() as session:
+            stored = session.get(PoolEventMerkleTreeTable, (pool_address, start_block, end_block))
+            if stored is None or stored.root != root:
+                return None
+            return {'tree': MerkleTree.from_bytes(stored.nodes, stored.leaf_count), 'leaf_refs': stored.leaf_refs}
+
+    def fetch_merkle_leaves(self, leaf_refs: bytes, indices: List[int]) -> List[Dict[str, Union[str, int]]]:
+        """Fetch the events behind the given leaf indices of a tree, in the order of indices."""
+        refs = [LEAF_REF.unpack_from(leaf_refs, index * LEAF_REF.size) for index in indices]
+        event_types = list(POOL_EVENT_TABLES)
+        events = {}
+        with self.Session() as session:
+            for position in {position for position, _ in refs}:
+                table = POOL_EVENT_TABLES[event_types[position]]
+                ids = [row_id for ref_position, row_id in refs if ref_position == position]
+                rows = session.query(*[column for column in table.__table__.columns if not column.info.get('derived')]).filter(table.id.in_(ids))
+                for row in rows:
+                    events[(position, row.id)] = event_leaf(event_types[position], row)
+        return [events[ref] for ref in refs]
+
     def fetch_swap_events(self, start_block: int, end_block: int):
         with self.Session() as session:
             events = session.query(SwapEventTable).filter(
@@ -395,93 +724,75 @@ class MinerDBManager:
         page_number: int, 
         search_query: str, 
         sort_by: str, 
-        sort_order: str
+        sort_order: str,
+        cursor: str = None,
+        count_mode: str = 'exact'
     ) -> Dict[str, List[Dict[str, Union[str, int]]]]:
         with self.Session() as session:
             sort_by = sort_by if sort_by in ['liquidity_token0', 'liquidity_token1', 'volume_token0', 'volume_token1', 'timestamp'] else 'liquidity_token0'
-            order_method = desc if sort_order == 'desc' else asc
-            Token0 = aliased(TokenTable)
-            Token1 = aliased(TokenTable)
-            TokenPair = aliased(TokenPairTable)
-            TokenMetric0 = aliased(CurrentTokenMetricTable)
-            TokenMetric1 = aliased(CurrentTokenMetricTable)
-            total_pool_count = session.query(CurrentPoolMetricTable).filter(CurrentPoolMetricTable.pool_address.like(f'%{search_query}%')).count()
-            # recent_fetched_timestamp = session.query(PoolMetricTable.timestamp).group_by().order_by(PoolMetricTable.timestamp.desc()).first()
-            latest_timestamps = session.query(
-                PoolMetricTable.pool_address,
-                func.max(PoolMetricTable.timestamp).label('latest_timestamp')
-            ).group_by(PoolMetricTable.pool_address).subquery()
-
-            # recent_fetched_timestamp = session.query(
-            #     latest_timestamps.c.pool_address,
-            #     latest_timestamps.c.latest_timestamp
-            # ).order_by(latest_timestamps.c.latest_timestamp.desc()).all()
-            # print(f'Recent fetched timestamp: {recent_fetched_timestamp}')
-            pool_metrics = (
+            sort_column = getattr(CurrentPoolMetricTable, sort_by)
+            # The snapshot is maintained by insert triggers on pool_metrics, so this is one read ordered by an indexed column.
+            pool_metrics_query = (
                 session.query(
-                    PoolMetricTable,
-                    Token0.symbol.label('token0_symbol'),
-                    Token1.symbol.label('token1_symbol'),
-                    TokenPair.fee.label('fee'),
-                    TokenMetric0.price.label('token0_price'),
-                    TokenMetric1.price.label('token1_price')
+                    CurrentPoolMetricTable.pool_address,
+                    CurrentPoolMetricTable.timestamp,
+                    CurrentPoolMetricTable.price,
+                    CurrentPoolMetricTable.liquidity_token0,
+                    CurrentPoolMetricTable.liquidity_token1,
+                    CurrentPoolMetricTable.volume_token0.label('total_volume_token0'),
+                    CurrentPoolMetricTable.volume_token1.label('total_volume_token1'),
+                    CurrentPoolMetricTable.volume_token0_1day,
+                    CurrentPoolMetricTable.volume_token1_1day,
+                    CurrentPoolMetricTable.token0_symbol,
+                    CurrentPoolMetricTable.token1_symbol,
+                    CurrentPoolMetricTable.token0_price,
+                    CurrentPoolMetricTable.token1_price,
+                    CurrentPoolMetricTable.fee,
+                    sort_column.label('sort_key'),
+                )
+                .filter(
+                    CurrentPoolMetricTable.pool_address.like(f'%{search_query}%'),
+                    CurrentPoolMetricTable.timestamp.isnot(None),
+                    CurrentPoolMetricTable.token0_price.isnot(None),
+                    CurrentPoolMetricTable.token1_price.isnot(None),
+                    sort_column.isnot(None),
                 )
-                .filter(PoolMetricTable.pool_address == latest_timestamps.c.pool_address)
-                .filter(PoolMetricTable.timestamp == latest_timestamps.c.latest_timestamp)
-                .join(TokenPair, PoolMetricTable.pool_address == TokenPair.pool)
-                .join(Token0, TokenPair.token0 == Token0.address)
-                .join(Token1, TokenPair.token1 == Token1.address)
-                .join(TokenMetric0, TokenPair.token0 == TokenMetric0.token_address)
-                .join(TokenMetric1, TokenPair.token1 == TokenMetric1.token_address)
-                .order_by(order_method(getattr(PoolMetricTable, sort_by)))
-                .limit(page_limit)
-                .offset(page_limit * (page_number - 1))
-                .all()
             )
-            
-            pool_metrics_with_diff = []
-            for metric in pool_metrics:
-                previous_metric = session.query(PoolMetricTable).filter(
-                    PoolMetricTable.pool_address == metric.PoolMetricTable.pool_address,
-                    PoolMetricTable.timestamp == metric.PoolMetricTable.timestamp - 300
-                ).first()
-                
-                if previous_metric:
-                    metric_diff = {
-                        "pool_address": metric.PoolMetricTable.pool_address,
-                        "timestamp": metric.PoolMetricTable.timestamp,
-                        "price": metric.PoolMetricTable.price,
-                        "liquidity_token0": metric.PoolMetricTable.liquidity_token0,
-                        "liquidity_token1": metric.PoolMetricTable.liquidity_token1,
-                        "total_volume_token0": metric.PoolMetricTable.volume_token0,
-                        "total_volume_token1": metric.PoolMetricTable.volume_token1,
-                        "volume_token0_1day": metric.PoolMetricTable.volume_token0 - previous_metric.volume_token0,
-                        "volume_token1_1day": metric.PoolMetricTable.volume_token1 - previous_metric.volume_token1,
-                        "token0_symbol": metric.token0_symbol,
-                        "token1_symbol": metric.token1_symbol,
-                        "token0_price": metric.token0_price,
-                        "token1_price": metric.token1_price,
-                        "fee": metric.fee
-                    }
-                else:
-                    metric_diff = {
-                        "pool_address": metric.PoolMetricTable.pool_address,
-                        "timestamp": metric.PoolMetricTable.timestamp,
-                        "price": metric.PoolMetricTable.price,
-                        "liquidity_token0": metric.PoolMetricTable.liquidity_token0,
-                        "liquidity_token1": metric.PoolMetricTable.liquidity_token1,
-                        "total_volume_token0": metric.PoolMetricTable.volume_token0,
-                        "total_volume_token1": metric.PoolMetricTable.volume_token1,
-                        "volume_token0_1day": metric.PoolMetricTable.volume_token0,
-                        "volume_token1_1day": metric.PoolMetricTable.volume_token1,
-                        "token0_symbol": metric.token0_symbol,
-                        "token1_symbol": metric.token1_symbol,
-                        "token0_price": metric.token0_price,
-                        "token1_price": metric.token1_price,
-                        "fee": metric.fee
-                    }
-                pool_metrics_with_diff.append(metric_diff)
-            return {"pool_metrics": pool_metrics_with_diff, "total_pool_count": total_pool_count}
+            snapshot_timestamp = session.query(func.max(CurrentPoolMetricTable.timestamp)).scalar()
+            total_pool_count, total_count_exact = self.counts.count(
+                session, pool_metrics_query, count_mode, ('current_pool_metrics', search_query, snapshot_timestamp),
+            )
+            pool_metrics, next_cursor = seek_page(
+                pool_metrics_query,
+                [sort_column, CurrentPoolMetricTable.pool_address],
+                page_limit, page_number, cursor,
+                descending=sort_order == 'desc',
+                key_names=['sort_key', 'pool_address'],
+            )
+            return {"pool_metrics": [dict(metric._mapping) for metric in pool_metrics], "total_pool_count": total_pool_count, "total_count_exact": total_count_exact, "next_cursor": next_cursor}
+
+    def fetch_pool_liquidity(self) -> List[Dict[str, Union[str, float]]]:
+        """USD liquidity of every pool in the current metrics snapshot whose token prices are known."""
+        with self.Session() as session:
+            pools = session.query(
+                CurrentPoolMetricTable.pool_address,
+                CurrentPoolMetricTable.token0_address,
+                CurrentPoolMetricTable.token1_address,
+                (
+                    CurrentPoolMetricTable.liquidity_token0 * CurrentPoolMetricTable.token0_price
+                    + CurrentPoolMetricTable.liquidity_token1 * CurrentPoolMetricTable.token1_price
+                ).label('liquidity'),
+            ).filter(
+                CurrentPoolMetricTable.token0_price.isnot(None),
+                CurrentPoolMetricTable.token1_price.isnot(None),
+                CurrentPoolMetricTable.liquidity_token0.isnot(None),
+                CurrentPoolMetricTable.liquidity_token1.isnot(None),
+            ).all()
+            return [dict(pool._mapping) for pool in pools]
+
+    def rebuild_current_metrics(self) -> None:
+        """Recompute the current pool and token metric snapshots from the raw metric tables."""
+        rebuild_snapshots(self.engine)
     
     def fetch_recent_pool_events(self, page_limit: int, filter_by: str) -> Dict[str, List[Dict[str, Union[str, int]]]]:
         with self.Session() as session:
@@ -500,7 +811,9 @@ class MinerDBManager:
                         Token1.decimals.label('token1_decimals'), 
                         SwapEventTable.amount0, 
                         SwapEventTable.amount1, 
-                        SwapEventTable.transaction_hash
+                        SwapEventTable.transaction_hash,
+                        SwapEventTable.amount0_adjusted,
+                        SwapEventTable.amount1_adjusted,
                     )
                     .join(TokenPair, SwapEventTable.pool_address == TokenPair.pool)
                     .join(Token0, TokenPair.token0 == Token0.address)
@@ -521,7 +834,9 @@ class MinerDBManager:
                         Token1.decimals.label('token1_decimals'), 
                         MintEventTable.amount0, 
                         MintEventTable.amount1, 
-                        MintEventTable.transaction_hash
+                        MintEventTable.transaction_hash,
+                        MintEventTable.amount0_adjusted,
+                        MintEventTable.amount1_adjusted,
                     )
                     .join(TokenPair, MintEventTable.pool_address == TokenPair.pool)
                     .join(Token0, TokenPair.token0 == Token0.address)
@@ -542,7 +857,9 @@ class MinerDBManager:
                         Token1.decimals.label('token1_decimals'), 
                         BurnEventTable.amount0, 
                         BurnEventTable.amount1, 
-                        BurnEventTable.transaction_hash)
+                        BurnEventTable.transaction_hash,
+                        BurnEventTable.amount0_adjusted,
+                        BurnEventTable.amount1_adjusted)
                     .join(TokenPair, BurnEventTable.pool_address == TokenPair.pool)
                     .join(Token0, TokenPair.token0 == Token0.address)
                     .join(Token1, TokenPair.token1 == Token1.address)
@@ -553,35 +870,45 @@ class MinerDBManager:
             all_events.sort(key=lambda event: event[0], reverse=True)
             return all_events
     
-    def fetch_current_token_metrics(self, page_limit:int, page_number: int, search_query: str, sort_by: str) -> Dict[str, List[Dict[str, Union[str, int]]]]:
+    def fetch_current_token_metrics(self, page_limit:int, page_number: int, search_query: str, sort_by: str, cursor: str = None, count_mode: str = 'exact') -> Dict[str, List[Dict[str, Union[str, int]]]]:
         with self.Session() as session:
             sort_by = sort_by if sort_by in ['price', 'total_volume', 'total_liquidity'] else 'total_volume'
-            total_token_count = session.query(CurrentTokenMetricTable).filter(CurrentTokenMetricTable.token_address.like(f'%{search_query}%')).count()
-            token_metrics = (
+            sort_column = getattr(CurrentTokenMetricTable, sort_by)
+            token_metrics_query = (
                 session.query(
                     CurrentTokenMetricTable.token_address,
                     CurrentTokenMetricTable.price,
                     CurrentTokenMetricTable.total_volume,
                     CurrentTokenMetricTable.total_liquidity,
-                    TokenTable.symbol,
+                    CurrentTokenMetricTable.symbol,
+                    sort_column.label('sort_key'),
                 )
-                .filter(CurrentTokenMetricTable.token_address.like(f'%{search_query}%'))
-                .join(TokenTable, CurrentTokenMetricTable.token_address == TokenTable.address)
-                .order_by(getattr(CurrentTokenMetricTable, sort_by).desc())
-                .limit(page_limit)
-                .offset(page_limit * (page_number - 1))
-                .all()
+                .filter(
+                    CurrentTokenMetricTable.token_address.like(f'%{search_query}%'),
+                    CurrentTokenMetricTable.symbol.isnot(None),
+                    sort_column.isnot(None),
+                )
+            )
+            snapshot_timestamp = session.query(func.max(CurrentTokenMetricTable.timestamp)).scalar()
+            total_token_count, total_count_exact = self.counts.count(
+                session, token_metrics_query, count_mode, ('current_token_metrics', search_query, snapshot_timestamp),
+            )
+            token_metrics, next_cursor = seek_page(
+                token_metrics_query,
+                [sort_column, CurrentTokenMetricTable.token_address],
+                page_limit, page_number, cursor,
+                descending=True,
+                key_names=['sort_key', 'token_address'],
             )
-            return {"token_metrics": token_metrics, "total_token_count": total_token_count}
+            return {"token_metrics": token_metrics, "total_token_count": total_token_count, "total_count_exact": total_count_exact, "next_cursor": next_cursor}
     
-    def fetch_pool_metric_api(self, page_limit:int, page_number: int, pool_address: str, interval: str, period: str, start_timestamp: int, end_timestamp: int) -> Dict[str, List[Dict[str, Union[str, int, float]]]]:
+    def fetch_pool_metric_api(self, page_limit:int, page_number: int, pool_address: str, interval: str, period: str, start_timestamp: int, end_timestamp: int, cursor: str = None, count_mode: str = 'exact') -> Dict[str, List[Dict[str, Union[str, int, float]]]]:
         with self.Session() as session:
             latest_timestamp = session.query(func.max(PoolMetricTable.timestamp)).filter(PoolMetricTable.pool_address == pool_address).first()[0]
             oldest_timestamp = session.query(func.min(PoolMetricTable.timestamp)).filter(PoolMetricTable.pool_address == pool_address).first()[0]
             start_timestamp = start_timestamp if start_timestamp != 0 else max(latest_timestamp - get_seconds_from_period(period), oldest_timestamp)
             end_timestamp = end_timestamp if end_timestamp != 0 else latest_timestamp
             print(f'Start timestamp: {start_timestamp}, End timestamp: {end_timestamp}')
-            total_pool_count = session.query(PoolMetricTable).filter(PoolMetricTable.pool_address == pool_address).count()
             interval = get_seconds_from_period(interval)
             Token0 = aliased(TokenTable)
             Token1 = aliased(TokenTable)
@@ -607,33 +934,41 @@ class MinerDBManager:
                 .first()
             )
             
-            pool_metrics = (
-                session.query(
-                    PoolMetricTable.timestamp,
-                    PoolMetricTable.price,
-                    PoolMetricTable.liquidity_token0,
-                    PoolMetricTable.liquidity_token1,
-                    PoolMetricTable.volume_token0,
-                    PoolMetricTable.volume_token1,
-                )
-                .filter(
-                    PoolMetricTable.pool_address == pool_address,
-                    PoolMetricTable.timestamp >= start_timestamp,
-                    PoolMetricTable.timestamp <= end_timestamp,
-                    (PoolMetricTable.timestamp - start_timestamp) % interval == 0
-                )
-                .order_by(PoolMetricTable.timestamp.asc())
-                .limit(page_limit)
-                .offset(page_limit * (page_number - 1))
-                .all()
+            resolution = get_rollup_resolution(interval) if self.rollups_ready() else None
+            if resolution is None:
+                table, origin, filters = PoolMetricTable, start_timestamp, []
+            else:
+                # Read the coarsest rollup that divides the interval instead of the raw 5-minute rows.
+                table, origin = PoolMetricRollupTable, start_timestamp - start_timestamp % resolution
+                filters = [PoolMetricRollupTable.resolution == resolution]
+            pool_metrics_query, time_column = interval_query(
+                session, table.timestamp, origin, end_timestamp, interval, resolution or METRIC_INTERVAL,
+                [
+                    ('last', 'price', table.price),
+                    ('last', 'liquidity_token0', table.liquidity_token0),
+                    ('last', 'liquidity_token1', table.liquidity_token1),
+                    # Running totals: the last one is the window's volume on top of the previous window's total.
+                    ('last', 'volume_token0', table.volume_token0),
+                    ('last', 'volume_token1', table.volume_token1),
+                ],
+                [table.pool_address == pool_address, *filters],
             )
+            total_pool_count, total_count_exact = self.counts.count(
+                session, pool_metrics_query, count_mode,
+                ('pool_metrics', pool_address, interval, start_timestamp, end_timestamp, oldest_timestamp, latest_timestamp), pool_address,
+            )
+            pool_metrics, next_cursor = seek_page(pool_metrics_query, [time_column], page_limit, page_number, cursor)
             print(f'Pool metrics: {pool_metrics}')
-            return {"pool_metrics": pool_metrics, "token_pair_info": token_pair_info, "total_pool_count": total_pool_count}
+            return {"pool_metrics": pool_metrics, "token_pair_info": token_pair_info, "total_pool_count": total_pool_count, "total_count_exact": total_count_exact, "next_cursor": next_cursor}
         
-    def fetch_token_metric_api(self, page_limit: int, page_number: int, token_address: str, interval: str, period: str, start_timestamp: int, end_timestamp: int) -> Dict[str, List[Dict[str, Union[str, int, float]]]]:
+    def fetch_token_metric_api(self, page_limit: int, page_number: int, token_address: str, interval: str, period: str, start_timestamp: int, end_timestamp: int, cursor: str = None, count_mode: str = 'exact') -> Dict[str, List[Dict[str, Union[str, int, float]]]]:
         with self.Session() as session:
-            latest_timestamp = session.query(func.max(TokenMetricTable.timestamp)).filter(TokenMetricTable.token_address == token_address).first()[0]
-            oldest_timestamp = session.query(func.min(TokenMetricTable.timestamp)).filter(TokenMetricTable.token_address == token_address).first()[0]
+            source = TokenMetricTable
+            latest_timestamp, oldest_timestamp = session.query(func.max(source.timestamp), func.min(source.timestamp)).filter(source.token_address == token_address).first()
+            if latest_timestamp is None:
+                # Tokens without stored metrics are served the price oracle's 5-minute USD prices.
+                source = TokenPriceTable
+                latest_timestamp, oldest_timestamp = session.query(func.max(source.timestamp), func.min(source.timestamp)).filter(source.token_address == token_address).first()
             if latest_timestamp is None:
                 return {"token_metrics": [], "token_data": {}, "total_token_count:": 0}
             start_timestamp = start_timestamp if start_timestamp != 0 else max(latest_timestamp - get_seconds_from_period(period), oldest_timestamp)
@@ -641,15 +976,37 @@ class MinerDBManager:
             interval = get_seconds_from_period(interval)
             if interval == 0:
                 raise Exception("Invalid interval")
-            total_token_count = (
-                session.query(TokenMetricTable)
-                .filter(
-                    TokenMetricTable.token_address == token_address,
-                    TokenMetricTable.timestamp >= start_timestamp,
-                    TokenMetricTable.timestamp <= end_timestamp,
-                    (TokenMetricTable.timestamp - start_timestamp) % interval == 0
-                )
-                .count()
+            resolution = get_rollup_resolution(interval) if source is TokenMetricTable and self.rollups_ready() else None
+            if source is TokenPriceTable:
+                table, origin, filters = TokenPriceTable, start_timestamp, []
+                columns = [
+                    ('last', 'close_price', table.price),
+                    ('min', 'low_price', table.price),
+                    ('max', 'high_price', table.price),
+                    ('last', 'total_volume', cast(null(), Float)),
+                    ('last', 'total_liquidity', cast(null(), Float)),
+                ]
+            else:
+                if resolution is None:
+                    table, origin, filters = TokenMetricTable, start_timestamp, []
+                else:
+                    # Read the coarsest rollup that divides the interval instead of the raw 5-minute rows.
+                    table, origin = TokenMetricRollupTable, start_timestamp - start_timestamp % resolution
+                    filters = [TokenMetricRollupTable.resolution == resolution]
+                columns = [
+                    ('last', 'close_price', table.close_price),
+                    ('min', 'low_price', table.low_price),
+                    ('max', 'high_price', table.high_price),
+                    ('last', 'total_volume', table.total_volume),
+                    ('last', 'total_liquidity', table.total_liquidity),
+                ]
+            token_metrics_query, time_column = interval_query(
+                session, table.timestamp, origin, end_timestamp, interval, resolution or METRIC_INTERVAL,
+                columns, [table.token_address == token_address, *filters],
+            )
+            total_token_count, total_count_exact = self.counts.count(
+                session, token_metrics_query, count_mode,
+                (source.__tablename__, token_address, interval, start_timestamp, end_timestamp, oldest_timestamp, latest_timestamp), token_address,
             )
             token_data = (
                 session.query(
@@ -658,37 +1015,14 @@ class MinerDBManager:
                     TokenTable.decimals,
                 ).filter(TokenTable.address == token_address).first()
             )
-            token_metrics = (
-                session.query(
-                    TokenMetricTable.timestamp,
-                    TokenMetricTable.close_price,
-                    TokenMetricTable.low_price,
-                    TokenMetricTable.high_price,
-                    TokenMetricTable.total_volume,
-                    TokenMetricTable.total_liquidity,
-                )
-                .filter(
-                    TokenMetricTable.token_address == token_address,
-                    TokenMetricTable.timestamp >= start_timestamp,
-                    TokenMetricTable.timestamp <= end_timestamp,
-                    (TokenMetricTable.timestamp - start_timestamp) % interval == 0
-                )
-                .order_by(TokenMetricTable.timestamp.asc())
-                .limit(page_limit)
-                .offset(page_limit * (page_number - 1))
-                .all()
-            )
-            return {"token_metrics": token_metrics, "token_data": token_data, "total_token_count": total_token_count}
+            token_metrics, next_cursor = seek_page(token_metrics_query, [time_column], page_limit, page_number, cursor)
+            return {"token_metrics": token_metrics, "token_data": token_data, "total_token_count": total_token_count, "total_count_exact": total_count_exact, "next_cursor": next_cursor}
     
-    def fetch_swap_event_api(self, page_limit: int, page_number: int, pool_address: str, start_timestamp: int, end_timestamp: int) -> Dict[str, List[Dict[str, Union[str, int]]]]:
-        with self.Session() as session:
-            total_swap_count = session.query(SwapEventTable).filter(
-                SwapEventTable.pool_address == pool_address,
-                SwapEventTable.timestamp >= start_timestamp,
-                SwapEventTable.timestamp <= end_timestamp
-            ).count()
-            swap_events = (
+    def fetch_swap_event_api(self, page_limit: int, page_number: int, pool_address: str, start_timestamp: int, end_timestamp: int, cursor: str = None, count_mode: str = 'exact') -> Dict[str, List[Dict[str, Union[str, int]]]]:
+        with self.Session() as session:
+            swap_events_query = (
                 session.query(
+                    SwapEventTable.id,
                     SwapEventTable.timestamp,
                     SwapEventTable.pool_address,
                     SwapEventTable.block_number,
@@ -706,22 +1040,20 @@ class MinerDBManager:
                     SwapEventTable.timestamp >= start_timestamp,
                     SwapEventTable.timestamp <= end_timestamp
                 )
-                .order_by(SwapEventTable.timestamp.asc())
-                .limit(page_limit)
-                .offset(page_limit * (page_number - 1))
-                .all()
             )
-            return {"swap_events": swap_events, "total_swap_count": total_swap_count}
+            latest_timestamp = session.query(func.max(SwapEventTable.timestamp)).filter(SwapEventTable.pool_address == pool_address).scalar()
+            total_swap_count, total_count_exact = self.counts.count_events(
+                session, swap_events_query, SwapEventTable.__tablename__, pool_address, start_timestamp, end_timestamp, count_mode,
+                (SwapEventTable.__tablename__, pool_address, start_timestamp, end_timestamp, latest_timestamp),
+            )
+            swap_events, next_cursor = seek_page(swap_events_query, [SwapEventTable.timestamp, SwapEventTable.id], page_limit, page_number, cursor)
+            return {"swap_events": swap_events, "total_swap_count": total_swap_count, "total_count_exact": total_count_exact, "next_cursor": next_cursor}
     
-    def fetch_mint_event_api(self, page_limit: int, page_number: int, pool_address: str, start_timestamp: int, end_timestamp: int) -> Dict[str, List[Dict[str, Union[str, int]]]]:
-        with self.Session() as session:
-            total_mint_count = session.query(MintEventTable).filter(
-                MintEventTable.pool_address == pool_address,
-                MintEventTable.timestamp >= start_timestamp,
-                MintEventTable.timestamp <= end_timestamp
-            ).count()
-            mint_events = (
+    def fetch_mint_event_api(self, page_limit: int, page_number: int, pool_address: str, start_timestamp: int, end_timestamp: int, cursor: str = None, count_mode: str = 'exact') -> Dict[str, List[Dict[str, Union[str, int]]]]:
+        with self.Session() as session:
+            mint_events_query = (
                 session.query(
+                    MintEventTable.id,
                     MintEventTable.timestamp,
                     MintEventTable.pool_address,
                     MintEventTable.block_number,
@@ -739,22 +1071,20 @@ class MinerDBManager:
                     MintEventTable.timestamp >= start_timestamp,
                     MintEventTable.timestamp <= end_timestamp
                 )
-                .order_by(MintEventTable.timestamp.asc())
-                .limit(page_limit)
-                .offset(page_limit * (page_number - 1))
-                .all()
             )
-            return {"mint_events": mint_events, "total_mint_count": total_mint_count}
+            latest_timestamp = session.query(func.max(MintEventTable.timestamp)).filter(MintEventTable.pool_address == pool_address).scalar()
+            total_mint_count, total_count_exact = self.counts.count_events(
+                session, mint_events_query, MintEventTable.__tablename__, pool_address, start_timestamp, end_timestamp, count_mode,
+                (MintEventTable.__tablename__, pool_address, start_timestamp, end_timestamp, latest_timestamp),
+            )
+            mint_events, next_cursor = seek_page(mint_events_query, [MintEventTable.timestamp, MintEventTable.id], page_limit, page_number, cursor)
+            return {"mint_events": mint_events, "total_mint_count": total_mint_count, "total_count_exact": total_count_exact, "next_cursor": next_cursor}
     
-    def fetch_burn_event_api(self, page_limit: int, page_number: int, pool_address: str, start_timestamp: int, end_timestamp: int) -> Dict[str, List[Dict[str, Union[str, int]]]]:
-        with self.Session() as session:
-            total_burn_count = session.query(BurnEventTable).filter(
-                BurnEventTable.pool_address == pool_address,
-                BurnEventTable.timestamp >= start_timestamp,
-                BurnEventTable.timestamp <= end_timestamp
-            ).count()
-            burn_events = (
+    def fetch_burn_event_api(self, page_limit: int, page_number: int, pool_address: str, start_timestamp: int, end_timestamp: int, cursor: str = None, count_mode: str = 'exact') -> Dict[str, List[Dict[str, Union[str, int]]]]:
+        with self.Session() as session:
+            burn_events_query = (
                 session.query(
+                    BurnEventTable.id,
                     BurnEventTable.timestamp,
                     BurnEventTable.pool_address,
                     BurnEventTable.block_number,
@@ -771,12 +1101,14 @@ class MinerDBManager:
                     BurnEventTable.timestamp >= start_timestamp,
                     BurnEventTable.timestamp <= end_timestamp
                 )
-                .order_by(BurnEventTable.timestamp.asc())
-                .limit(page_limit)
-                .offset(page_limit * (page_number - 1))
-                .all()
             )
-            return {"burn_events": burn_events, "total_burn_count": total_burn_count}
+            latest_timestamp = session.query(func.max(BurnEventTable.timestamp)).filter(BurnEventTable.pool_address == pool_address).scalar()
+            total_burn_count, total_count_exact = self.counts.count_events(
+                session, burn_events_query, BurnEventTable.__tablename__, pool_address, start_timestamp, end_timestamp, count_mode,
+                (BurnEventTable.__tablename__, pool_address, start_timestamp, end_timestamp, latest_timestamp),
+            )
+            burn_events, next_cursor = seek_page(burn_events_query, [BurnEventTable.timestamp, BurnEventTable.id], page_limit, page_number, cursor)
+            return {"burn_events": burn_events, "total_burn_count": total_burn_count, "total_count_exact": total_count_exact, "next_cursor": next_cursor}
         
     def get_token_info(self, token_address: str) -> Dict[str, Union[str]]:
         print(f'Fetching token info for {token_address}')
@@ -788,4 +1120,36 @@ class MinerDBManager:
                 TokenTable.decimals
                 ).filter(TokenTable.address == token_address).first()
             print(f'Token info: {token_info}')
-            return token_info
\ No newline at end of file
+            return token_info
+
+    def fetch_indexed_tokens(self) -> List[str]:
+        """Tokens of every pool in the current metrics snapshot."""
+        with self.Session() as session:
+            token0 = session.query(CurrentPoolMetricTable.token0_address.label('token_address'))
+            token1 = session.query(CurrentPoolMetricTable.token1_address.label('token_address'))
+            return [token for token, in token0.union(token1).all() if token is not None]
+
+    def fetch_latest_token_price_timestamps(self) -> Dict[str, int]:
+        """Newest token_prices bucket per token."""
+        with self.Session() as session:
+            return dict(session.query(TokenPriceTable.token_address, func.max(TokenPriceTable.timestamp)).group_by(TokenPriceTable.token_address).all())
+
+    def fetch_token_prices(self, token_address: str, start_timestamp: int, end_timestamp: int) -> Dict[int, float]:
+        """USD prices of one token for the buckets in [start_timestamp, end_timestamp)."""
+        with self.Session() as session:
+            return dict(session.query(TokenPriceTable.timestamp, TokenPriceTable.price).filter(
+                TokenPriceTable.token_address == token_address,
+                TokenPriceTable.timestamp >= start_timestamp,
+                TokenPriceTable.timestamp < end_timestamp,
+            ).all())
+
+    def add_token_prices(self, token_address: str, prices: Dict[int, float]) -> None:
+        """Store oracle prices in token_prices; existing buckets are kept."""
+        if not prices:
+            return
+        with self.Session() as session:
+            session.execute(
+                postgresql.insert(TokenPriceTable).on_conflict_do_nothing(index_elements=['token_address', 'timestamp']),
+                [{'token_address': token_address, 'timestamp': timestamp, 'price': price} for timestamp, price in prices.items()],
+            )
+            session.commit()
@@ -0,0 +1,606 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from typing import Callable, List, Dict, Union
+from datetime import datetime
+import math
+import threading
+
+from utils.log import log
+from db.snapshots import REBUILD_CURRENT_TOKEN_METRICS, REBUILD_CURRENT_POOL_METRICS
+from db.rollups import rebuild_rollups
+from db.counts import POOL_EVENT_COUNT_SEEDS_TABLE, RECORD_POOL_EVENT_COUNT_SEED, seed_pool_event_counts
+from db.event_numeric import NUMERIC_FIELDS, HEX_TO_NUMERIC
+
+# Never wait long for a lock on a live table; a failed statement is retried on the next run.
+LOCK_TIMEOUT = '5s'
+
+class ConcurrentIndex:
+    """A secondary index built with CREATE INDEX CONCURRENTLY so writers are never blocked."""
+    def __init__(self, name: str, table: str, columns: str, using: str = 'btree', unique: bool = False) -> None:
+        self.name = name
+        self.table = table
+        self.columns = columns
+        self.using = using
+        self.unique = unique
+
+    def create_sql(self) -> str:
+        unique = 'UNIQUE ' if self.unique else ''
+        return f'CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {self.name} ON {self.table} USING {self.using} ({self.columns})'
+
+class Migration:
+    """A versioned schema change recorded in the schema_migrations table."""
+    def __init__(self, version: int, description: str, statements: List[str] = None, indexes: List[ConcurrentIndex] = None, backfill: Callable[[Engine], None] = None) -> None:
+        self.version = version
+        self.description = description
+        self.statements = statements or []
+        self.indexes = indexes or []
+        # Data changes too large for one transaction; must be resumable, as it reruns until it completes.
+        self.backfill = backfill
+
+    def apply(self, engine: Engine) -> None:
+        self.apply_statements(engine)
+        self.complete(engine)
+
+    def apply_statements(self, engine: Engine) -> None:
+        """The schema change itself: short statements run in one transaction."""
+        if self.statements:
+            with engine.begin() as connection:
+                connection.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+                for statement in self.statements:
+                    connection.execute(text(statement))
+
+    def complete(self, engine: Engine) -> None:
+        """Index builds and backfills, which may take hours on a large database but never block writers."""
+        for index in self.indexes:
+            build_index(engine, index)
+        if self.backfill is not None:
+            self.backfill(engine)
+
+def build_index(engine: Engine, index: ConcurrentIndex) -> None:
+    """Build an index concurrently, replacing a leftover invalid copy from an interrupted build."""
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.execute(text(f"SET lock_timeout = '{LOCK_TIMEOUT}'"))
+        if is_partitioned(connection, index.table):
+            build_partitioned_index(connection, index)
+        elif is_hypertable(connection, index.table):
+            # Hypertables reject CONCURRENTLY; building one chunk per transaction keeps locks as short.
+            log(f'Building index {index.name} on hypertable {index.table}')
+            unique = 'UNIQUE ' if index.unique else ''
+            connection.execute(text(
+                f'CREATE {unique}INDEX IF NOT EXISTS {index.name} ON {index.table} USING {index.using} ({index.columns}) '
+                f'WITH (timescaledb.transaction_per_chunk)'
+            ))
+        else:
+            build_concurrently(connection, index)
+        connection.execute(text('RESET lock_timeout'))
+
+def build_concurrently(connection, index: ConcurrentIndex) -> None:
+    is_valid = connection.execute(
+        text('SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name'),
+        {'name': index.name},
+    ).scalar()
+    if is_valid is False:
+        log(f'Dropping invalid index {index.name}')
+        connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {index.name}'))
+    if is_valid is not True:
+        log(f'Building index {index.name} on {index.table}')
+        connection.execute(text(index.create_sql()))
+
+def is_partitioned(connection, table: str) -> bool:
+    return connection.execute(text("SELECT relkind = 'p' FROM pg_class WHERE oid = CAST(:table AS regclass)"), {'table': table}).scalar()
+
+def is_hypertable(connection, table: str) -> bool:
+    if not connection.execute(text("SELECT count(*) > 0 FROM pg_extension WHERE extname = 'timescaledb'")).scalar():
+        return False
+    return connection.execute(
+        text('SELECT count(*) > 0 FROM timescaledb_information.hypertables WHERE hypertable_name = :table'),
+        {'table': table},
+    ).scalar()
+
+def partitions_of(connection, table: str) -> List[str]:
+    return list(connection.execute(
+        text('SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+             'WHERE i.inhparent = CAST(:table AS regclass) ORDER BY c.relname'),
+        {'table': table},
+    ).scalars())
+
+def build_partitioned_index(connection, index: ConcurrentIndex) -> None:
+    """
+    Build an index on a partitioned table without blocking writers.
+
+    CONCURRENTLY is not supported on partitioned parents, so the parent index is created on the
+    parent only, each partition gets its own concurrent build, and the builds are attached to it.
+    """
+    unique = 'UNIQUE ' if index.unique else ''
+    connection.execute(text(f'CREATE {unique}INDEX IF NOT EXISTS {index.name} ON ONLY {index.table} USING {index.using} ({index.columns})'))
+    for partition in partitions_of(connection, index.table):
+        attached = connection.execute(
+            text('SELECT count(*) > 0 FROM pg_inherits i JOIN pg_index x ON x.indexrelid = i.inhrelid '
+                 'WHERE i.inhparent = CAST(:index AS regclass) AND x.indrelid = CAST(:partition AS regclass)'),
+            {'index': index.name, 'partition': partition},
+        ).scalar()
+        if attached:
+            continue
+        child = ConcurrentIndex(f'{index.name}_{partition[len(index.table) + 1:]}', partition, index.columns, index.using, index.unique)
+        build_concurrently(connection, child)
+        connection.execute(text(f'ALTER INDEX {index.name} ATTACH PARTITION {child.name}'))
+
+# Migration whose backfill fills the rollup tables with the history recorded before its triggers.
+ROLLUP_MIGRATION = 2
+
+EVENT_TABLES = ['swap_event', 'mint_event', 'burn_event', 'collect_event']
+
+POOL_METRICS_ROLLUP_TRIGGER = """
+CREATE OR REPLACE FUNCTION rollup_pool_metrics() RETURNS trigger AS $$
+DECLARE
+    bucket_size integer;
+    previous_volume0 double precision;
+    previous_volume1 double precision;
+BEGIN
+    -- pool_metrics volumes are running totals, so the volume traded in this 5-minute row is the delta to the previous row.
+    SELECT volume_token0, volume_token1 INTO previous_volume0, previous_volume1
+    FROM pool_metrics
+    WHERE pool_address = NEW.pool_address AND timestamp < NEW.timestamp
+    ORDER BY timestamp DESC LIMIT 1;
+
+    FOREACH bucket_size IN ARRAY ARRAY[900, 3600, 21600, 86400, 604800] LOOP
+        INSERT INTO pool_metrics_rollup AS r (
+            resolution, pool_address, timestamp, last_timestamp, price, high_price, low_price,
+            liquidity_token0, liquidity_token1, volume_token0, volume_token1,
+            bucket_volume_token0, bucket_volume_token1, sample_count
+        ) VALUES (
+            bucket_size, NEW.pool_address, NEW.timestamp - NEW.timestamp % bucket_size, NEW.timestamp,
+            NEW.price, NEW.price, NEW.price, NEW.liquidity_token0, NEW.liquidity_token1,
+            NEW.volume_token0, NEW.volume_token1,
+            coalesce(NEW.volume_token0 - previous_volume0, 0), coalesce(NEW.volume_token1 - previous_volume1, 0), 1
+        )
+        ON CONFLICT (resolution, pool_address, timestamp) DO UPDATE SET
+            price = CASE WHEN EXCLUDED.last_timestamp >= r.last_timestamp THEN EXCLUDED.price ELSE r.price END,
+            liquidity_token0 = CASE WHEN EXCLUDED.last_timestamp >= r.last_timestamp THEN EXCLUDED.liquidity_token0 ELSE r.liquidity_token0 END,
+            liquidity_token1 = CASE WHEN EXCLUDED.last_timestamp >= r.last_timestamp THEN EXCLUDED.liquidity_token1 ELSE r.liquidity_token1 END,
+            volume_token0 = CASE WHEN EXCLUDED.last_timestamp >= r.last_timestamp THEN EXCLUDED.volume_token0 ELSE r.volume_token0 END,
+            volume_token1 = CASE WHEN EXCLUDED.last_timestamp >= r.last_timestamp THEN EXCLUDED.volume_token1 ELSE r.volume_token1 END,
+            last_timestamp = GREATEST(r.last_timestamp, EXCLUDED.last_timestamp),
+            high_price = GREATEST(r.high_price, EXCLUDED.high_price),
+            low_price = LEAST(r.low_price, EXCLUDED.low_price),
+            bucket_volume_token0 = r.bucket_volume_token0 + EXCLUDED.bucket_volume_token0,
+            bucket_volume_token1 = r.bucket_volume_token1 + EXCLUDED.bucket_volume_token1,
+            sample_count = r.sample_count + 1;
+    END LOOP;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+TOKEN_METRICS_ROLLUP_TRIGGER = """
+CREATE OR REPLACE FUNCTION rollup_token_metrics() RETURNS trigger AS $$
+DECLARE
+    bucket_size integer;
+BEGIN
+    FOREACH bucket_size IN ARRAY ARRAY[900, 3600, 21600, 86400, 604800] LOOP
+        INSERT INTO token_metrics_rollup AS r (
+            resolution, token_address, timestamp, last_timestamp, close_price, high_price, low_price,
+            total_volume, total_liquidity, sample_count
+        ) VALUES (
+            bucket_size, NEW.token_address, NEW.timestamp - NEW.timestamp % bucket_size, NEW.timestamp,
+            NEW.close_price, NEW.high_price, NEW.low_price, NEW.total_volume, NEW.total_liquidity, 1
+        )
+        ON CONFLICT (resolution, token_address, timestamp) DO UPDATE SET
+            close_price = CASE WHEN EXCLUDED.last_timestamp >= r.last_timestamp THEN EXCLUDED.close_price ELSE r.close_price END,
+            total_volume = CASE WHEN EXCLUDED.last_timestamp >= r.last_timestamp THEN EXCLUDED.total_volume ELSE r.total_volume END,
+            total_liquidity = CASE WHEN EXCLUDED.last_timestamp >= r.last_timestamp THEN EXCLUDED.total_liquidity ELSE r.total_liquidity END,
+            last_timestamp = GREATEST(r.last_timestamp, EXCLUDED.last_timestamp),
+            high_price = GREATEST(r.high_price, EXCLUDED.high_price),
+            low_price = LEAST(r.low_price, EXCLUDED.low_price),
+            sample_count = r.sample_count + 1;
+    END LOOP;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+CURRENT_POOL_METRICS_COLUMNS = [
+    ('timestamp', 'INTEGER'),
+    ('previous_timestamp', 'INTEGER'),
+    ('previous_price', 'DOUBLE PRECISION'),
+    ('previous_liquidity_token0', 'DOUBLE PRECISION'),
+    ('previous_liquidity_token1', 'DOUBLE PRECISION'),
+    ('previous_volume_token0', 'DOUBLE PRECISION'),
+    ('previous_volume_token1', 'DOUBLE PRECISION'),
+    ('volume_token0_1day', 'DOUBLE PRECISION'),
+    ('volume_token1_1day', 'DOUBLE PRECISION'),
+    ('token0_address', 'VARCHAR'),
+    ('token1_address', 'VARCHAR'),
+    ('token0_symbol', 'VARCHAR'),
+    ('token1_symbol', 'VARCHAR'),
+    ('token0_price', 'DOUBLE PRECISION'),
+    ('token1_price', 'DOUBLE PRECISION'),
+    ('fee', 'INTEGER'),
+]
+
+CURRENT_TOKEN_METRICS_COLUMNS = [
+    ('timestamp', 'INTEGER'),
+    ('symbol', 'VARCHAR'),
+]
+
+POOL_METRICS_SNAPSHOT_TRIGGER = """
+CREATE OR REPLACE FUNCTION snapshot_pool_metrics() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO current_pool_metrics AS c (
+        pool_address, timestamp, price, liquidity_token0, liquidity_token1, volume_token0, volume_token1,
+        volume_token0_1day, volume_token1_1day,
+        token0_address, token1_address, token0_symbol, token1_symbol, token0_price, token1_price, fee
+    )
+    SELECT
+        NEW.pool_address, NEW.timestamp, NEW.price, NEW.liquidity_token0, NEW.liquidity_token1,
+        NEW.volume_token0, NEW.volume_token1,
+        NEW.volume_token0 - coalesce(baseline.volume_token0, 0), NEW.volume_token1 - coalesce(baseline.volume_token1, 0),
+        pair.token0, pair.token1,
+        (SELECT symbol FROM tokens WHERE address = pair.token0 LIMIT 1),
+        (SELECT symbol FROM tokens WHERE address = pair.token1 LIMIT 1),
+        (SELECT price FROM current_token_metrics WHERE token_address = pair.token0),
+        (SELECT price FROM current_token_metrics WHERE token_address = pair.token1),
+        pair.fee
+    FROM (SELECT 1) placeholder
+    LEFT JOIN LATERAL (
+        SELECT token0, token1, fee FROM token_pairs WHERE pool = NEW.pool_address LIMIT 1
+    ) pair ON true
+    LEFT JOIN LATERAL (
+        SELECT volume_token0, volume_token1 FROM pool_metrics
+        WHERE pool_address = NEW.pool_address AND timestamp <= NEW.timestamp - 86400
+        ORDER BY timestamp DESC LIMIT 1
+    ) baseline ON true
+    ON CONFLICT (pool_address) DO UPDATE SET
+        -- The row being replaced becomes the previous bucket.
+        previous_timestamp = c.timestamp, previous_price = c.price,
+        previous_liquidity_token0 = c.liquidity_token0, previous_liquidity_token1 = c.liquidity_token1,
+        previous_volume_token0 = c.volume_token0, previous_volume_token1 = c.volume_token1,
+        timestamp = EXCLUDED.timestamp, price = EXCLUDED.price,
+        liquidity_token0 = EXCLUDED.liquidity_token0, liquidity_token1 = EXCLUDED.liquidity_token1,
+        volume_token0 = EXCLUDED.volume_token0, volume_token1 = EXCLUDED.volume_token1,
+        volume_token0_1day = EXCLUDED.volume_token0_1day, volume_token1_1day = EXCLUDED.volume_token1_1day,
+        token0_address = coalesce(EXCLUDED.token0_address, c.token0_address),
+        token1_address = coalesce(EXCLUDED.token1_address, c.token1_address),
+        token0_symbol = coalesce(EXCLUDED.token0_symbol, c.token0_symbol),
+        token1_symbol = coalesce(EXCLUDED.token1_symbol, c.token1_symbol),
+        token0_price = coalesce(EXCLUDED.token0_price, c.token0_price),
+        token1_price = coalesce(EXCLUDED.token1_price, c.token1_price),
+        fee = coalesce(EXCLUDED.fee, c.fee)
+    WHERE c.timestamp IS NULL OR c.timestamp < EXCLUDED.timestamp;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+TOKEN_METRICS_SNAPSHOT_TRIGGER = """
+CREATE OR REPLACE FUNCTION snapshot_token_metrics() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO current_token_metrics AS c (token_address, timestamp, price, total_volume, total_liquidity, symbol)
+    VALUES (
+        NEW.token_address, NEW.timestamp, NEW.close_price, NEW.total_volume, NEW.total_liquidity,
+        (SELECT symbol FROM tokens WHERE address = NEW.token_address LIMIT 1)
+    )
+    ON CONFLICT (token_address) DO UPDATE SET
+        timestamp = EXCLUDED.timestamp, price = EXCLUDED.price, total_volume = EXCLUDED.total_volume,
+        total_liquidity = EXCLUDED.total_liquidity, symbol = coalesce(EXCLUDED.symbol, c.symbol)
+    WHERE c.timestamp IS NULL OR c.timestamp < EXCLUDED.timestamp;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+TOKEN_PRICE_PROPAGATION_TRIGGER = """
+CREATE OR REPLACE FUNCTION propagate_token_price() RETURNS trigger AS $$
+BEGIN
+    UPDATE current_pool_metrics SET token0_price = NEW.price
+    WHERE token0_address = NEW.token_address AND token0_price IS DISTINCT FROM NEW.price;
+    UPDATE current_pool_metrics SET token1_price = NEW.price
+    WHERE token1_address = NEW.token_address AND token1_price IS DISTINCT FROM NEW.price;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+TOKEN_SYMBOL_PROPAGATION_TRIGGER = """
+CREATE OR REPLACE FUNCTION propagate_token_symbol() RETURNS trigger AS $$
+BEGIN
+    UPDATE current_token_metrics SET symbol = NEW.symbol WHERE token_address = NEW.address AND symbol IS NULL;
+    UPDATE current_pool_metrics SET token0_symbol = NEW.symbol WHERE token0_address = NEW.address AND token0_symbol IS NULL;
+    UPDATE current_pool_metrics SET token1_symbol = NEW.symbol WHERE token1_address = NEW.address AND token1_symbol IS NULL;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+POOL_EVENT_COUNT_TRIGGER = """
+CREATE OR REPLACE FUNCTION count_pool_events() RETURNS trigger AS $$
+BEGIN
+    -- The table name is passed as an argument because on hypertables TG_TABLE_NAME is the chunk.
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO pool_event_counts AS c (table_name, pool_address, day, event_count)
+        VALUES (TG_ARGV[0], NEW.pool_address, NEW.timestamp - NEW.timestamp % 86400, 1)
+        ON CONFLICT (table_name, pool_address, day) DO UPDATE SET event_count = c.event_count + 1;
+    ELSIF NOT EXISTS (
+        -- Rows below the seeding high-water mark that are not seeded yet were never counted.
+        SELECT 1 FROM pool_event_count_seeds
+        WHERE table_name = TG_ARGV[0] AND OLD.id > seeded_id AND OLD.id <= high_water_id
+    ) THEN
+        UPDATE pool_event_counts SET event_count = event_count - 1
+        WHERE table_name = TG_ARGV[0] AND pool_address = OLD.pool_address AND day = OLD.timestamp - OLD.timestamp % 86400;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+# Same counters as count_pool_events, but bulk loads maintain pool_event_counts per batch themselves.
+BULK_LOAD_AWARE_POOL_EVENT_COUNT_TRIGGER = """
+CREATE OR REPLACE FUNCTION count_pool_events() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('velora.bulk_load', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO pool_event_counts AS c (table_name, pool_address, day, event_count)
+        VALUES (TG_ARGV[0], NEW.pool_address, NEW.timestamp - NEW.timestamp % 86400, 1)
+        ON CONFLICT (table_name, pool_address, day) DO UPDATE SET event_count = c.event_count + 1;
+    ELSIF NOT EXISTS (
+        -- Rows below the seeding high-water mark that are not seeded yet were never counted.
+        SELECT 1 FROM pool_event_count_seeds
+        WHERE table_name = TG_ARGV[0] AND OLD.id > seeded_id AND OLD.id <= high_water_id
+    ) THEN
+        UPDATE pool_event_counts SET event_count = event_count - 1
+        WHERE table_name = TG_ARGV[0] AND pool_address = OLD.pool_address AND day = OLD.timestamp - OLD.timestamp % 86400;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+MIGRATIONS = [
+    Migration(
+        1,
+        'Composite and BRIN indexes for event, metric and token pair lookups',
+        indexes=[
+            index
+            for table in EVENT_TABLES
+            for index in [
+                ConcurrentIndex(f'ix_{table}_pool_timestamp', table, 'pool_address, timestamp, id'),
+                ConcurrentIndex(f'ix_{table}_block_number_brin', table, 'block_number', using='brin'),
+            ]
+        ] + [
+            ConcurrentIndex('ix_pool_metrics_pool_timestamp', 'pool_metrics', 'pool_address, timestamp'),
+            ConcurrentIndex('ix_token_metrics_token_timestamp', 'token_metrics', 'token_address, timestamp'),
+            ConcurrentIndex('ix_token_pairs_token0', 'token_pairs', 'token0'),
+            ConcurrentIndex('ix_token_pairs_token1', 'token_pairs', 'token1'),
+            ConcurrentIndex('ix_token_pairs_block_number', 'token_pairs', 'block_number'),
+            ConcurrentIndex('ix_token_pairs_last_synced_time', 'token_pairs', 'last_synced_time'),
+        ],
+    ),
+    Migration(
+        2,
+        'Maintain 15min/1h/6h/1d/1w pool and token metric rollups on insert',
+        statements=[
+            POOL_METRICS_ROLLUP_TRIGGER,
+            'DROP TRIGGER IF EXISTS pool_metrics_rollup ON pool_metrics',
+            'CREATE TRIGGER pool_metrics_rollup AFTER INSERT ON pool_metrics FOR EACH ROW EXECUTE FUNCTION rollup_pool_metrics()',
+            TOKEN_METRICS_ROLLUP_TRIGGER,
+            'DROP TRIGGER IF EXISTS token_metrics_rollup ON token_metrics',
+            'CREATE TRIGGER token_metrics_rollup AFTER INSERT ON token_metrics FOR EACH ROW EXECUTE FUNCTION rollup_token_metrics()',
+        ],
+        # The triggers only cover rows inserted from now on; existing history is rolled up window by window.
+        backfill=rebuild_rollups,
+    ),
+    Migration(
+        3,
+        'Maintain current_pool_metrics and current_token_metrics snapshots on insert',
+        statements=[
+            f'ALTER TABLE current_pool_metrics ADD COLUMN IF NOT EXISTS {column} {column_type}'
+            for column, column_type in CURRENT_POOL_METRICS_COLUMNS
+        ] + [
+            f'ALTER TABLE current_token_metrics ADD COLUMN IF NOT EXISTS {column} {column_type}'
+            for column, column_type in CURRENT_TOKEN_METRICS_COLUMNS
+        ] + [
+            POOL_METRICS_SNAPSHOT_TRIGGER,
+            'DROP TRIGGER IF EXISTS pool_metrics_snapshot ON pool_metrics',
+            'CREATE TRIGGER pool_metrics_snapshot AFTER INSERT ON pool_metrics FOR EACH ROW EXECUTE FUNCTION snapshot_pool_metrics()',
+            TOKEN_METRICS_SNAPSHOT_TRIGGER,
+            'DROP TRIGGER IF EXISTS token_metrics_snapshot ON token_metrics',
+            'CREATE TRIGGER token_metrics_snapshot AFTER INSERT ON token_metrics FOR EACH ROW EXECUTE FUNCTION snapshot_token_metrics()',
+            # Seed before the propagation triggers exist so seeding does not fan out into per-token updates.
+            REBUILD_CURRENT_TOKEN_METRICS,
+            REBUILD_CURRENT_POOL_METRICS,
+            TOKEN_PRICE_PROPAGATION_TRIGGER,
+            'DROP TRIGGER IF EXISTS current_token_metrics_price ON current_token_metrics',
+            'CREATE TRIGGER current_token_metrics_price AFTER INSERT OR UPDATE OF price ON current_token_metrics FOR EACH ROW EXECUTE FUNCTION propagate_token_price()',
+            TOKEN_SYMBOL_PROPAGATION_TRIGGER,
+            'DROP TRIGGER IF EXISTS tokens_symbol ON tokens',
+            'CREATE TRIGGER tokens_symbol AFTER INSERT ON tokens FOR EACH ROW EXECUTE FUNCTION propagate_token_symbol()',
+        ],
+        indexes=[
+            ConcurrentIndex(f'ix_current_pool_metrics_{column}', 'current_pool_metrics', column)
+            for column in ['liquidity_token0', 'liquidity_token1', 'volume_token0', 'volume_token1', 'timestamp', 'token0_address', 'token1_address']
+        ] + [
+            ConcurrentIndex(f'ix_current_token_metrics_{column}', 'current_token_metrics', column)
+            for column in ['price', 'total_volume', 'total_liquidity']
+        ],
+    ),
+    Migration(
+        4,
+        'Keep per-pool per-day event counters in pool_event_counts',
+        statements=[POOL_EVENT_COUNT_SEEDS_TABLE, POOL_EVENT_COUNT_TRIGGER] + [
+            statement
+            for table in EVENT_TABLES
+            for statement in [
+                f'DROP TRIGGER IF EXISTS {table}_count ON {table}',
+                f"CREATE TRIGGER {table}_count AFTER INSERT OR DELETE ON {table} FOR EACH ROW EXECUTE FUNCTION count_pool_events('{table}')",
+                # The trigger counts every row after the high-water mark; the rows up to it are seeded in batches.
+                RECORD_POOL_EVENT_COUNT_SEED.format(table=table),
+            ]
+        ],
+        backfill=lambda engine: seed_pool_event_counts(engine, EVENT_TABLES),
+    ),
+    Migration(
+        5,
+        'Unique token addresses and pool addresses for idempotent bulk inserts',
+        statements=[
+            # Keep the first row written for each address; later copies were duplicate inserts.
+            'DELETE FROM tokens t USING tokens d WHERE t.address = d.address AND t.id > d.id',
+            'DELETE FROM token_pairs t USING token_pairs d WHERE t.pool = d.pool AND t.id > d.id',
+        ],
+        indexes=[
+            ConcurrentIndex('ux_tokens_address', 'tokens', 'address', unique=True),
+            ConcurrentIndex('ux_token_pairs_pool', 'token_pairs', 'pool', unique=True),
+        ],
+    ),
+    Migration(
+        6,
+        'Deduplicate events on (block_number, transaction_hash, log_index) for idempotent bulk loads',
+        # Adding a nullable column is metadata-only. NULLs never conflict in the unique index, so it builds
+        # over existing rows; `db.cli backfill-log-index` dedupes and numbers them, then makes the column NOT NULL.
+        statements=[
+            f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS log_index INTEGER'
+            for table in EVENT_TABLES
+        ] + [
+            BULK_LOAD_AWARE_POOL_EVENT_COUNT_TRIGGER,
+        ],
+        indexes=[
+            ConcurrentIndex(f'ux_{table}_block_transaction_log', table, 'block_number, transaction_hash, log_index', unique=True)
+            for table in EVENT_TABLES
+        ],
+    ),
+    Migration(
+        7,
+        'Decoded NUMERIC(78,0) and decimal-adjusted amount columns on the event tables',
+        # Adding nullable columns without defaults is metadata-only; existing rows are filled by `db.cli backfill-numeric`.
+        statements=[HEX_TO_NUMERIC] + [
+            f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {field}_value NUMERIC(78, 0)'
+            for table, fields in NUMERIC_FIELDS.items()
+            for field, _ in fields
+        ] + [
+            f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS amount{token}_adjusted DOUBLE PRECISION'
+            for table in NUMERIC_FIELDS
+            for token in ['0', '1']
+        ],
+    ),
+    Migration(
+        8,
+        'Pool and block range index for streaming one pool\'s events',
+        indexes=[
+            ConcurrentIndex(f'ix_{table}_pool_block', table, 'pool_address, block_number, id')
+            for table in EVENT_TABLES
+        ],
+    ),
+]
+
+def applied_versions(engine: Engine) -> List[int]:
+    with engine.begin() as connection:
+        connection.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_migrations ('
+            'version INTEGER PRIMARY KEY, description VARCHAR NOT NULL, applied_at INTEGER NOT NULL)'
+        ))
+        # Rows recorded before this column existed were applied in full.
+        connection.execute(text('ALTER TABLE schema_migrations ADD COLUMN IF NOT EXISTS completed BOOLEAN NOT NULL DEFAULT true'))
+        return [row[0] for row in connection.execute(text('SELECT version FROM schema_migrations'))]
+
+def migration_completed(engine: Engine, version: int) -> bool:
+    """Whether a migration has been applied and its index builds and backfills have finished."""
+    with engine.connect() as connection:
+        return bool(connection.execute(text('SELECT completed FROM schema_migrations WHERE version = :version'), {'version': version}).scalar())
+
+def apply_migrations(engine: Engine, migrations: List[Migration] = MIGRATIONS, defer: bool = False) -> List[int]:
+    """
+    Apply every pending migration in version order and return the versions applied.
+
+    The statements of every migration run first. Index builds and backfills are recorded as
+    incomplete and run by complete_migrations, right away or, with defer, later in the background.
+    """
+    done = set(applied_versions(engine))
+    applied = []
+    for migration in sorted(migrations, key=lambda migration: migration.version):
+        if migration.version in done:
+            continue
+        log(f'Applying migration {migration.version}: {migration.description}')
+        migration.apply_statements(engine)
+        with engine.begin() as connection:
+            connection.execute(
+                text('INSERT INTO schema_migrations (version, description, applied_at, completed) VALUES (:version, :description, :applied_at, false)'),
+                {'version': migration.version, 'description': migration.description, 'applied_at': int(datetime.now().timestamp())},
+            )
+        applied.append(migration.version)
+    if not defer:
+        complete_migrations(engine, migrations)
+    return applied
+
+def complete_migrations(engine: Engine, migrations: List[Migration] = MIGRATIONS) -> List[int]:
+    """Finish the index builds and backfills of applied migrations, in version order, and return their versions."""
+    with engine.connect() as connection:
+        pending = {row[0] for row in connection.execute(text('SELECT version FROM schema_migrations WHERE NOT completed'))}
+    completed = []
+    for migration in sorted(migrations, key=lambda migration: migration.version):
+        if migration.version not in pending:
+            continue
+        log(f'Completing migration {migration.version}: {migration.description}')
+        migration.complete(engine)
+        with engine.begin() as connection:
+            connection.execute(text('UPDATE schema_migrations SET completed = true WHERE version = :version'), {'version': migration.version})
+        completed.append(migration.version)
+    return completed
+
+class MigrationRunner(threading.Thread):
+    """
+    Background thread that completes deferred migrations, retrying after failures such as lock timeouts.
+
+    ready is set once every applied migration is complete, so writers that rely on the new
+    indexes can wait for it.
+    """
+    def __init__(self, engine: Engine, migrations: List[Migration] = MIGRATIONS, retry_interval: int = 60) -> None:
+        super().__init__(daemon=True, name='migrations')
+        self.engine = engine
+        self.migrations = migrations
+        self.retry_interval = retry_interval
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                complete_migrations(self.engine, self.migrations)
+                self.ready.set()
+                log('Migrations are complete')
+                return
+            except Exception as e:
+                log(f'Completing migrations failed, retrying in {self.retry_interval}s: {e}')
+                self.stopped.wait(self.retry_interval)
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+def index_report(engine: Engine) -> List[Dict[str, Union[str, int, float, bool]]]:
+    """Report size, scan counts, validity and estimated bloat for every index on the miner tables."""
+    with engine.connect() as connection:
+        rows = connection.execute(text(
+            'SELECT s.relname AS table_name, s.indexrelname AS index_name, s.idx_scan, s.idx_tup_read, '
+            'pg_relation_size(s.indexrelid) AS size_bytes, i.indisvalid AS is_valid, a.amname AS access_method '
+            'FROM pg_stat_user_indexes s '
+            'JOIN pg_index i ON i.indexrelid = s.indexrelid '
+            'JOIN pg_class c ON c.oid = s.indexrelid '
+            'JOIN pg_am a ON a.oid = c.relam '
+            'ORDER BY pg_relation_size(s.indexrelid) DESC'
+        )).mappings().all()
+        has_pgstattuple = connection.execute(
+            text("SELECT count(*) FROM pg_extension WHERE extname = 'pgstattuple'")
+        ).scalar() > 0
+
+        report = []
+        for row in rows:
+            entry = dict(row)
+            entry['bloat_percent'] = None
+            if has_pgstattuple and row['access_method'] == 'btree' and row['size_bytes'] > 0:
+                density = connection.execute(
+                    text('SELECT avg_leaf_density FROM pgstatindex(:name)'), {'name': row['index_name']}
+                ).scalar()
+                if density is not None and not math.isnan(density):
+                    entry['bloat_percent'] = round(100 - density, 2)
+            report.append(entry)
+        return report
@@ -0,0 +1,164 @@
+import re
+import threading
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from typing import List, Tuple, Optional
+
+from utils.log import log
+from db.timescale import BLOCKS_PER_DAY
+from db.miner_migrations import MIGRATIONS, EVENT_TABLES, LOCK_TIMEOUT, is_partitioned, partitions_of
+
+# One partition per ~30 days of blocks, so a one-day block range touches one or two partitions.
+PARTITION_BLOCKS = 30 * BLOCKS_PER_DAY
+# Partitions kept ready beyond the newest stored block, so ingestion never hits a missing range.
+PARTITIONS_AHEAD = 3
+ARCHIVE_SCHEMA = 'archive'
+
+def partition_start(block_number: int) -> int:
+    return block_number - block_number % PARTITION_BLOCKS
+
+def partition_name(table: str, start_block: int) -> str:
+    return f'{table}_p{start_block // PARTITION_BLOCKS}'
+
+def table_indexes(table: str):
+    return [index for migration in MIGRATIONS for index in migration.indexes if index.table == table]
+
+def partition_bounds(connection, table: str) -> List[Tuple[str, Optional[int], Optional[int]]]:
+    """Return (partition, from_block, to_block) for each attached partition; None stands for MINVALUE/MAXVALUE."""
+    bounds = []
+    for partition in partitions_of(connection, table):
+        expression = connection.execute(
+            text('SELECT pg_get_expr(relpartbound, oid) FROM pg_class WHERE oid = CAST(:partition AS regclass)'),
+            {'partition': partition},
+        ).scalar()
+        lower, upper = re.search(r"FROM \((.+?)\) TO \((.+?)\)", expression).groups()
+        bounds.append((partition, *[None if value.endswith('VALUE') else int(value.strip("'")) for value in [lower, upper]]))
+    return bounds
+
+def head_block(connection, table: str) -> int:
+    return connection.execute(text(f'SELECT coalesce(max(block_number), 0) FROM {table}')).scalar()
+
+def create_partitions(connection, table: str, start_block: int, end_block: int) -> None:
+    for lower in range(start_block, end_block, PARTITION_BLOCKS):
+        name = partition_name(table, lower)
+        log(f'Creating partition {name} for blocks [{lower}, {lower + PARTITION_BLOCKS})')
+        connection.execute(text(
+            f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} FOR VALUES FROM ({lower}) TO ({lower + PARTITION_BLOCKS})'
+        ))
+
+def partition_table(engine: Engine, table: str) -> None:
+    """
+    Turn an event table into a table range-partitioned on block_number without copying its rows.
+
+    The existing table becomes the partition for every block below a bound just past its newest
+    block. A validated CHECK constraint proves the bound, so attaching it skips the table scan and
+    the exclusive lock is held only for catalog changes. Existing indexes are renamed and reused.
+    """
+    with engine.connect() as connection:
+        if is_partitioned(connection, table):
+            return
+    legacy = f'{table}_legacy'
+    with engine.begin() as connection:
+        # Leave a partition of headroom for rows written while the constraint validates.
+        bound = partition_start(head_block(connection, table)) + 2 * PARTITION_BLOCKS
+        connection.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        connection.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {legacy}_range'))
+        connection.execute(text(f'ALTER TABLE {table} ADD CONSTRAINT {legacy}_range CHECK (block_number < {bound}) NOT VALID'))
+    log(f'Validating {table} blocks are below {bound}')
+    with engine.begin() as connection:
+        # VALIDATE takes a lock that still lets ingestion write.
+        connection.execute(text(f'ALTER TABLE {table} VALIDATE CONSTRAINT {legacy}_range'))
+
+    log(f'Partitioning {table} on block_number')
+    with engine.begin() as connection:
+        connection.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        connection.execute(text(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE'))
+        sequence = connection.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': table}).scalar()
+        index_names = connection.execute(
+            text('SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :table'),
+            {'table': table},
+        ).scalars().all()
+        connection.execute(text(f'ALTER TABLE {table} RENAME TO {legacy}'))
+        for name in index_names:
+            connection.execute(text(f'ALTER INDEX {name} RENAME TO {name}_legacy'))
+        # The parent's counter trigger is cloned onto every partition, including this one.
+        connection.execute(text(f'DROP TRIGGER IF EXISTS {table}_count ON {legacy}'))
+        connection.execute(text(f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (block_number)'))
+        connection.execute(text(f'ALTER TABLE {table} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO ({bound})'))
+        # Each partitioned index adopts the equivalent renamed index on the legacy partition instead of rebuilding it.
+        for index in table_indexes(table):
+            unique = 'UNIQUE ' if index.unique else ''
+            connection.execute(text(f'CREATE {unique}INDEX IF NOT EXISTS {index.name} ON {table} USING {index.using} ({index.columns})'))
+        if sequence:
+            connection.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id'))
+        connection.execute(text(
+            f"CREATE TRIGGER {table}_count AFTER INSERT OR DELETE ON {table} FOR EACH ROW EXECUTE FUNCTION count_pool_events('{table}')"
+        ))
+        create_partitions(connection, table, bound, bound + PARTITIONS_AHEAD * PARTITION_BLOCKS)
+
+def ensure_partitions(engine: Engine, table: str, ahead: int = PARTITIONS_AHEAD) -> None:
+    """Create the partitions covering the newest stored block and the next `ahead` ranges."""
+    with engine.begin() as connection:
+        connection.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        head_start = partition_start(head_block(connection, table))
+        last_upper = max([upper for _, _, upper in partition_bounds(connection, table) if upper is not None], default=head_start)
+        end_block = head_start + (ahead + 1) * PARTITION_BLOCKS
+        if last_upper < end_block:
+            create_partitions(connection, table, last_upper, end_block)
+
+def archive_partitions(engine: Engine, table: str, retention_partitions: int) -> List[str]:
+    """
+    Detach partitions entirely older than the retention window and move them to the archive schema.
+
+    Archived partitions remain queryable as archive.<name> and can be dumped or dropped independently.
+    """
+    with engine.connect() as connection:
+        cutoff = partition_start(head_block(connection, table)) - retention_partitions * PARTITION_BLOCKS
+        expired = [partition for partition, _, upper in partition_bounds(connection, table) if upper is not None and upper <= cutoff]
+    archived = []
+    for partition in expired:
+        log(f'Detaching partition {partition} from {table}')
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(text(f"SET lock_timeout = '{LOCK_TIMEOUT}'"))
+            connection.execute(text(f'ALTER TABLE {table} DETACH PARTITION {partition} CONCURRENTLY'))
+        with engine.begin() as connection:
+            connection.execute(text(f'CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}'))
+            # Archived rows no longer count towards the per-pool event totals.
+            connection.execute(text(
+                f"UPDATE pool_event_counts c SET event_count = c.event_count - d.event_count FROM ("
+                f"SELECT pool_address, timestamp - timestamp % 86400 AS day, count(*) AS event_count FROM {partition} "
+                f"GROUP BY pool_address, timestamp - timestamp % 86400) d "
+                f"WHERE c.table_name = '{table}' AND c.pool_address = d.pool_address AND c.day = d.day"
+            ))
+            connection.execute(text(f"DELETE FROM pool_event_counts WHERE table_name = '{table}' AND event_count <= 0"))
+            connection.execute(text(f'ALTER TABLE {partition} SET SCHEMA {ARCHIVE_SCHEMA}'))
+        archived.append(partition)
+    return archived
+
+class PartitionMaintainer(threading.Thread):
+    """Background thread that keeps event partitions ahead of ingestion and archives expired ones."""
+    def __init__(self, engine: Engine, retention_months: int = 0, interval: int = 60 * 60, tables: List[str] = EVENT_TABLES) -> None:
+        super().__init__(daemon=True, name='partition-maintainer')
+        self.engine = engine
+        self.retention_months = retention_months
+        self.interval = interval
+        self.tables = tables
+        self.stopped = threading.Event()
+
+    def run_once(self) -> None:
+        for table in self.tables:
+            try:
+                ensure_partitions(self.engine, table)
+                if self.retention_months > 0:
+                    archive_partitions(self.engine, table, self.retention_months)
+            except Exception as e:
+                # A lock timeout or a failed detach is retried on the next pass.
+                log(f'Partition maintenance of {table} failed: {e}')
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            self.run_once()
+            self.stopped.wait(self.interval)
+
+    def stop(self) -> None:
+        self.stopped.set()
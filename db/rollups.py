@@ -0,0 +1,94 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from typing import Optional
+
+from utils.log import log
+
+# Bucket sizes in seconds for the pool_metrics_rollup and token_metrics_rollup tables: 15min, 1h, 6h, 1d, 1w.
+# Keep in sync with the trigger functions created by migration 2.
+ROLLUP_RESOLUTIONS = [60 * 15, 60 * 60, 60 * 60 * 6, 60 * 60 * 24, 60 * 60 * 24 * 7]
+# History is rebuilt four weeks at a time; a multiple of every resolution, so no bucket spans two windows.
+REBUILD_WINDOW = 4 * 60 * 60 * 24 * 7
+
+def get_rollup_resolution(interval: int) -> Optional[int]:
+    """Return the coarsest rollup bucket that evenly divides interval, or None when only raw rows fit."""
+    candidates = [resolution for resolution in ROLLUP_RESOLUTIONS if resolution <= interval and interval % resolution == 0]
+    return max(candidates) if candidates else None
+
+REBUILD_POOL_METRICS_ROLLUP = """
+INSERT INTO pool_metrics_rollup (
+    resolution, pool_address, timestamp, last_timestamp, price, high_price, low_price,
+    liquidity_token0, liquidity_token1, volume_token0, volume_token1,
+    bucket_volume_token0, bucket_volume_token1, sample_count
+)
+SELECT
+    :resolution, pool_address, timestamp - timestamp % :resolution AS bucket, max(timestamp),
+    (array_agg(price ORDER BY timestamp DESC))[1], max(price), min(price),
+    (array_agg(liquidity_token0 ORDER BY timestamp DESC))[1], (array_agg(liquidity_token1 ORDER BY timestamp DESC))[1],
+    (array_agg(volume_token0 ORDER BY timestamp DESC))[1], (array_agg(volume_token1 ORDER BY timestamp DESC))[1],
+    coalesce(sum(volume_delta0), 0), coalesce(sum(volume_delta1), 0), count(*)
+FROM (
+    SELECT *,
+        volume_token0 - lag(volume_token0) OVER (PARTITION BY pool_address ORDER BY timestamp) AS volume_delta0,
+        volume_token1 - lag(volume_token1) OVER (PARTITION BY pool_address ORDER BY timestamp) AS volume_delta1
+    FROM pool_metrics
+    WHERE timestamp >= :start_timestamp AND timestamp < :bucket_end
+) metrics
+WHERE timestamp >= :bucket_start
+GROUP BY pool_address, bucket
+ON CONFLICT (resolution, pool_address, timestamp) DO UPDATE SET
+    last_timestamp = EXCLUDED.last_timestamp, price = EXCLUDED.price,
+    high_price = EXCLUDED.high_price, low_price = EXCLUDED.low_price,
+    liquidity_token0 = EXCLUDED.liquidity_token0, liquidity_token1 = EXCLUDED.liquidity_token1,
+    volume_token0 = EXCLUDED.volume_token0, volume_token1 = EXCLUDED.volume_token1,
+    bucket_volume_token0 = EXCLUDED.bucket_volume_token0, bucket_volume_token1 = EXCLUDED.bucket_volume_token1,
+    sample_count = EXCLUDED.sample_count
+"""
+
+REBUILD_TOKEN_METRICS_ROLLUP = """
+INSERT INTO token_metrics_rollup (
+    resolution, token_address, timestamp, last_timestamp, close_price, high_price, low_price,
+    total_volume, total_liquidity, sample_count
+)
+SELECT
+    :resolution, token_address, timestamp - timestamp % :resolution AS bucket, max(timestamp),
+    (array_agg(close_price ORDER BY timestamp DESC))[1], max(high_price), min(low_price),
+    (array_agg(total_volume ORDER BY timestamp DESC))[1], (array_agg(total_liquidity ORDER BY timestamp DESC))[1],
+    count(*)
+FROM token_metrics
+WHERE timestamp >= :bucket_start AND timestamp < :bucket_end
+GROUP BY token_address, bucket
+ON CONFLICT (resolution, token_address, timestamp) DO UPDATE SET
+    last_timestamp = EXCLUDED.last_timestamp, close_price = EXCLUDED.close_price,
+    high_price = EXCLUDED.high_price, low_price = EXCLUDED.low_price,
+    total_volume = EXCLUDED.total_volume, total_liquidity = EXCLUDED.total_liquidity,
+    sample_count = EXCLUDED.sample_count
+"""
+
+def rebuild_rollups(engine: Engine, start_timestamp: int = 0) -> None:
+    """
+    Recompute every rollup bucket from start_timestamp onwards from the raw 5-minute rows.
+
+    The insert triggers keep rollups current as rows arrive; this backfills history recorded
+    before the triggers existed and repairs buckets written out of order. Each window of
+    REBUILD_WINDOW seconds is rebuilt in its own transaction, so a rerun after an interruption
+    only redoes buckets it had already written.
+    """
+    with engine.connect() as connection:
+        oldest, newest = connection.execute(text(
+            'SELECT least(min(p.oldest), min(t.oldest)), greatest(max(p.newest), max(t.newest)) FROM '
+            '(SELECT min(timestamp) AS oldest, max(timestamp) AS newest FROM pool_metrics) p, '
+            '(SELECT min(timestamp) AS oldest, max(timestamp) AS newest FROM token_metrics) t'
+        )).first()
+    if oldest is None:
+        return
+    start_timestamp = max(start_timestamp, oldest)
+    log(f'Rebuilding rollups from {start_timestamp} to {newest}')
+    for window_start in range(start_timestamp - start_timestamp % REBUILD_WINDOW, newest + 1, REBUILD_WINDOW):
+        for resolution in ROLLUP_RESOLUTIONS:
+            bucket_start = max(window_start, start_timestamp - start_timestamp % resolution)
+            parameters = {'resolution': resolution, 'bucket_start': bucket_start, 'bucket_end': window_start + REBUILD_WINDOW}
+            with engine.begin() as connection:
+                # One extra raw row before the first bucket gives its first volume delta a baseline.
+                connection.execute(text(REBUILD_POOL_METRICS_ROLLUP), {**parameters, 'start_timestamp': max(bucket_start - 300, 0)})
+                connection.execute(text(REBUILD_TOKEN_METRICS_ROLLUP), parameters)
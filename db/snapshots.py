@@ -0,0 +1,73 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from utils.log import log
+
+# Latest row per token, found with one backward scan of the (token_address, timestamp) index per token.
+REBUILD_CURRENT_TOKEN_METRICS = """
+INSERT INTO current_token_metrics AS c (token_address, timestamp, price, total_volume, total_liquidity, symbol)
+SELECT token.address, latest.timestamp, latest.close_price, latest.total_volume, latest.total_liquidity, token.symbol
+FROM (SELECT DISTINCT ON (address) address, symbol FROM tokens ORDER BY address, id) token
+JOIN LATERAL (
+    SELECT * FROM token_metrics WHERE token_address = token.address ORDER BY timestamp DESC LIMIT 1
+) latest ON true
+ON CONFLICT (token_address) DO UPDATE SET
+    timestamp = EXCLUDED.timestamp, price = EXCLUDED.price, total_volume = EXCLUDED.total_volume,
+    total_liquidity = EXCLUDED.total_liquidity, symbol = EXCLUDED.symbol
+"""
+
+# Latest, previous and 24h-old row per pool, plus the pair's symbols, fee and current token prices.
+REBUILD_CURRENT_POOL_METRICS = """
+INSERT INTO current_pool_metrics AS c (
+    pool_address, timestamp, price, liquidity_token0, liquidity_token1, volume_token0, volume_token1,
+    previous_timestamp, previous_price, previous_liquidity_token0, previous_liquidity_token1,
+    previous_volume_token0, previous_volume_token1, volume_token0_1day, volume_token1_1day,
+    token0_address, token1_address, token0_symbol, token1_symbol, token0_price, token1_price, fee
+)
+SELECT
+    pair.pool, latest.timestamp, latest.price, latest.liquidity_token0, latest.liquidity_token1,
+    latest.volume_token0, latest.volume_token1,
+    previous.timestamp, previous.price, previous.liquidity_token0, previous.liquidity_token1,
+    previous.volume_token0, previous.volume_token1,
+    latest.volume_token0 - coalesce(baseline.volume_token0, 0), latest.volume_token1 - coalesce(baseline.volume_token1, 0),
+    pair.token0, pair.token1,
+    (SELECT symbol FROM tokens WHERE address = pair.token0 LIMIT 1),
+    (SELECT symbol FROM tokens WHERE address = pair.token1 LIMIT 1),
+    (SELECT price FROM current_token_metrics WHERE token_address = pair.token0),
+    (SELECT price FROM current_token_metrics WHERE token_address = pair.token1),
+    pair.fee
+FROM (SELECT DISTINCT ON (pool) pool, token0, token1, fee FROM token_pairs ORDER BY pool, id) pair
+JOIN LATERAL (
+    SELECT * FROM pool_metrics WHERE pool_address = pair.pool ORDER BY timestamp DESC LIMIT 1
+) latest ON true
+LEFT JOIN LATERAL (
+    SELECT * FROM pool_metrics WHERE pool_address = pair.pool AND timestamp < latest.timestamp ORDER BY timestamp DESC LIMIT 1
+) previous ON true
+LEFT JOIN LATERAL (
+    SELECT * FROM pool_metrics WHERE pool_address = pair.pool AND timestamp <= latest.timestamp - 86400 ORDER BY timestamp DESC LIMIT 1
+) baseline ON true
+ON CONFLICT (pool_address) DO UPDATE SET
+    timestamp = EXCLUDED.timestamp, price = EXCLUDED.price,
+    liquidity_token0 = EXCLUDED.liquidity_token0, liquidity_token1 = EXCLUDED.liquidity_token1,
+    volume_token0 = EXCLUDED.volume_token0, volume_token1 = EXCLUDED.volume_token1,
+    previous_timestamp = EXCLUDED.previous_timestamp, previous_price = EXCLUDED.previous_price,
+    previous_liquidity_token0 = EXCLUDED.previous_liquidity_token0, previous_liquidity_token1 = EXCLUDED.previous_liquidity_token1,
+    previous_volume_token0 = EXCLUDED.previous_volume_token0, previous_volume_token1 = EXCLUDED.previous_volume_token1,
+    volume_token0_1day = EXCLUDED.volume_token0_1day, volume_token1_1day = EXCLUDED.volume_token1_1day,
+    token0_address = EXCLUDED.token0_address, token1_address = EXCLUDED.token1_address,
+    token0_symbol = EXCLUDED.token0_symbol, token1_symbol = EXCLUDED.token1_symbol,
+    token0_price = EXCLUDED.token0_price, token1_price = EXCLUDED.token1_price, fee = EXCLUDED.fee
+"""
+
+def rebuild_snapshots(engine: Engine) -> None:
+    """
+    Recompute current_token_metrics and current_pool_metrics from the raw metric tables.
+
+    Insert triggers keep both snapshots current as new buckets land; this seeds them on an
+    existing database and repairs rows written out of order.
+    """
+    with engine.begin() as connection:
+        log('Rebuilding current_token_metrics')
+        connection.execute(text(REBUILD_CURRENT_TOKEN_METRICS))
+        log('Rebuilding current_pool_metrics')
+        connection.execute(text(REBUILD_CURRENT_POOL_METRICS))
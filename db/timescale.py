@@ -0,0 +1,123 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from typing import List, Dict, Optional, Union
+
+from utils.log import log
+
+DAY = 60 * 60 * 24
+BLOCKS_PER_DAY = DAY // 12
+
+class Hypertable:
+    """How one miner table is chunked and compressed when TimescaleDB storage is enabled."""
+    def __init__(self, table: str, time_column: str, chunk_interval: int, segment_by: str, order_by: str, units_per_day: int) -> None:
+        self.table = table
+        self.time_column = time_column
+        self.chunk_interval = chunk_interval
+        self.segment_by = segment_by
+        self.order_by = order_by
+        self.units_per_day = units_per_day
+
+    @property
+    def now_function(self) -> str:
+        return f'{self.table}_integer_now'
+
+    def now_function_sql(self) -> str:
+        # Metrics are keyed on unix seconds, events on block numbers whose "now" is the newest stored block.
+        if self.time_column == 'timestamp':
+            body = 'SELECT extract(epoch FROM now())::integer'
+        else:
+            body = f'SELECT coalesce(max({self.time_column}), 0) FROM {self.table}'
+        return f'CREATE OR REPLACE FUNCTION {self.now_function}() RETURNS integer LANGUAGE SQL STABLE AS $$ {body} $$'
+
+HYPERTABLES = [
+    Hypertable('pool_metrics', 'timestamp', 7 * DAY, 'pool_address', 'timestamp DESC', DAY),
+    Hypertable('token_metrics', 'timestamp', 7 * DAY, 'token_address', 'timestamp DESC', DAY),
+] + [
+    Hypertable(table, 'block_number', 30 * BLOCKS_PER_DAY, 'pool_address', 'block_number DESC, id DESC', BLOCKS_PER_DAY)
+    for table in ['swap_event', 'mint_event', 'burn_event', 'collect_event']
+]
+
+def is_hypertable(connection, table: str) -> bool:
+    return connection.execute(
+        text('SELECT count(*) FROM timescaledb_information.hypertables WHERE hypertable_name = :table'),
+        {'table': table},
+    ).scalar() > 0
+
+def compression_enabled(connection, table: str) -> bool:
+    return connection.execute(
+        text('SELECT count(*) FROM timescaledb_information.compression_settings WHERE hypertable_name = :table'),
+        {'table': table},
+    ).scalar() > 0
+
+def compression_policy(connection, table: str) -> Optional[int]:
+    """compress_after of the table's compression policy, or None when it has none."""
+    compress_after = connection.execute(
+        text("SELECT config ->> 'compress_after' FROM timescaledb_information.jobs "
+             "WHERE proc_name = 'policy_compression' AND hypertable_name = :table"),
+        {'table': table},
+    ).scalar()
+    return None if compress_after is None else int(compress_after)
+
+def missing_hypertables(engine: Engine, hypertables: List[Hypertable] = HYPERTABLES) -> List[str]:
+    """Tables that enable_timescale has not converted into compressed hypertables yet."""
+    with engine.connect() as connection:
+        if not connection.execute(text("SELECT count(*) > 0 FROM pg_extension WHERE extname = 'timescaledb'")).scalar():
+            return [hypertable.table for hypertable in hypertables]
+        return [
+            hypertable.table for hypertable in hypertables
+            if not is_hypertable(connection, hypertable.table) or not compression_enabled(connection, hypertable.table)
+        ]
+
+def enable_timescale(engine: Engine, compress_after_days: int, hypertables: List[Hypertable] = HYPERTABLES) -> None:
+    """
+    Convert the miner tables into compressed hypertables.
+
+    Existing rows are moved into chunks, which holds a lock on each table while it is converted,
+    so run this once during a maintenance window. Tables already converted with compression
+    enabled are left alone; only a compression policy with a different compress_after is replaced.
+    """
+    with engine.begin() as connection:
+        connection.execute(text('CREATE EXTENSION IF NOT EXISTS timescaledb'))
+
+    for hypertable in hypertables:
+        with engine.begin() as connection:
+            if not is_hypertable(connection, hypertable.table):
+                log(f'Converting {hypertable.table} into a hypertable on {hypertable.time_column}')
+                if hypertable.time_column != 'timestamp':
+                    # Unique constraints on a hypertable must include the partitioning column.
+                    connection.execute(text(f'ALTER TABLE {hypertable.table} DROP CONSTRAINT IF EXISTS {hypertable.table}_pkey'))
+                    connection.execute(text(f'ALTER TABLE {hypertable.table} ADD PRIMARY KEY (id, {hypertable.time_column})'))
+                connection.execute(
+                    text(f"SELECT create_hypertable('{hypertable.table}', '{hypertable.time_column}', "
+                         f"chunk_time_interval => {hypertable.chunk_interval}, migrate_data => true, if_not_exists => true)")
+                )
+            if not compression_enabled(connection, hypertable.table):
+                connection.execute(text(hypertable.now_function_sql()))
+                connection.execute(text(f"SELECT set_integer_now_func('{hypertable.table}', '{hypertable.now_function}', replace_if_exists => true)"))
+                connection.execute(text(
+                    f"ALTER TABLE {hypertable.table} SET (timescaledb.compress, "
+                    f"timescaledb.compress_segmentby = '{hypertable.segment_by}', "
+                    f"timescaledb.compress_orderby = '{hypertable.order_by}')"
+                ))
+            compress_after = compress_after_days * hypertable.units_per_day
+            current = compression_policy(connection, hypertable.table)
+            if current != compress_after:
+                log(f'Compressing {hypertable.table} chunks older than {compress_after_days} days')
+                if current is not None:
+                    connection.execute(text(f"SELECT remove_compression_policy('{hypertable.table}')"))
+                connection.execute(text(f"SELECT add_compression_policy('{hypertable.table}', compress_after => {compress_after})"))
+
+def compression_report(engine: Engine) -> List[Dict[str, Union[str, int]]]:
+    """Report chunk counts and on-disk size before and after compression for each hypertable."""
+    with engine.connect() as connection:
+        report = []
+        for hypertable in HYPERTABLES:
+            if not is_hypertable(connection, hypertable.table):
+                continue
+            stats = connection.execute(
+                text('SELECT total_chunks, number_compressed_chunks, before_compression_total_bytes, after_compression_total_bytes '
+                     'FROM hypertable_compression_stats(:table)'),
+                {'table': hypertable.table},
+            ).mappings().first()
+            report.append({'table_name': hypertable.table, **dict(stats)})
+        return report
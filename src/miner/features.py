@@ -0,0 +1,28 @@
+from typing import List, Optional
+
+import numpy as np
+from pandas import DataFrame
+
+from ta.trend import MACD
+from ta.momentum import RSIIndicator
+
+from src.miner.indicators import IndicatorState
+
+# Model inputs, in the column order the scalers were fitted with.
+FEATURE_COLUMNS = ['close_price', 'SMA_50', 'SMA_200', 'RSI', 'MACD']
+
+def add_features(input: DataFrame) -> DataFrame:
+    """Add the indicator columns to a close_price frame and drop the rows they are not defined for."""
+    input['SMA_50'] = input['close_price'].rolling(window=50).mean()
+    input['SMA_200'] = input['close_price'].rolling(window=200).mean()
+    input['RSI'] = RSIIndicator(input['close_price']).rsi()
+    input['MACD'] = MACD(input['close_price']).macd()
+
+    input.replace([np.inf, -np.inf], np.nan, inplace = True)
+    input.dropna(inplace = True)
+
+    return input
+
+def latest_features(prices: List[float]) -> Optional[np.ndarray]:
+    """Unscaled feature row of the newest price, or None when the history is too short."""
+    return IndicatorState.from_history(prices).features()
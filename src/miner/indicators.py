@@ -0,0 +1,167 @@
+import threading
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+SMA_FAST = 50
+SMA_SLOW = 200
+RSI_WINDOW = 14
+MACD_FAST = 12
+MACD_SLOW = 26
+
+class RollingMean:
+    """Mean of the last window values, like pandas rolling(window).mean()."""
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self.values = deque(maxlen=window)
+        # Kahan-compensated running sum, as pandas keeps it, so long streams do not drift.
+        self.sum = 0.0
+        self.compensation = 0.0
+
+    def add(self, value: float) -> None:
+        y = value - self.compensation
+        t = self.sum + y
+        self.compensation = t - self.sum - y
+        self.sum = t
+
+    def update(self, value: float) -> None:
+        if len(self.values) == self.window:
+            self.add(-self.values[0])
+        self.values.append(value)
+        self.add(value)
+
+    @property
+    def value(self) -> Optional[float]:
+        return self.sum / self.window if len(self.values) == self.window else None
+
+class EMA:
+    """pandas ewm(alpha=alpha, adjust=False, min_periods=min_periods).mean()."""
+    def __init__(self, alpha: float, min_periods: int) -> None:
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.count = 0
+        self.mean = None
+
+    def update(self, value: float) -> None:
+        self.count += 1
+        if self.mean is None:
+            self.mean = value
+        else:
+            self.mean = ((1 - self.alpha) * self.mean + self.alpha * value) / ((1 - self.alpha) + self.alpha)
+
+    @property
+    def value(self) -> Optional[float]:
+        return self.mean if self.count >= self.min_periods else None
+
+class IndicatorState:
+    """
+    Running SMA_50, SMA_200, RSI and MACD of one close price series, as ta and pandas compute them.
+
+    Each update costs O(1); features() gives the row extract_features would keep last for the
+    same series, or None while the slowest indicator is still warming up.
+    """
+    def __init__(self) -> None:
+        self.timestamp = None
+        self.close = None
+        self.sma_fast = RollingMean(SMA_FAST)
+        self.sma_slow = RollingMean(SMA_SLOW)
+        # ta's RSIIndicator: Wilder smoothing of gains and losses, the first close counting as a zero change.
+        self.gain = EMA(1 / RSI_WINDOW, RSI_WINDOW)
+        self.loss = EMA(1 / RSI_WINDOW, RSI_WINDOW)
+        # ta's MACD: EMAs with span n, i.e. alpha 2 / (n + 1).
+        self.ema_fast = EMA(2 / (MACD_FAST + 1), MACD_FAST)
+        self.ema_slow = EMA(2 / (MACD_SLOW + 1), MACD_SLOW)
+
+    @classmethod
+    def from_history(cls, prices: Iterable[float]) -> 'IndicatorState':
+        state = cls()
+        for price in prices:
+            state.update(price)
+        return state
+
+    def update(self, close: float, timestamp: int = None) -> None:
+        change = 0.0 if self.close is None else close - self.close
+        self.gain.update(max(change, 0.0))
+        self.loss.update(max(-change, 0.0))
+        self.sma_fast.update(close)
+        self.sma_slow.update(close)
+        self.ema_fast.update(close)
+        self.ema_slow.update(close)
+        self.close, self.timestamp = close, timestamp
+
+    def rsi(self) -> Optional[float]:
+        gain, loss = self.gain.value, self.loss.value
+        if gain is None:
+            return None
+        return 100.0 if loss == 0 else 100 - 100 / (1 + gain / loss)
+
+    def features(self) -> Optional[np.ndarray]:
+        """[close_price, SMA_50, SMA_200, RSI, MACD], the FEATURE_COLUMNS order."""
+        sma_slow, rsi, ema_slow = self.sma_slow.value, self.rsi(), self.ema_slow.value
+        if sma_slow is None or rsi is None or ema_slow is None:
+            return None
+        row = np.array([self.close, self.sma_fast.value, sma_slow, rsi, self.ema_fast.value - ema_slow])
+        return row if np.isfinite(row).all() else None
+
+class IndicatorEngine:
+    """
+    IndicatorState per token, fed with each newly stored 5-minute close.
+
+    A token without state, such as every token after a restart, is rebuilt by replaying its
+    stored prices; from then on only closes newer than the last one are applied.
+    """
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.states: Dict[str, IndicatorState] = {}
+
+    def __contains__(self, token_address: str) -> bool:
+        return token_address in self.states
+
+    def rebuild(self, token_address: str, prices: Dict[int, float]) -> None:
+        state = IndicatorState()
+        for timestamp in sorted(prices):
+            state.update(prices[timestamp], timestamp)
+        with self.lock:
+            self.states[token_address] = state
+
+    def extend(self, token_address: str, prices: Dict[int, float]) -> bool:
+        """Apply closes newer than the token's last one; False when the token has no state to extend."""
+        with self.lock:
+            state = self.states.get(token_address)
+            if state is None:
+                return False
+            for timestamp in sorted(prices):
+                if timestamp > state.timestamp:
+                    state.update(prices[timestamp], timestamp)
+            return True
+
+    def features(self, token_address: str, timestamp: int) -> Optional[np.ndarray]:
+        """Feature row of the token as of the close at timestamp, if that is the newest one applied."""
+        with self.lock:
+            state = self.states.get(token_address)
+            if state is None or state.timestamp != timestamp:
+                return None
+            return state.features()
+
+if __name__ == '__main__':
+    # Parity check against the ta based extract_features: python -m src.miner.indicators
+    import time
+
+    import pandas as pd
+
+    from src.miner.features import FEATURE_COLUMNS, add_features
+
+    prices = list(100 * np.exp(np.cumsum(np.random.default_rng(0).normal(0, 0.01, 2000))))
+    expected = add_features(pd.DataFrame(prices, columns=['close_price']))[FEATURE_COLUMNS]
+    state = IndicatorState()
+    rows = {}
+    started = time.perf_counter()
+    for i, price in enumerate(prices):
+        state.update(price, i)
+        rows[i] = state.features()
+    print(f'{(time.perf_counter() - started) / len(prices) * 1e6:.1f} us per update')
+    assert all(rows[i] is None for i in range(len(prices)) if i not in expected.index), 'features before warm-up'
+    difference = max(np.abs(rows[i] - expected.loc[i].values).max() for i in expected.index)
+    print(f'max abs difference over {len(expected)} rows: {difference:.2e}')
+    assert np.allclose(np.stack([rows[i] for i in expected.index]), expected.values, rtol=1e-9, atol=1e-9), 'incremental features do not match ta'
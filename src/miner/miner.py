@@ -3,23 +3,67 @@ from communex.key import generate_keypair
 from communex.compat.key import classic_load_key
 from keylimiter import TokenBucketLimiter
 
+import io
 import os
+import asyncio
+import functools
 import json
 import hashlib
 import pandas as pd
 from datetime import datetime, timezone
 from uniswap_fetcher_rs import UniswapFetcher
 from typing import List
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 from utils.helpers import unsigned_hex_to_int, signed_hex_to_int
 from utils.protocols import *
 from utils.log import log
-from utils.bfs import breadthFirstSearch
-from src.miner.predict_lstm_model import predict_token_price
+from utils.encoding import encode_response, encode_payload, page_document, msgpack
+from utils.token_graph import TokenGraph
+from utils.price_cache import PriceRatioCache
+from src.miner.predict_lstm_model import feature_rows, predict_feature_rows, predict_token_prices
+from src.miner.model_registry import get_registry
+from src.miner.token_pair_sync import TokenPairSyncer
+from src.miner.route_planner import RoutePlanner
+from src.miner.price_oracle import PriceOracle
 from db.miner_db import MinerDBManager
+from utils.config import get_token_pair_sync_interval
 
 START_TIMESTAMP = int(datetime(2021, 5, 4).replace(tzinfo=timezone.utc).timestamp())
 DAY = 60 * 60 * 24
+# Upper bound on leaves per proof request, so a validator cannot request the whole range.
+MAX_COMMITMENT_SAMPLES = 64
+# Upper bound on tokens per batch prediction request.
+MAX_BATCH_PREDICTIONS = 256
+# Synapses added after the original set, advertised in the health check so validators only send them to miners that answer them.
+CAPABILITIES = ['PoolEventCommitmentSynapse', 'PoolEventProofSynapse', 'BatchPredictionSynapse']
+
+# Fields of each row sent by the list endpoints, in wire order.
+CURRENT_POOL_METRIC_FIELDS = list(CurrentPoolMetric.model_fields)
+CURRENT_TOKEN_METRIC_FIELDS = list(CurrentTokenMetric.model_fields)
+POOL_METRIC_API_FIELDS = list(PoolMetricAPI.model_fields)
+TOKEN_METRIC_API_FIELDS = list(TokenMetricAPI.model_fields)
+SWAP_EVENT_API_FIELDS = ['timestamp', 'pool_address', 'block_number', 'transaction_hash', 'sender', 'to', 'amount0', 'amount1', 'sqrt_price_x96', 'liquidity', 'tick']
+MINT_EVENT_API_FIELDS = ['timestamp', 'pool_address', 'block_number', 'transaction_hash', 'sender', 'owner', 'tick_lower', 'tick_upper', 'amount', 'amount0', 'amount1']
+BURN_EVENT_API_FIELDS = ['timestamp', 'pool_address', 'block_number', 'transaction_hash', 'owner', 'tick_lower', 'tick_upper', 'amount', 'amount0', 'amount1']
+
+# Worker threads per kind of endpoint. Each kind queues on its own executor, so slow predictions
+# and full-day event dumps cannot take the threads that health checks and API pages run on.
+QUERY_WORKERS = 8
+BULK_WORKERS = 2
+PREDICTION_WORKERS = 2
+# Processes computing indicator features for batch predictions; with one core they run inline.
+FEATURE_WORKERS = min(4, os.cpu_count() or 1)
+
+def offloaded(executor: str):
+    """Turn a blocking endpoint into a coroutine that runs it on the named miner executor."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(self, *args, **kwargs):
+            return await asyncio.get_running_loop().run_in_executor(getattr(self, executor), functools.partial(fn, self, *args, **kwargs))
+        return wrapper
+    return decorator
 
 class Miner(Module):
     """
@@ -34,96 +78,164 @@ class Miner(Module):
     def __init__(self) -> None:
         super().__init__()
         
-        self.uniswap_fetcher_rs = UniswapFetcher(os.getenv('ETHEREUM_RPC_NODE_URL'))
-        self.db_manager = MinerDBManager()
-        
-        self.last_synced_time = self.db_manager.lastSyncedTimestamp()
-        if self.last_synced_time is None:
-            self.last_synced_time = START_TIMESTAMP
-        self.sync_token_pairs()
-    
-    def sync_token_pairs(self) -> None:
-        log('Syncing token pairs...')
-        
-        now = int(datetime.now().timestamp() - 12)
-        token_pairs = self.uniswap_fetcher_rs.get_pool_created_events_between_two_timestamps(self.last_synced_time, now)
-        self.db_manager.add_token_pairs(token_pairs, now)
-        self.last_synced_time = now
+        self.query_executor = ThreadPoolExecutor(QUERY_WORKERS, thread_name_prefix='query')
+        self.bulk_executor = ThreadPoolExecutor(BULK_WORKERS, thread_name_prefix='bulk')
+        self.prediction_executor = ThreadPoolExecutor(PREDICTION_WORKERS, thread_name_prefix='prediction')
+        # Spawned rather than forked: workers start on demand, after the miner's threads are running.
+        self.feature_executor = ProcessPoolExecutor(FEATURE_WORKERS, mp_context=multiprocessing.get_context('spawn')) if FEATURE_WORKERS > 1 else None
         
-        log(f'Sync finished until {now}')
+        self.uniswap_fetcher_rs = UniswapFetcher(os.getenv('ETHEREUM_RPC_NODE_URL'))
+        self.price_ratios = PriceRatioCache(self.uniswap_fetcher_rs)
+        # Every executor thread can hold a connection without waiting on the pool.
+        self.db_manager = MinerDBManager(pool_size=QUERY_WORKERS + BULK_WORKERS + PREDICTION_WORKERS, max_overflow=4)
+        # Index builds and backfills of new migrations finish in the background while the miner serves.
+        self.db_manager.migrate(defer=True)
+        if self.db_manager.storage_mode == 'partitioned':
+            self.partition_maintainer = self.db_manager.start_partition_maintainer()
+
+        last_synced_time = self.db_manager.lastSyncedTimestamp()
+        if last_synced_time is None:
+            last_synced_time = START_TIMESTAMP
+        self.token_graph = TokenGraph((token_pair['token0'], token_pair['token1']) for token_pair in self.db_manager.fetch_token_pairs())
+        self.route_planner = RoutePlanner(self.db_manager, self.token_graph)
+        # Requests read whatever is synced so far; the catch-up runs in the background.
+        self.token_pair_syncer = TokenPairSyncer(self.uniswap_fetcher_rs, self.db_manager, last_synced_time, get_token_pair_sync_interval(), self.token_graph, self.db_manager.migration_runner.ready)
+        self.token_pair_syncer.start()
+        self.price_oracle = PriceOracle(self.db_manager, self.route_planner, self.price_ratios)
+        self.price_oracle.start()
+        # Load and warm the model before the first prediction request arrives.
+        get_registry().get()
+
+    def prediction_rows(self, requests: List[tuple]) -> list:
+        """
+        Feature rows for (token_address, timestamp) prediction requests.
+
+        A request whose input window ends at the newest stored close reads the oracle's running
+        indicators; older or not yet materialized windows replay their price history.
+        """
+        rows = [self.price_oracle.features(token_address, timestamp - 30 * 60) for token_address, timestamp in requests]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        histories = [self.price_oracle.series(requests[i][0], requests[i][1] - DAY, requests[i][1] - 30 * 60) for i in missing]
+        for i, row in zip(missing, feature_rows(histories, self.feature_executor)):
+            rows[i] = row
+        return rows
 
     @endpoint
+    @offloaded('query_executor')
     def forwardHealthCheckSynapse(self, synapse: dict):
+        synapse = HealthCheckSynapse(**synapse)
         time_completed = self.db_manager.fetch_completed_time()['end']
         token_pairs = self.db_manager.fetch_token_pairs()
         pool_addresses = [token_pair['pool_address'] for token_pair in token_pairs]
         # print(f'HealthCheckResponse returned: {time_completed}, {pool_addresses}')
         
-        return HealthCheckResponse(time_completed = time_completed, pool_addresses = pool_addresses).json()
+        return encode_response(HealthCheckResponse(time_completed = time_completed, pool_addresses = pool_addresses, token_pair_sync_lag = self.token_pair_syncer.lag, capabilities = CAPABILITIES), synapse.encoding)
         
     @endpoint
+    @offloaded('bulk_executor')
     def forwardPoolEventSynapse(self, synapse: dict):
         synapse = PoolEventSynapse(**synapse)
         # Generate a response from scraping the rpc server
         block_number_start, block_number_end = self.uniswap_fetcher_rs.get_block_number_range(synapse.start_datetime, synapse.end_datetime)
-        pool_events = self.db_manager.fetch_pool_events(block_number_start, block_number_end)
-        pool_events_dict = [pool_event.to_dict() for pool_event in pool_events]
-        
-        pool_evnets_string = json.dumps(pool_events_dict)
-        hash_object = hashlib.sha256(pool_evnets_string.encode())  # Convert string to bytes
+        # Each event is serialized once and hashed as it streams in, so only one cursor chunk of rows is alive at a time.
+        # The hash covers the same text as json.dumps(list_of_events).
+        hash_object = hashlib.sha256(b'[')
+        codec = synapse.encoding.partition('+')[0]
+        # msgpack responses are packed event by event too; any other encoding gets the streamed JSON text.
+        packer = msgpack.Packer() if codec == 'msgpack' and msgpack else None
+        data = io.BytesIO() if packer else io.StringIO()
+        event_count = 0
+        for pool_event in self.db_manager.stream_pool_events(synapse.pool_address, block_number_start, block_number_end):
+            pool_event_string = (', ' if event_count else '') + json.dumps(pool_event)
+            hash_object.update(pool_event_string.encode())
+            data.write(packer.pack(pool_event) if packer else pool_event_string)
+            event_count += 1
+        hash_object.update(b']')
         hash_hex = hash_object.hexdigest()  # Get the hash as a hexadecimal string
         
-        return PoolEventResponse(data = pool_events_dict, overall_data_hash = hash_hex).json()
+        if packer:
+            # The map and array headers need the hash and the event count, so they are packed last and put in front.
+            header = packer.pack_map_header(3) + b''.join(packer.pack(value) for value in ['class_name', 'PoolEventResponse', 'overall_data_hash', hash_hex, 'data'])
+            return encode_payload(header + packer.pack_array_header(event_count) + data.getvalue(), synapse.encoding)
+        # Same document PoolEventResponse(...).json() produces, assembled without re-validating every event.
+        document = f'{{"class_name": "PoolEventResponse", "data": [{data.getvalue()}], "overall_data_hash": "{hash_hex}"}}'
+        if codec == 'orjson':
+            return encode_payload(document.encode(), synapse.encoding)
+        return document
+    
+    @endpoint
+    @offloaded('bulk_executor')
+    def forwardPoolEventCommitmentSynapse(self, synapse: dict):
+        synapse = PoolEventCommitmentSynapse(**synapse)
+        block_number_start, block_number_end = self.uniswap_fetcher_rs.get_block_number_range(synapse.start_datetime, synapse.end_datetime)
+        # Commit to the whole range; the validator picks the leaves to check only after seeing the root.
+        tree = self.db_manager.pool_event_merkle_tree(synapse.pool_address, block_number_start, block_number_end)['tree']
+        return encode_response(PoolEventCommitmentResponse(root=tree.root.hex(), leaf_count=tree.leaf_count), synapse.encoding)
+
+    @endpoint
+    @offloaded('bulk_executor')
+    def forwardPoolEventProofSynapse(self, synapse: dict):
+        synapse = PoolEventProofSynapse(**synapse)
+        if len(synapse.indices) > MAX_COMMITMENT_SAMPLES:
+            raise ValueError(f'At most {MAX_COMMITMENT_SAMPLES} leaves per proof request, got {len(synapse.indices)}')
+        block_number_start, block_number_end = self.uniswap_fetcher_rs.get_block_number_range(synapse.start_datetime, synapse.end_datetime)
+        merkle = self.db_manager.fetch_committed_merkle_tree(synapse.pool_address, block_number_start, block_number_end, synapse.root)
+        if merkle is None or merkle['tree'].leaf_count != synapse.leaf_count:
+            raise ValueError(f'No committed tree with root {synapse.root} for {synapse.pool_address}')
+        tree = merkle['tree']
+        if any(not 0 <= index < tree.leaf_count for index in synapse.indices):
+            raise ValueError(f'Leaf indices must be below {tree.leaf_count}')
+        response = PoolEventProofResponse(
+            leaves=self.db_manager.fetch_merkle_leaves(merkle['leaf_refs'], synapse.indices),
+            proofs=[[node.hex() for node in tree.proof(index)] for index in synapse.indices],
+        )
+        return encode_response(response, synapse.encoding)
     
     @endpoint
+    @offloaded('query_executor')
     def forwardPoolMetricSynapse(self, synapse: dict):
         synapse = PoolMetricSynapse(**synapse)
         pool_metric = self.db_manager.find_pool_metric_timetable_pool_address(synapse.timestamp, synapse.pool_address, synapse.interval)
         print(f'pool_metric found: {pool_metric}')
         print(f'pool_metric jsonified: {PoolMetricResponse(**pool_metric).json()}')
-        return PoolMetricResponse(**pool_metric).json()
+        return encode_response(PoolMetricResponse(**pool_metric), synapse.encoding)
     
     @endpoint
+    @offloaded('prediction_executor')
     def forwardPredictionSynapse(self, synapse: PredictionSynapse) -> str:
         synapse = PredictionSynapse(**synapse)
-        self.sync_token_pairs()
-        token_pairs = breadthFirstSearch(self, synapse.token_address)
-        price_in_usd = [1] * (12 * 24 - 6)
-        for token_pair in token_pairs:
-            pool_address = self.db_manager.search_pool_address(token_pair[0], token_pair[1])
-            data = self.uniswap_fetcher_rs.get_pool_price_ratios(pool_address, synapse.timestamp - DAY, synapse.timestamp - 30 * 60, 300)
-            price_in_usd = [price_in_usd[i] * float(data[i]['price_ratio']) for i in range(len(data))]
-        
-        price_history = pd.DataFrame(price_in_usd, columns=['close_price'])
-        prices = predict_token_price(price_history)
+        prices = predict_feature_rows(self.prediction_rows([(synapse.token_address, synapse.timestamp)]))[0]
+        if prices is None:
+            raise ValueError(f'Not enough price history to predict {synapse.token_address}')
         prices = prices.tolist()
         print(f"prices: {prices}")
-        return PredictionResponse(prices=prices).json()
+        return encode_response(PredictionResponse(prices=prices), synapse.encoding)
+    
+    @endpoint
+    @offloaded('prediction_executor')
+    def forwardBatchPredictionSynapse(self, synapse: BatchPredictionSynapse) -> str:
+        synapse = BatchPredictionSynapse(**synapse)
+        if len(synapse.requests) > MAX_BATCH_PREDICTIONS:
+            raise ValueError(f'At most {MAX_BATCH_PREDICTIONS} tokens per batch prediction, got {len(synapse.requests)}')
+        predictions = predict_feature_rows(self.prediction_rows([(request.token_address, request.timestamp) for request in synapse.requests]))
+        response = BatchPredictionResponse(predictions=[None if prices is None else prices.tolist() for prices in predictions])
+        return encode_response(response, synapse.encoding)
     
     @endpoint
+    @offloaded('query_executor')
     def forwardCurrentPoolMetricSynapse(self, synapse: CurrentPoolMetricSynapse):
         synapse = CurrentPoolMetricSynapse(**synapse)
-        db_data = self.db_manager.fetch_current_pool_metrics(synapse.page_limit, synapse.page_number, synapse.search_query, synapse.sort_by, synapse.sort_order)
+        db_data = self.db_manager.fetch_current_pool_metrics(synapse.page_limit, synapse.page_number, synapse.search_query, synapse.sort_by, synapse.sort_order, synapse.cursor, synapse.count_mode)
         pool_metrics = db_data['pool_metrics']
         total_pool_count = db_data['total_pool_count']
-        print(f'current_pool_metrics: {pool_metrics}')
-        data =  [CurrentPoolMetric(
-            pool_address=current_pool_metric["pool_address"],
-            liquidity_token0=current_pool_metric["liquidity_token0"],
-            liquidity_token1=current_pool_metric["liquidity_token1"],
-            total_volume_token0=current_pool_metric["total_volume_token0"],
-            total_volume_token1=current_pool_metric["total_volume_token1"],
-            volume_token0_1day=current_pool_metric["volume_token0_1day"],
-            volume_token1_1day=current_pool_metric["volume_token1_1day"],
-            fee=current_pool_metric["fee"],
-            token0_symbol=current_pool_metric["token0_symbol"],
-            token1_symbol=current_pool_metric["token1_symbol"],
-            token0_price=current_pool_metric["token0_price"],
-            token1_price=current_pool_metric["token1_price"],
-            ) for current_pool_metric in pool_metrics]
-        return CurrentPoolMetricResponse(data = data, overall_data_hash = "", total_pool_count=total_pool_count).json()
+        document = page_document(
+            'CurrentPoolMetricResponse', pool_metrics, CURRENT_POOL_METRIC_FIELDS, synapse.columnar,
+            overall_data_hash="", total_pool_count=total_pool_count, next_cursor=db_data['next_cursor'], total_count_exact=db_data['total_count_exact'],
+        )
+        return encode_response(document, synapse.encoding)
     
     @endpoint
+    @offloaded('query_executor')
     def forwardRecentPoolEventSynapse(self, synapse: RecentPoolEventSynapse):
         synapse = RecentPoolEventSynapse(**synapse)
         pool_events = self.db_manager.fetch_recent_pool_events(synapse.page_limit, synapse.filter_by)
@@ -134,35 +246,33 @@ class Miner(Module):
                 pool_address=pool_address,
                 token0_symbol=token0_symbol,
                 token1_symbol=token1_symbol,
-                amount0=float(signed_hex_to_int(amount0)) / 10 ** token0_decimals if event_type == 'swap' else float(unsigned_hex_to_int(amount0)) / 10 ** token0_decimals,
-                amount1=float(signed_hex_to_int(amount1)) / 10 ** token1_decimals if event_type == 'swap' else float(unsigned_hex_to_int(amount1)) / 10 ** token1_decimals,
+                # Rows loaded before the numeric backfill reached them still carry only the hex amounts.
+                amount0=amount0_adjusted if amount0_adjusted is not None else float(signed_hex_to_int(amount0)) / 10 ** token0_decimals if event_type == 'swap' else float(unsigned_hex_to_int(amount0)) / 10 ** token0_decimals,
+                amount1=amount1_adjusted if amount1_adjusted is not None else float(signed_hex_to_int(amount1)) / 10 ** token1_decimals if event_type == 'swap' else float(unsigned_hex_to_int(amount1)) / 10 ** token1_decimals,
                 event_type=event_type,
                 transaction_hash=transaction_hash
             )
-            for timestamp, pool_address, token0_symbol, token1_symbol, token0_decimals, token1_decimals, amount0, amount1, transaction_hash, event_type in pool_events]
+            for timestamp, pool_address, token0_symbol, token1_symbol, token0_decimals, token1_decimals, amount0, amount1, transaction_hash, amount0_adjusted, amount1_adjusted, event_type in pool_events]
         # print(f'pool_events_dict: {pool_events_dict}')
-        return RecentPoolEventResponse(data = pool_events_dict, overall_data_hash = "").json()
+        return encode_response(RecentPoolEventResponse(data = pool_events_dict, overall_data_hash = ""), synapse.encoding)
     @endpoint
+    @offloaded('query_executor')
     def forwardCurrentTokenMetricSynapse(self, synapse: CurrentTokenMetricSynapse):
         synapse = CurrentTokenMetricSynapse(**synapse)
-        db_data = self.db_manager.fetch_current_token_metrics(synapse.page_limit, synapse.page_number, synapse.search_query, synapse.sort_by)
+        db_data = self.db_manager.fetch_current_token_metrics(synapse.page_limit, synapse.page_number, synapse.search_query, synapse.sort_by, synapse.cursor, synapse.count_mode)
         token_metrics = db_data['token_metrics']
         total_token_count = db_data['total_token_count']
-        print(f'token_metrics: {token_metrics}')
-        
-        data = [CurrentTokenMetric(
-            token_address=token_metric.token_address,
-            symbol=token_metric.symbol,
-            price=token_metric.price,
-            total_volume=token_metric.total_volume,
-            total_liquidity=token_metric.total_liquidity
-            ) for token_metric in token_metrics]
-        return CurrentTokenMetricResponse(data = data, total_token_count = total_token_count).json()
+        document = page_document(
+            'CurrentTokenMetricResponse', token_metrics, CURRENT_TOKEN_METRIC_FIELDS, synapse.columnar,
+            total_token_count=total_token_count, next_cursor=db_data['next_cursor'], total_count_exact=db_data['total_count_exact'],
+        )
+        return encode_response(document, synapse.encoding)
     
     @endpoint
+    @offloaded('query_executor')
     def forwardPoolMetricAPISynapse(self, synapse: PoolMetricAPISynapse):
         synapse = PoolMetricAPISynapse(**synapse)
-        db_data = self.db_manager.fetch_pool_metric_api(synapse.page_limit, synapse.page_number, synapse.pool_address, synapse.interval, synapse.period, synapse.start_timestamp, synapse.end_timestamp)
+        db_data = self.db_manager.fetch_pool_metric_api(synapse.page_limit, synapse.page_number, synapse.pool_address, synapse.interval, synapse.period, synapse.start_timestamp, synapse.end_timestamp, synapse.cursor, synapse.count_mode)
         pool_metrics = db_data['pool_metrics']
         total_pool_count = db_data['total_pool_count']
         token_pair_info = db_data['token_pair_info']
@@ -177,21 +287,18 @@ class Miner(Module):
             fee=token_pair_info.fee,
             pool_address=token_pair_info.pool_address,
         )
-        data = [PoolMetricAPI(
-            timestamp=pool_metric.timestamp,
-            price=pool_metric.price,
-            liquidity_token0=pool_metric.liquidity_token0,
-            liquidity_token1=pool_metric.liquidity_token1,
-            volume_token0=pool_metric.volume_token0,
-            volume_token1=pool_metric.volume_token1,
-            ) for pool_metric in pool_metrics]
         print(f"total_pool_count: {total_pool_count}")
-        return PoolMetricAPIResponse(data = data, token_pair_data=token_pair_data, total_pool_count = total_pool_count).json()
+        document = page_document(
+            'PoolMetricAPIResponse', pool_metrics, POOL_METRIC_API_FIELDS, synapse.columnar,
+            token_pair_data=token_pair_data.model_dump(), total_pool_count=total_pool_count, next_cursor=db_data['next_cursor'], total_count_exact=db_data['total_count_exact'],
+        )
+        return encode_response(document, synapse.encoding)
     
     @endpoint
+    @offloaded('query_executor')
     def forwardTokenMetricAPISynapse(self, synapse: TokenMetricAPISynapse):
         synapse = TokenMetricAPISynapse(**synapse)
-        db_data = self.db_manager.fetch_token_metric_api(synapse.page_limit, synapse.page_number, synapse.token_address, synapse.interval, synapse.period, synapse.start_timestamp, synapse.end_timestamp)
+        db_data = self.db_manager.fetch_token_metric_api(synapse.page_limit, synapse.page_number, synapse.token_address, synapse.interval, synapse.period, synapse.start_timestamp, synapse.end_timestamp, synapse.cursor, synapse.count_mode)
         token_metrics = db_data['token_metrics']
         total_token_count = db_data['total_token_count']
         token_data = db_data['token_data']
@@ -201,97 +308,65 @@ class Miner(Module):
             symbol=token_data.symbol,
             decimals=token_data.decimals,
         )
-        data = [TokenMetricAPI(
-            timestamp=token_metric.timestamp,
-            close_price=token_metric.close_price,
-            high_price=token_metric.high_price,
-            low_price=token_metric.low_price,
-            total_volume=token_metric.total_volume,
-            total_liquidity=token_metric.total_liquidity,
-            ) for token_metric in token_metrics]
         print(f"total_token_count: {total_token_count}")
-        return TokenMetricAPIResponse(data = data, token_data=token_data, total_token_count = total_token_count).json()
+        document = page_document(
+            'TokenMetricAPIResponse', token_metrics, TOKEN_METRIC_API_FIELDS, synapse.columnar,
+            token_data=token_data.model_dump(), total_token_count=total_token_count, next_cursor=db_data['next_cursor'], total_count_exact=db_data['total_count_exact'],
+        )
+        return encode_response(document, synapse.encoding)
     
     @endpoint
+    @offloaded('query_executor')
     def forwardSwapEventAPISynapse(self, synapse: SwapEventAPISynapse):
         synapse = SwapEventAPISynapse(**synapse)
-        db_data = self.db_manager.fetch_swap_event_api(synapse.page_limit, synapse.page_number, synapse.pool_address, synapse.start_timestamp, synapse.end_timestamp)
+        db_data = self.db_manager.fetch_swap_event_api(synapse.page_limit, synapse.page_number, synapse.pool_address, synapse.start_timestamp, synapse.end_timestamp, synapse.cursor, synapse.count_mode)
         pool_events = db_data['swap_events']
         total_swap_count = db_data['total_swap_count']
-        data = [{
-            "timestamp": pool_event.timestamp,
-            "pool_address": pool_event.pool_address,
-            "block_number": pool_event.block_number,
-            "transaction_hash": pool_event.transaction_hash,
-            "sender": pool_event.sender,
-            "to": pool_event.to,
-            "amount0": pool_event.amount0,
-            "amount1": pool_event.amount1,
-            "sqrt_price_x96": pool_event.sqrt_price_x96,
-            "liquidity": pool_event.liquidity,
-            "tick": pool_event.tick,
-            } for pool_event in pool_events]
-        return SwapEventAPIResponse(data = data, total_event_count = total_swap_count).json()
+        document = page_document(
+            'SwapEventAPIResponse', pool_events, SWAP_EVENT_API_FIELDS, synapse.columnar,
+            total_event_count=total_swap_count, next_cursor=db_data['next_cursor'], total_count_exact=db_data['total_count_exact'],
+        )
+        return encode_response(document, synapse.encoding)
     @endpoint
+    @offloaded('query_executor')
     def forwardMintEventAPISynapse(self, synapse: MintEventAPISynapse):
         synapse = MintEventAPISynapse(**synapse)
-        db_data = self.db_manager.fetch_mint_event_api(synapse.page_limit, synapse.page_number, synapse.pool_address, synapse.start_timestamp, synapse.end_timestamp)
+        db_data = self.db_manager.fetch_mint_event_api(synapse.page_limit, synapse.page_number, synapse.pool_address, synapse.start_timestamp, synapse.end_timestamp, synapse.cursor, synapse.count_mode)
         pool_events = db_data['mint_events']
         total_mint_count = db_data['total_mint_count']
-        data = [{
-            "timestamp": pool_event.timestamp,
-            "pool_address": pool_event.pool_address,
-            "block_number": pool_event.block_number,
-            "transaction_hash": pool_event.transaction_hash,
-            "sender": pool_event.sender,
-            "owner": pool_event.owner,
-            "tick_lower": pool_event.tick_lower,
-            "tick_upper": pool_event.tick_upper,
-            "amount": pool_event.amount,
-            "amount0": pool_event.amount0,
-            "amount1": pool_event.amount1,
-            } for pool_event in pool_events]
-        return MintEventAPIResponse(data = data, total_event_count = total_mint_count).json()
+        document = page_document(
+            'MintEventAPIResponse', pool_events, MINT_EVENT_API_FIELDS, synapse.columnar,
+            total_event_count=total_mint_count, next_cursor=db_data['next_cursor'], total_count_exact=db_data['total_count_exact'],
+        )
+        return encode_response(document, synapse.encoding)
     @endpoint
+    @offloaded('query_executor')
     def forwardBurnEventAPISynapse(self, synapse: BurnEventAPISynapse):
         synapse = BurnEventAPISynapse(**synapse)
         print(f"synapse: {synapse}")
-        db_data = self.db_manager.fetch_burn_event_api(synapse.page_limit, synapse.page_number, synapse.pool_address, synapse.start_timestamp, synapse.end_timestamp)
+        db_data = self.db_manager.fetch_burn_event_api(synapse.page_limit, synapse.page_number, synapse.pool_address, synapse.start_timestamp, synapse.end_timestamp, synapse.cursor, synapse.count_mode)
         pool_events = db_data['burn_events']
         total_burn_count = db_data['total_burn_count']
-        data = [{
-            "timestamp": pool_event.timestamp,
-            "pool_address": pool_event.pool_address,
-            "block_number": pool_event.block_number,
-            "transaction_hash": pool_event.transaction_hash,
-            "owner": pool_event.owner,
-            "tick_lower": pool_event.tick_lower,
-            "tick_upper": pool_event.tick_upper,
-            "amount": pool_event.amount,
-            "amount0": pool_event.amount0,
-            "amount1": pool_event.amount1,
-            
-            } for pool_event in pool_events]
-        return BurnEventAPIResponse(data = data, total_event_count = total_burn_count).json()
+        document = page_document(
+            'BurnEventAPIResponse', pool_events, BURN_EVENT_API_FIELDS, synapse.columnar,
+            total_event_count=total_burn_count, next_cursor=db_data['next_cursor'], total_count_exact=db_data['total_count_exact'],
+        )
+        return encode_response(document, synapse.encoding)
     
     @endpoint
+    @offloaded('prediction_executor')
     def forwardPredictionAPISynapse(self, synapse: PredictionAPISynapse) -> str:
         synapse = PredictionAPISynapse(**synapse)
-        self.sync_token_pairs()
-        token_pairs = breadthFirstSearch(self, synapse.token_address)
-        price_in_usd = [1] * (12 * 24)
-        for token_pair in token_pairs:
-            pool_address = self.db_manager.search_pool_address(token_pair[0], token_pair[1])
-            data = self.uniswap_fetcher_rs.get_pool_price_ratios(pool_address, synapse.timestamp - DAY, synapse.timestamp, 300)
-            price_in_usd = [price_in_usd[i] * float(data[i]["price_ratio"]) for i in range(len(data)) if i < 12 * 24]
+        price_in_usd = self.price_oracle.series(synapse.token_address, synapse.timestamp - DAY, synapse.timestamp)[:12 * 24]
         
-        price_history = pd.DataFrame(price_in_usd, columns=['close_price'])
-        predicted_prices = predict_token_price(price_history)
+        predicted_prices = predict_token_prices([price_in_usd])[0]
+        if predicted_prices is None:
+            raise ValueError(f'Not enough price history to predict {synapse.token_address}')
         predicted_prices = predicted_prices.tolist()
         predicted_data = [ {"timestamp": synapse.timestamp + i * 300, "price": predicted_prices[i]} for i in range(len(predicted_prices))]
         historical_data = [ {"timestamp": synapse.timestamp - DAY + i * 300, "price": price_in_usd[i]} for i in range(len(price_in_usd))][-10:]
         token_symbol = self.db_manager.get_token_info(synapse.token_address).symbol
-        return PredictionAPIResponse( historical_data=historical_data, predicted_data=predicted_data, token_symbol=token_symbol).json()
+        return encode_response(PredictionAPIResponse( historical_data=historical_data, predicted_data=predicted_data, token_symbol=token_symbol), synapse.encoding)
 
 if __name__ == "__main__":
     """
@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+
+from utils.config import get_model_path, get_model_backend
+from utils.log import log
+
+MODEL_FILE = 'lstm_model.h5'
+X_SCALER_FILE = 'X_scaler.pkl'
+Y_SCALER_FILE = 'y_scaler.pkl'
+# Seconds between checks of the model files for changes on disk.
+RELOAD_CHECK_SECONDS = 30
+# 'numpy' runs the forward pass with src.miner.numpy_lstm; 'keras' needs tensorflow.
+BACKENDS = ('numpy', 'keras')
+
+def fingerprint(model_path: str) -> Tuple[Tuple[int, int], ...]:
+    """(mtime, size) of every model file; changes whenever one of them is rewritten."""
+    stats = [os.stat(os.path.join(model_path, name)) for name in (MODEL_FILE, X_SCALER_FILE, Y_SCALER_FILE)]
+    return tuple((stat.st_mtime_ns, stat.st_size) for stat in stats)
+
+class ModelBundle:
+    """One loaded model version: the network and the scalers it was trained with."""
+    def __init__(self, model_path: str, backend: str = 'numpy') -> None:
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown model backend {backend}, expected one of {BACKENDS}')
+        self.model_path = model_path
+        self.backend = backend
+        self.version = fingerprint(model_path)
+        if backend == 'numpy':
+            from src.miner.numpy_lstm import NumpyLSTMModel
+            self.model = NumpyLSTMModel.from_h5(os.path.join(model_path, MODEL_FILE))
+        else:
+            from tensorflow.keras.models import load_model
+            self.model = load_model(os.path.join(model_path, MODEL_FILE), compile=False)
+        self.X_scaler = joblib.load(os.path.join(model_path, X_SCALER_FILE))
+        self.y_scaler = joblib.load(os.path.join(model_path, Y_SCALER_FILE))
+        # The first Keras call traces the graph; pay for it here rather than on a request.
+        self.forward(np.zeros((1, 1, self.X_scaler.n_features_in_), dtype=np.float32))
+
+    def forward(self, X: np.ndarray) -> np.ndarray:
+        """Scaled predictions for a (batch, 1, features) input."""
+        return np.asarray(self.model(X, training=False))
+
+class ModelRegistry:
+    """
+    Process-wide holder of the current ModelBundle.
+
+    Readers take the current bundle with get() and use it for the whole prediction, so the model
+    and scalers always come from the same version. A new version is loaded and warmed next to the
+    old one and swapped in with a single assignment; if loading fails the old one stays.
+    """
+    def __init__(self, model_path: str = None, backend: str = 'numpy', check_interval: int = RELOAD_CHECK_SECONDS) -> None:
+        self.model_path = model_path or get_model_path()
+        self.backend = backend
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.current: Optional[ModelBundle] = None
+        self.next_check = 0
+
+    def register(self, model_path: str) -> ModelBundle:
+        """Load the model files in model_path and make them the current version."""
+        with self.lock:
+            bundle = ModelBundle(model_path, self.backend)
+            self.model_path, self.current = model_path, bundle
+            self.next_check = time.time() + self.check_interval
+            log(f'Loaded model from {model_path}')
+            return bundle
+
+    def reload_if_changed(self) -> None:
+        with self.lock:
+            if time.time() < self.next_check:
+                return
+            self.next_check = time.time() + self.check_interval
+            try:
+                if self.current is not None and fingerprint(self.model_path) == self.current.version:
+                    return
+                self.current = ModelBundle(self.model_path, self.backend)
+                log(f'Reloaded model from {self.model_path}')
+            except Exception as e:
+                # Files may be half written; keep serving the loaded version and retry on the next check.
+                if self.current is None:
+                    raise
+                log(f'Model reload from {self.model_path} failed: {e}')
+
+    def get(self) -> ModelBundle:
+        if self.current is None or time.time() >= self.next_check:
+            self.reload_if_changed()
+        return self.current
+
+registry_lock = threading.Lock()
+registries: Dict[str, ModelRegistry] = {}
+
+def get_registry(backend: str = None) -> ModelRegistry:
+    """The process-wide registry of a backend, MINER_MODEL_BACKEND by default."""
+    backend = backend or get_model_backend()
+    with registry_lock:
+        if backend not in registries:
+            registries[backend] = ModelRegistry(backend=backend)
+        return registries[backend]
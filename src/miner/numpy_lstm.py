@@ -0,0 +1,109 @@
+import json
+from typing import List
+
+import h5py
+import numpy as np
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'tanh': np.tanh,
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+    'relu': lambda x: np.maximum(x, 0),
+}
+
+def decode(name) -> str:
+    return name.decode() if isinstance(name, bytes) else name
+
+class LSTMLayer:
+    """Keras LSTM forward pass; the 4 * units gate columns are ordered input, forget, cell, output."""
+    def __init__(self, config: dict, kernel: np.ndarray, recurrent_kernel: np.ndarray, bias: np.ndarray) -> None:
+        self.units = config['units']
+        self.return_sequences = config['return_sequences']
+        self.activation = ACTIVATIONS[config['activation']]
+        self.recurrent_activation = ACTIVATIONS[config['recurrent_activation']]
+        self.kernel, self.recurrent_kernel, self.bias = kernel, recurrent_kernel, bias
+
+    def __call__(self, X: np.ndarray) -> np.ndarray:
+        batch, steps, _ = X.shape
+        # Input projections of every timestep in one matmul; only the recurrence is sequential.
+        projected = (X.reshape(batch * steps, -1) @ self.kernel + self.bias).reshape(batch, steps, -1)
+        h = np.zeros((batch, self.units), dtype=X.dtype)
+        c = np.zeros((batch, self.units), dtype=X.dtype)
+        outputs = []
+        for step in range(steps):
+            z = projected[:, step] if step == 0 else projected[:, step] + h @ self.recurrent_kernel
+            i, f, g, o = np.split(z, 4, axis=1)
+            c = self.recurrent_activation(f) * c + self.recurrent_activation(i) * self.activation(g)
+            h = self.recurrent_activation(o) * self.activation(c)
+            outputs.append(h)
+        return np.stack(outputs, axis=1) if self.return_sequences else h
+
+class DenseLayer:
+    def __init__(self, config: dict, kernel: np.ndarray, bias: np.ndarray = None) -> None:
+        self.activation = ACTIVATIONS[config['activation']]
+        self.kernel, self.bias = kernel, bias
+
+    def __call__(self, X: np.ndarray) -> np.ndarray:
+        X = X @ self.kernel
+        return self.activation(X if self.bias is None else X + self.bias)
+
+LAYERS = {'LSTM': LSTMLayer, 'Dense': DenseLayer}
+# Layers that are the identity at inference time.
+PASSTHROUGH = {'InputLayer', 'Dropout'}
+
+class NumpyLSTMModel:
+    """
+    Inference-only copy of a Keras Sequential LSTM/Dense model saved as .h5, run in NumPy.
+
+    Called like the Keras model, model(X, training=False), with X shaped (batch, timesteps, features).
+    """
+    def __init__(self, layers: List) -> None:
+        self.layers = layers
+
+    @classmethod
+    def from_h5(cls, path: str) -> 'NumpyLSTMModel':
+        with h5py.File(path, 'r') as f:
+            config = json.loads(decode(f.attrs['model_config']))
+            weights = f['model_weights']
+            layers = []
+            for layer in config['config']['layers']:
+                class_name, layer_config = layer['class_name'], layer['config']
+                if class_name in PASSTHROUGH:
+                    continue
+                if class_name not in LAYERS:
+                    raise ValueError(f'Unsupported layer {class_name} in {path}')
+                group = weights[layer_config['name']]
+                arrays = [np.asarray(group[decode(name)], dtype=np.float32) for name in group.attrs['weight_names']]
+                layers.append(LAYERS[class_name](layer_config, *arrays))
+        return cls(layers)
+
+    def __call__(self, X: np.ndarray, training: bool = False) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        for layer in self.layers:
+            X = layer(X)
+        return X
+
+if __name__ == '__main__':
+    # Parity check against Keras: python -m src.miner.numpy_lstm [path/to/lstm_model.h5]
+    import sys
+    import time
+
+    path = sys.argv[1] if len(sys.argv) > 1 else './base_model/lstm_model.h5'
+    model = NumpyLSTMModel.from_h5(path)
+    features = model.layers[0].kernel.shape[0]
+    X = np.random.default_rng(0).random((256, 1, features), dtype=np.float32)
+
+    started = time.perf_counter()
+    for _ in range(100):
+        model(X[:1])
+    print(f'numpy: {(time.perf_counter() - started) * 10:.3f} ms per single prediction')
+
+    try:
+        from tensorflow.keras.models import load_model
+    except ImportError:
+        print('tensorflow is not installed, skipping the parity check')
+        sys.exit(0)
+    expected = np.asarray(load_model(path, compile=False)(X, training=False))
+    difference = np.abs(model(X) - expected).max()
+    print(f'max abs difference over {len(X)} inputs: {difference:.2e}')
+    assert np.allclose(model(X), expected, atol=1e-5), 'NumPy output does not match Keras'
@@ -2,20 +2,20 @@ import numpy as np
 import pandas as pd
 from pandas import DataFrame
 import joblib
-
-from ta.trend import MACD
-from ta.momentum import RSIIndicator, ROCIndicator
+from concurrent.futures import Executor
+from typing import List, Optional
 
 from sklearn.preprocessing import MinMaxScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error
 
-from tensorflow.keras.models import Sequential, load_model
-from tensorflow.keras.layers import LSTM, Dense, Dropout
-
 from db.miner_db import MinerDBManager
+from src.miner.model_registry import ModelBundle, get_registry
+from src.miner.features import FEATURE_COLUMNS, add_features, latest_features
 
 PREDICTION_COUNT = 6
+# Batches smaller than this compute their features inline; a process pool round trip costs more.
+PARALLEL_FEATURES_MIN = 8
 
 db_manager = MinerDBManager()
 
@@ -26,38 +26,26 @@ def load_datasets_from_db(pool_address):
     return input
 
 def extract_features(input):
-    input['SMA_50'] = input['close_price'].rolling(window=50).mean()
-    input['SMA_200'] = input['close_price'].rolling(window=200).mean()
-    input['RSI'] = RSIIndicator(input['close_price']).rsi()
-    # input['Momentum'] = ROCIndicator(input['close_price']).roc()
-    input['MACD'] = MACD(input['close_price']).macd()
-    print(input)
-
-    input.replace([np.inf, -np.inf], np.nan, inplace = True)        
-    input.dropna(inplace = True)
+    input = add_features(input)
     print(input)
     
     return input
 
-def preprocess(dataset: DataFrame):
-    model_path = './base_model'
+def preprocess(dataset: DataFrame, bundle: ModelBundle = None):
+    bundle = bundle or get_registry().get()
     
-    X = dataset[['close_price', 'SMA_50', 'SMA_200', 'RSI', 'MACD']].values
+    X = dataset[FEATURE_COLUMNS].values
     
-    X_scaler = joblib.load(f'{model_path}/X_scaler.pkl')
-    y_scaler = joblib.load(f'{model_path}/y_scaler.pkl')
-    X_scaled = X_scaler.transform(X)
+    X_scaled = bundle.X_scaler.transform(X)
     
-    return X_scaler, y_scaler, X_scaled
+    return bundle.X_scaler, bundle.y_scaler, X_scaled
 
-def predict(X, y_scaler) -> np.ndarray:
-    model_path = './base_model'
+def predict(X, y_scaler, bundle: ModelBundle = None) -> np.ndarray:
+    bundle = bundle or get_registry().get()
     
     X = X[-1].reshape(1, 1, -1)
     
-    model = load_model(f'{model_path}/lstm_model.h5')
-    
-    predicted_prices = model.predict(X)
+    predicted_prices = bundle.forward(X)
     predicted_prices = y_scaler.inverse_transform(predicted_prices)
     
     print('-------------------------------------------')
@@ -65,7 +53,7 @@ def predict(X, y_scaler) -> np.ndarray:
     
     return predicted_prices
 
-def predict_token_price(data: DataFrame = None, pool_address: str = None) -> np.ndarray:
+def predict_token_price(data: DataFrame = None, pool_address: str = None, backend: str = None) -> np.ndarray:
     if data is None and pool_address is None:
         print('No data available.')
         return None
@@ -73,12 +61,43 @@ def predict_token_price(data: DataFrame = None, pool_address: str = None) -> np.
     if data is None:
         data = load_datasets_from_db(pool_address)
     
+    # One bundle for the whole prediction, so a reload in between cannot mix versions.
+    bundle = get_registry(backend).get()
     data = extract_features(data)
-    X_scaler, y_scaler, X = preprocess(data)
-    result = predict(X, y_scaler)
+    X_scaler, y_scaler, X = preprocess(data, bundle)
+    result = predict(X, y_scaler, bundle)
     
     return result[0]
 
+def feature_rows(histories: List[List[float]], executor: Executor = None) -> List[Optional[np.ndarray]]:
+    """Newest feature row of each price history, on executor (a process pool) for larger batches."""
+    if executor is not None and len(histories) >= PARALLEL_FEATURES_MIN:
+        # A few histories per task, so a 100-token batch is a handful of pickling round trips.
+        return list(executor.map(latest_features, histories, chunksize=max(1, len(histories) // 16)))
+    return [latest_features(history) for history in histories]
+
+def predict_feature_rows(rows: List[Optional[np.ndarray]], backend: str = None) -> List[Optional[np.ndarray]]:
+    """
+    Predict many tokens from their unscaled feature rows with one forward pass over the batch.
+
+    The result lines up with rows; a None row (too little history) gets None.
+    """
+    bundle = get_registry(backend).get()
+    results = [None] * len(rows)
+    valid = [i for i, row in enumerate(rows) if row is not None]
+    if not valid:
+        return results
+    X = bundle.X_scaler.transform(np.stack([rows[i] for i in valid]))
+    predicted_prices = bundle.y_scaler.inverse_transform(bundle.forward(X.reshape(len(valid), 1, -1)))
+    for i, prices in zip(valid, predicted_prices):
+        results[i] = prices
+    
+    return results
+
+def predict_token_prices(histories: List[List[float]], backend: str = None, executor: Executor = None) -> List[Optional[np.ndarray]]:
+    """Predict many tokens at once from their USD price histories."""
+    return predict_feature_rows(feature_rows(histories, executor), backend)
+
 if __name__ == '__main__':
     dataset = load_datasets_from_db()
     dataset = extract_features(dataset)
@@ -0,0 +1,111 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.log import log
+from utils.utils import is_stablecoin
+from utils.price_cache import FINALITY_SECONDS
+from src.miner.indicators import IndicatorEngine
+
+BUCKET_SECONDS = 5 * 60
+# Buckets kept materialized behind the newest one; one day covers a prediction's input window.
+HISTORY_SECONDS = 24 * 60 * 60
+
+def final_bucket() -> int:
+    """Newest bucket whose price can no longer change."""
+    final = int(time.time()) - FINALITY_SECONDS
+    return final - final % BUCKET_SECONDS
+
+class PriceOracle(threading.Thread):
+    """
+    Materializes a USD price per token per 5-minute bucket into token_prices.
+
+    Prices chain the pool price ratios along the token's planned route, the same way the
+    prediction endpoints did. A background pass extends every indexed token and every token
+    asked for since startup by the buckets that became final; reads fill any gap on demand.
+    Every stored close also advances the token's running indicators, so the newest feature row
+    is ready without replaying the history.
+    """
+    def __init__(self, db_manager, route_planner, price_ratios, interval: int = BUCKET_SECONDS) -> None:
+        super().__init__(daemon=True, name='price-oracle')
+        self.db_manager = db_manager
+        self.route_planner = route_planner
+        self.price_ratios = price_ratios
+        self.interval = interval
+        self.requested = set()
+        self.indicators = IndicatorEngine()
+        self.stopped = threading.Event()
+
+    def compute(self, token_address: str, start_timestamp: int, end_timestamp: int) -> Dict[int, float]:
+        """USD prices for the buckets in [start_timestamp, end_timestamp); buckets missing a hop's ratio are left out."""
+        prices = {timestamp: 1.0 for timestamp in range(start_timestamp, end_timestamp, BUCKET_SECONDS)}
+        if is_stablecoin(token_address):
+            return prices
+        route = self.route_planner.route(token_address)
+        if not route or any(pool_address is None for _, _, pool_address in route):
+            return {}
+        for _, _, pool_address in route:
+            ratios = self.price_ratios.get_pool_price_ratios(pool_address, start_timestamp, end_timestamp, BUCKET_SECONDS)
+            ratios = {ratio['timestamp']: float(ratio['price_ratio']) for ratio in ratios}
+            prices = {timestamp: price * ratios[timestamp] for timestamp, price in prices.items() if timestamp in ratios}
+        return prices
+
+    def update(self, token_address: str, start_timestamp: int, end_timestamp: int) -> Dict[int, float]:
+        prices = self.compute(token_address, start_timestamp, end_timestamp)
+        newest = final_bucket()
+        final = {timestamp: price for timestamp, price in prices.items() if timestamp <= newest}
+        self.db_manager.add_token_prices(token_address, final)
+        if final and not self.indicators.extend(token_address, final):
+            self.rebuild_indicators(token_address, newest)
+        return prices
+
+    def rebuild_indicators(self, token_address: str, newest: int) -> None:
+        """Replay the stored prices of the last HISTORY_SECONDS, for a token without running indicators."""
+        self.indicators.rebuild(token_address, self.db_manager.fetch_token_prices(token_address, newest - HISTORY_SECONDS + BUCKET_SECONDS, newest + BUCKET_SECONDS))
+
+    def series(self, token_address: str, start_timestamp: int, end_timestamp: int) -> List[float]:
+        """USD prices of a token for the buckets in [start_timestamp, end_timestamp), oldest first."""
+        self.requested.add(token_address)
+        start_timestamp -= start_timestamp % BUCKET_SECONDS
+        prices = self.db_manager.fetch_token_prices(token_address, start_timestamp, end_timestamp)
+        missing = [timestamp for timestamp in range(start_timestamp, end_timestamp, BUCKET_SECONDS) if timestamp not in prices]
+        if missing:
+            computed = self.update(token_address, missing[0], missing[-1] + BUCKET_SECONDS)
+            prices.update({timestamp: computed[timestamp] for timestamp in missing if timestamp in computed})
+        return [prices[timestamp] for timestamp in sorted(prices)]
+
+    def features(self, token_address: str, end_timestamp: int) -> Optional[np.ndarray]:
+        """Running feature row of a token as of the last bucket before end_timestamp, if it has reached it."""
+        end_timestamp -= 1
+        return self.indicators.features(token_address, end_timestamp - end_timestamp % BUCKET_SECONDS)
+
+    def run_once(self) -> None:
+        newest = final_bucket()
+        latest = self.db_manager.fetch_latest_token_price_timestamps()
+        tokens = set(self.db_manager.fetch_indexed_tokens()) | self.requested
+        started = time.time()
+        for token_address in tokens:
+            start_timestamp = max(latest.get(token_address, 0) + BUCKET_SECONDS, newest - HISTORY_SECONDS + BUCKET_SECONDS)
+            try:
+                if token_address in latest and token_address not in self.indicators:
+                    # After a restart the running indicators start from the stored history.
+                    self.rebuild_indicators(token_address, latest[token_address])
+                if start_timestamp <= newest:
+                    self.update(token_address, start_timestamp, newest + BUCKET_SECONDS)
+            except Exception as e:
+                # The token is picked up again on the next pass.
+                log(f'Price oracle update of {token_address} failed: {e}')
+        log(f'Price oracle updated {len(tokens)} tokens up to {newest} in {time.time() - started:.1f}s')
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                log(f'Price oracle pass failed: {e}')
+            self.stopped.wait(self.interval)
+
+    def stop(self) -> None:
+        self.stopped.set()
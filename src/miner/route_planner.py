@@ -0,0 +1,102 @@
+import heapq
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from utils.utils import is_stablecoin
+
+# Routes and pool liquidity are reused for this many seconds before being planned again.
+ROUTE_TTL = 5 * 60
+# Longest route considered; every hop multiplies in another pool's price error.
+MAX_HOPS = 4
+
+class RoutePlanner:
+    """
+    Plans the route from a token to a stablecoin through the deepest pools.
+
+    A route is scored by its shallowest pool's USD liquidity (the widest path), with fewer hops
+    winning ties. Pools without current metrics are not scored; tokens that only reach a
+    stablecoin through such pools fall back to the shortest route in the token graph.
+    """
+    def __init__(self, db_manager, token_graph, ttl: int = ROUTE_TTL, max_hops: int = MAX_HOPS) -> None:
+        self.db_manager = db_manager
+        self.token_graph = token_graph
+        self.ttl = ttl
+        self.max_hops = max_hops
+        self.lock = threading.Lock()
+        self.adjacency: Dict[str, List[Tuple[float, str, str]]] = {}
+        self.adjacency_expires = 0
+        self.routes: Dict[str, Tuple[float, List[Tuple[str, str, str]]]] = {}
+
+    def refresh_liquidity(self) -> None:
+        """Reload pool liquidity, keeping the deepest pool per token pair with neighbours deepest first."""
+        deepest: Dict[Tuple[str, str], Tuple[float, str]] = {}
+        for pool in self.db_manager.fetch_pool_liquidity():
+            pair = (pool['token0_address'], pool['token1_address'])
+            if pool['liquidity'] > deepest.get(pair, (0.0, None))[0]:
+                deepest[pair] = (pool['liquidity'], pool['pool_address'])
+        adjacency: Dict[str, List[Tuple[float, str, str]]] = {}
+        for (token0, token1), (liquidity, pool_address) in deepest.items():
+            adjacency.setdefault(token0, []).append((liquidity, token1, pool_address))
+            adjacency.setdefault(token1, []).append((liquidity, token0, pool_address))
+        for neighbours in adjacency.values():
+            neighbours.sort(reverse=True)
+        self.adjacency = adjacency
+        self.adjacency_expires = time.time() + self.ttl
+
+    def widest_route(self, token: str) -> List[Tuple[str, str, str]]:
+        """Widest path to a stablecoin within max_hops, or [] when the scored pools reach none."""
+        if is_stablecoin(token):
+            return []
+        # Max-heap on the bottleneck, then fewest hops: the first stablecoin popped is the best route.
+        # States are (token, hops): a token reached again on a narrower path is still worth expanding
+        # if it got there in fewer hops, because it has more hops left to reach a stablecoin.
+        heap = [(-float('inf'), 0, token, None)]
+        parents = {}
+        fewest_hops = {}  # fewest hops of any settled state of each token, all of them at least as wide
+        found = 0.0  # bottleneck of the best stablecoin route pushed so far
+        while heap:
+            bottleneck, hops, current, previous = heapq.heappop(heap)
+            if hops >= fewest_hops.get(current, self.max_hops + 1):
+                continue
+            fewest_hops[current] = hops
+            parents[(current, hops)] = previous
+            if is_stablecoin(current):
+                route = []
+                while parents[(current, hops)] is not None:
+                    previous_token, pool_address = parents[(current, hops)]
+                    route.append((previous_token, current, pool_address))
+                    current, hops = previous_token, hops - 1
+                return route[::-1]
+            if hops == self.max_hops:
+                continue
+            for liquidity, neighbour, pool_address in self.adjacency.get(current, []):
+                # Neighbours are sorted deepest first, so once a pool cannot beat the best
+                # stablecoin route found so far, none of the rest can either.
+                if liquidity < found:
+                    break
+                if hops + 1 < fewest_hops.get(neighbour, self.max_hops + 1):
+                    width = min(-bottleneck, liquidity)
+                    if is_stablecoin(neighbour):
+                        found = max(found, width)
+                    heapq.heappush(heap, (-width, hops + 1, neighbour, (current, pool_address)))
+        return []
+
+    def route(self, token: str) -> List[Tuple[str, str, str]]:
+        """(token_in, token_out, pool_address) hops from token to a stablecoin."""
+        with self.lock:
+            now = time.time()
+            cached = self.routes.get(token)
+            if cached and cached[0] > now:
+                return cached[1]
+            if self.adjacency_expires <= now:
+                self.refresh_liquidity()
+                self.routes.clear()
+            route = self.widest_route(token)
+            if not route:
+                route = [
+                    (token_in, token_out, self.db_manager.search_pool_address(token_in, token_out))
+                    for token_in, token_out in self.token_graph.route(token)
+                ]
+            self.routes[token] = (now + self.ttl, route)
+            return route
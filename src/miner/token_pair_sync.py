@@ -0,0 +1,58 @@
+import threading
+from datetime import datetime
+
+from utils.log import log
+
+# Newest timestamp to sync up to trails the clock by one block, so the block is final on the node.
+BLOCK_TIME = 12
+# Catch-up is split into windows of this many seconds, so a far behind miner makes steady progress
+# and stored state advances window by window instead of after one huge RPC call.
+MAX_SYNC_WINDOW = 7 * 24 * 60 * 60
+
+class TokenPairSyncer(threading.Thread):
+    """Background thread that follows new pool creations into the token_pairs table."""
+    def __init__(self, uniswap_fetcher_rs, db_manager, start_time: int, interval: int = BLOCK_TIME, token_graph=None, ready: threading.Event = None) -> None:
+        super().__init__(daemon=True, name='token-pair-sync')
+        self.uniswap_fetcher_rs = uniswap_fetcher_rs
+        self.db_manager = db_manager
+        self.token_graph = token_graph
+        self.last_synced_time = start_time
+        self.interval = interval
+        # Set once the unique indexes the inserts rely on exist.
+        self.ready = ready
+        self.stopped = threading.Event()
+
+    @property
+    def lag(self) -> int:
+        """Seconds between now and the newest synced timestamp."""
+        return max(int(datetime.now().timestamp()) - self.last_synced_time, 0)
+
+    def run_once(self) -> None:
+        now = int(datetime.now().timestamp() - BLOCK_TIME)
+        end = min(now, self.last_synced_time + MAX_SYNC_WINDOW)
+        if end <= self.last_synced_time:
+            return
+        token_pairs = self.uniswap_fetcher_rs.get_pool_created_events_between_two_timestamps(self.last_synced_time, end)
+        self.db_manager.add_token_pairs(token_pairs, end)
+        if self.token_graph is not None:
+            self.token_graph.add_pairs((token_pair['token0']['address'], token_pair['token1']['address']) for token_pair in token_pairs)
+        self.last_synced_time = end
+
+    def run(self) -> None:
+        while self.ready is not None and not self.ready.is_set() and not self.stopped.is_set():
+            self.ready.wait(self.interval)
+        log(f'Syncing token pairs from {self.last_synced_time}')
+        while not self.stopped.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                # RPC or database hiccups are retried on the next pass.
+                log(f'Token pair sync failed: {e}')
+                self.stopped.wait(self.interval)
+                continue
+            # Keep going without waiting while catching up.
+            if self.lag <= self.interval + BLOCK_TIME:
+                self.stopped.wait(self.interval)
+
+    def stop(self) -> None:
+        self.stopped.set()
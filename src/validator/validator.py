@@ -35,6 +35,9 @@ from substrateinterface import Keypair  # type: ignore
 
 from ._config import ValidatorSettings
 from utils.log import log
+from utils.merkle import canonical_leaf, leaf_sort_key, sample_indices, verify_proof
+from utils.encoding import decode_response, preferred_encoding
+from utils.price_cache import PriceRatioCache
 from utils.protocols import *
 from uniswap_fetcher_rs import UniswapFetcher
 
@@ -65,6 +68,7 @@ EPS = 1e-10
 START_TIMESTAMP = int(datetime(2021, 5, 4).timestamp())
 POOL_METRIC_INTERVAL = 5 * 60
 DAY_SECONDS = 86400
+POOL_EVENT_SAMPLE_COUNT = 10
 
 PREDICTION_SYNAPSE_INTERVAL = 30 * 60
 PREDICTION_CHECK_DELAY = 60
@@ -231,8 +235,11 @@ class VeloraValidator(Module):
         self.key = key
         self.netuid = netuid
         self.call_timeout = call_timeout
+        # Miners answer in this encoding when they support it and in plain JSON otherwise.
+        self.wire_encoding = preferred_encoding()
         
         self.uniswap_fetcher_rs = UniswapFetcher(os.getenv('ETHEREUM_RPC_NODE_URL'))
+        self.price_ratios = PriceRatioCache(self.uniswap_fetcher_rs)
         self.wandb_running = False
         self.db_manager = ValidatorDBManager()
 
@@ -327,11 +334,11 @@ class VeloraValidator(Module):
                 client.call(
                     f'forward{synapse.class_name}',
                     miner_key,
-                    {"synapse": synapse.dict()},
+                    {"synapse": {**synapse.dict(), "encoding": self.wire_encoding}},
                     timeout=self.call_timeout,  #  type: ignore
                 )
             )
-            response = json.loads(response)
+            response = decode_response(response)
             miner_answer['data'] = class_dict[response['class_name']](**response)
                 
             process_time = datetime.now() - current_time
@@ -358,12 +365,12 @@ class VeloraValidator(Module):
         
         return answers
         
-    def get_pool_event_synapses(self, healthy_data: list[HealthCheckResponse]) -> list[PoolEventSynapse]:
+    def get_pool_event_synapses(self, healthy_data: list[HealthCheckResponse]) -> list[PoolEventSynapse | PoolEventCommitmentSynapse]:
         """
         Generate a prompt for the pool event check.
 
         Returns:
-            The list of PoolEventSynapse.
+            The list of PoolEventCommitmentSynapse, or PoolEventSynapse for miners that do not advertise commitments.
         """
         synapses = []
         for miner_data in healthy_data:
@@ -375,11 +382,47 @@ class VeloraValidator(Module):
             end_date = start_date + DAY_SECONDS
             pool_addr = random.choice(miner_data.pool_addresses)
             
-            synapses.append(PoolEventSynapse(pool_address=pool_addr,
-                                             start_datetime=start_date,
-                                             end_datetime=end_date))
+            if 'PoolEventProofSynapse' not in miner_data.capabilities:
+                # Miners that have not upgraded yet are still checked on the full event list.
+                synapses.append(PoolEventSynapse(pool_address=pool_addr, start_datetime=start_date, end_datetime=end_date))
+                continue
+            synapses.append(PoolEventCommitmentSynapse(pool_address=pool_addr, start_datetime=start_date, end_datetime=end_date))
 
         return synapses
+
+    def get_pool_event_answers(self, modules_info, synapses: list[PoolEventSynapse | PoolEventCommitmentSynapse]) -> tuple[list, list]:
+        """
+        Query the pool event check, in two rounds for miners answering with a commitment.
+
+        A commitment only holds the root and leaf count. The leaves to check are drawn afterwards
+        and requested with a PoolEventProofSynapse, so the miner cannot shape its tree around them.
+
+        Returns:
+            The synapses to score each answer against and the answers; a commitment is replaced by
+            its proof request and the proof, or by None if the miner did not answer it.
+        """
+        answers = self.get_miner_answer(modules_info, synapses) or [None] * len(synapses)
+        synapses, answers = list(synapses), list(answers)
+        proof_requests = {}
+        for position, (key, synapse, answer) in enumerate(zip(modules_info.keys(), synapses, answers)):
+            if not answer or not isinstance(answer['data'], PoolEventCommitmentResponse) or answer['data'].leaf_count <= 0:
+                continue
+            proof_requests[key] = (position, PoolEventProofSynapse(
+                pool_address=synapse.pool_address,
+                start_datetime=synapse.start_datetime,
+                end_datetime=synapse.end_datetime,
+                root=answer['data'].root,
+                leaf_count=answer['data'].leaf_count,
+                indices=sample_indices(answer['data'].leaf_count, POOL_EVENT_SAMPLE_COUNT),
+            ))
+        if proof_requests:
+            proofs = self.get_miner_answer({key: modules_info[key] for key in proof_requests}, [request for _, request in proof_requests.values()])
+            for (position, request), proof in zip(proof_requests.values(), proofs):
+                synapses[position] = request
+                if proof:
+                    proof['process_time'] += answers[position]['process_time']
+                answers[position] = proof
+        return synapses, answers
     
     def check_miner_answer_pool_event(self, miner_prompt: PoolEventSynapse, miner_answer: PoolEventResponse | None) -> bool:
         """
@@ -417,6 +460,53 @@ class VeloraValidator(Module):
             correct_count += okay
         return correct_count / ANSWER_CHECK_COUNT
 
+    def check_miner_answer_pool_event_proof(self, miner_prompt: PoolEventProofSynapse, miner_answer: PoolEventProofResponse) -> float:
+        """
+        Check sampled events against the miner's Merkle commitment and the chain.
+
+        The indices were drawn after the miner returned its root, so it committed to its tree
+        before learning which leaves would be checked. Each leaf must prove into that root, the
+        leaves must be distinct events in the tree's sort order, and each is then looked up on chain.
+
+        Args:
+            miner_prompt: The proof request, holding the committed root and the sampled indices.
+            miner_answer: The generated answer from the miner module.
+        """
+        try:
+            root = bytes.fromhex(miner_prompt.root)
+            proofs = [[bytes.fromhex(node) for node in proof] for proof in miner_answer.proofs]
+        except ValueError:
+            return 0
+        if len(miner_answer.leaves) != len(miner_prompt.indices) or len(proofs) != len(miner_prompt.indices):
+            return 0
+        try:
+            # Sorting by index must keep the leaves in strictly increasing tree order; padding the tree
+            # with copies of one real event breaks that and the distinct event check below.
+            ordered = sorted(zip(miner_prompt.indices, miner_answer.leaves))
+            keys = [leaf_sort_key(leaf) for _, leaf in ordered]
+            # The event type is part of an event's identity when log_index is the ordinal within the transaction.
+            events = {(leaf['block_number'], leaf['transaction_hash'], leaf.get('log_index'), leaf['event_type']) for _, leaf in ordered}
+        except (KeyError, ValueError, TypeError):
+            return 0
+        if any(previous >= current for previous, current in zip(keys, keys[1:])) or len(events) != len(ordered):
+            return 0
+
+        block_number_start, block_number_end = self.uniswap_fetcher_rs.get_block_number_range(miner_prompt.start_datetime, miner_prompt.end_datetime)
+        correct_count = 0
+        for index, leaf, proof in zip(miner_prompt.indices, miner_answer.leaves, proofs):
+            if not verify_proof(canonical_leaf(leaf), index, miner_prompt.leaf_count, proof, root):
+                return 0
+            block_number = leaf.get("block_number", None)
+            if block_number is None or leaf.get("pool_address") != miner_prompt.pool_address:
+                return 0
+            if block_number < block_number_start or block_number > block_number_end:
+                return 0
+
+            block_data_from_pools = self.uniswap_fetcher_rs.get_pool_events_by_pool_addresses([miner_prompt.pool_address], block_number, block_number)
+            if any(block_data_of_pool.get("transaction_hash") == leaf.get("transaction_hash") for block_data_of_pool in block_data_from_pools.get("data", [])):
+                correct_count += 1
+        return correct_count / len(miner_prompt.indices)
+
     def get_pool_metric_by_pool_address(self, pool_address: str, timestamp: int, interval: int, token0_decimals: int, token1_decimals: int) -> dict:
         """
         Get the pool metrics by pool address.
@@ -471,7 +561,7 @@ class VeloraValidator(Module):
             sum(aggregated_data["token1_liquidity"]),
             token1_decimals,
         )
-        price_ratios = self.uniswap_fetcher_rs.get_pool_price_ratios(pool_address, timestamp - interval, timestamp, interval)
+        price_ratios = self.price_ratios.get_pool_price_ratios(pool_address, timestamp - interval, timestamp, interval)
         price = float(price_ratios[-1].get("price_ratio")) if price_ratios else 0.0
         return {"price": price, "liquidity_token0": liquidity_token0, "liquidity_token1": liquidity_token1, "volume_token0": volume_token0, "volume_token1": volume_token1}
     
@@ -498,7 +588,7 @@ class VeloraValidator(Module):
             'volume': abs(on_chain_pool_metric['volume_token0'] - miner_answer.volume_token0 + on_chain_pool_metric['volume_token1'] - miner_answer.volume_token1),
         }
 
-    def check_pool_event_accuracy(self, synapse: PoolEventSynapse, miner_answer: PoolEventResponse) -> float:
+    def check_pool_event_accuracy(self, synapse: PoolEventSynapse | PoolEventProofSynapse, miner_answer: PoolEventResponse | PoolEventCommitmentResponse | PoolEventProofResponse) -> float:
         """
         Score the generated answer against the validator's own answer.
 
@@ -515,7 +605,13 @@ class VeloraValidator(Module):
         
         # count the number of correct entries
 
-        accuracy_score = self.check_miner_answer_pool_event(synapse, miner_answer)
+        if isinstance(miner_answer, PoolEventProofResponse):
+            accuracy_score = self.check_miner_answer_pool_event_proof(synapse, miner_answer)
+        elif isinstance(miner_answer, PoolEventCommitmentResponse):
+            # An empty commitment has nothing to prove.
+            accuracy_score = 0
+        else:
+            accuracy_score = self.check_miner_answer_pool_event(synapse, miner_answer)
         print(f'pool_events/accuracy_score: {accuracy_score}')
         
         accuracy_score = (max((accuracy_score - 0.75), 0) * 4) ** 3
@@ -765,8 +861,7 @@ class VeloraValidator(Module):
             return
 
         # Check pool events data
-        pool_event_check_synapses = self.get_pool_event_synapses(health_data)
-        pool_events = self.get_miner_answer(valid_miner_infos, pool_event_check_synapses)
+        pool_event_check_synapses, pool_events = self.get_pool_event_answers(valid_miner_infos, self.get_pool_event_synapses(health_data))
         
         miner_results_pool_events = list(zip(valid_miner_infos.keys(), pool_events))
 
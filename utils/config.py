@@ -13,6 +13,34 @@ def get_postgres_miner_url():
     
     return DATABASE_URL
 
+def get_miner_storage_mode():
+    # 'heap' keeps plain Postgres tables, 'timescale' turns metrics and events into compressed hypertables,
+    # 'partitioned' range-partitions the event tables by block number
+    return os.getenv("POSTGRES_MINER_STORAGE_MODE", "heap")
+
+def get_timescale_compress_after_days():
+    return int(os.getenv("POSTGRES_MINER_COMPRESS_AFTER_DAYS", "30"))
+
+def get_partition_retention_months():
+    # 0 keeps every event partition attached
+    return int(os.getenv("POSTGRES_MINER_PARTITION_RETENTION_MONTHS", "0"))
+
+def get_token_pair_sync_interval():
+    # seconds between token pair syncs once caught up; one block by default
+    return int(os.getenv("MINER_TOKEN_PAIR_SYNC_INTERVAL", "12"))
+
+def get_price_cache_path():
+    # SQLite file caching pool price ratios, shared by every process that points at it
+    return os.getenv("PRICE_CACHE_PATH", ".cache/price_ratios.sqlite")
+
+def get_model_path():
+    # directory holding lstm_model.h5 and its scalers; reloaded when the files change
+    return os.getenv("MINER_MODEL_PATH", "./base_model")
+
+def get_model_backend():
+    # 'numpy' runs predictions without tensorflow, 'keras' loads the model with tensorflow
+    return os.getenv("MINER_MODEL_BACKEND", "numpy")
+
 def get_postgres_validator_url():
     POSTGRES_USER = os.getenv("POSTGRES_VALIDATOR_USER")
     POSTGRES_DB = os.getenv("POSTGRES_VALIDATOR_DB")
@@ -0,0 +1,157 @@
+import base64
+import json
+import time
+from typing import List, Union
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Binary payloads travel base64 encoded behind this prefix, because endpoints must return strings.
+# Anything without it is plain JSON, which is also what peers without this module send.
+ENVELOPE_PREFIX = 'velora:'
+# Payloads below this size are not worth the compression round trip.
+COMPRESS_THRESHOLD = 64 * 1024
+
+def available_encodings() -> List[str]:
+    """Encodings this process can both produce and read, fastest and smallest first."""
+    encodings = []
+    if msgpack:
+        encodings += ['msgpack+zstd', 'msgpack'] if zstandard else ['msgpack']
+    if orjson:
+        encodings += ['orjson+zstd', 'orjson'] if zstandard else ['orjson']
+    return encodings + ['json']
+
+def preferred_encoding() -> str:
+    return available_encodings()[0]
+
+def encode_response(response: Union[BaseModel, dict], encoding: str = 'json', compress_threshold: int = COMPRESS_THRESHOLD) -> str:
+    """
+    Serialize a response in the encoding the caller asked for.
+
+    Unknown or unavailable encodings, and documents a codec cannot represent (such as integers
+    wider than 64 bits), fall back to plain JSON.
+    """
+    codec, _, compression = encoding.partition('+')
+    document = response.model_dump() if isinstance(response, BaseModel) else response
+    try:
+        if codec == 'msgpack' and msgpack:
+            payload = msgpack.packb(document)
+        elif codec == 'orjson' and orjson:
+            payload = orjson.dumps(document)
+        else:
+            codec = None
+    except (TypeError, OverflowError):
+        codec = None
+    if codec is None:
+        return response.model_dump_json() if isinstance(response, BaseModel) else to_json(document).decode()
+    return encode_payload(payload, encoding, compress_threshold)
+
+def encode_payload(payload: bytes, encoding: str, compress_threshold: int = COMPRESS_THRESHOLD) -> str:
+    """Wrap a document already serialized with the codec of encoding (msgpack or orjson), compressing it if asked."""
+    codec, _, compression = encoding.partition('+')
+    if compression == 'zstd' and zstandard and len(payload) >= compress_threshold:
+        payload = zstandard.ZstdCompressor().compress(payload)
+        codec += '+zstd'
+    elif codec == 'orjson':
+        # Uncompressed orjson output already is JSON text.
+        return payload.decode()
+    return f'{ENVELOPE_PREFIX}{codec}:{base64.b64encode(payload).decode()}'
+
+def page_document(class_name: str, rows: list, fields: List[str], columnar: bool = False, **values) -> dict:
+    """
+    Wire document for a page of DB rows (Row objects or dicts), built without a model per row.
+
+    The rows come from our own typed columns, so they go out as they are. A columnar document
+    holds one list per field and a row count, see ColumnarResponse.
+    """
+    mappings = [row if isinstance(row, dict) else row._mapping for row in rows]
+    if columnar:
+        page = {'row_count': len(mappings), 'columns': {field: [mapping[field] for mapping in mappings] for field in fields}}
+    else:
+        page = {'data': [{field: mapping[field] for field in fields} for mapping in mappings]}
+    return {'class_name': class_name, **page, **values}
+
+def decode_response(response: str) -> dict:
+    """Inverse of encode_response; plain JSON from old peers passes straight through."""
+    if not response.startswith(ENVELOPE_PREFIX):
+        # The stdlib parser keeps integers wider than 64 bits exact, which orjson would turn into floats.
+        return json.loads(response)
+    _, encoding, payload = response.split(':', 2)
+    codec, _, compression = encoding.partition('+')
+    payload = base64.b64decode(payload)
+    if compression == 'zstd':
+        if not zstandard:
+            raise Exception(f'Cannot decode {encoding} response without zstandard')
+        payload = zstandard.ZstdDecompressor().decompress(payload)
+    if codec == 'msgpack':
+        if not msgpack:
+            raise Exception(f'Cannot decode {encoding} response without msgpack')
+        return msgpack.unpackb(payload)
+    if not orjson:
+        raise Exception(f'Cannot decode {encoding} response without orjson')
+    return orjson.loads(payload)
+
+def benchmark(response: Union[BaseModel, dict], rounds: int = 20) -> List[dict]:
+    """Encode and decode throughput and wire size of a response for every available encoding."""
+    results = []
+    for encoding in available_encodings():
+        started = time.perf_counter()
+        for _ in range(rounds):
+            encoded = encode_response(response, encoding)
+        encode_seconds = (time.perf_counter() - started) / rounds
+        started = time.perf_counter()
+        for _ in range(rounds):
+            decode_response(encoded)
+        decode_seconds = (time.perf_counter() - started) / rounds
+        results.append({
+            'encoding': encoding,
+            'bytes': len(encoded),
+            'encode_mb_s': len(encoded) / encode_seconds / 1e6,
+            'decode_mb_s': len(encoded) / decode_seconds / 1e6,
+            'encode_ms': encode_seconds * 1000,
+            'decode_ms': decode_seconds * 1000,
+        })
+    return results
+
+if __name__ == '__main__':
+    import random
+    from utils.protocols import SwapEventAPIResponse
+
+    # A page shaped like a large swap event response.
+    response = SwapEventAPIResponse(
+        data=[
+            {
+                'transaction_hash': f'0x{random.getrandbits(256):064x}',
+                'pool_address': f'0x{random.getrandbits(160):040x}',
+                'block_number': 12369621 + index,
+                'timestamp': 1620158974 + index * 12,
+                'sender': f'0x{random.getrandbits(160):040x}',
+                'to': f'0x{random.getrandbits(160):040x}',
+                'amount0': f'0x{random.getrandbits(128):x}',
+                'amount1': f'0x{random.getrandbits(128):x}',
+                'sqrt_price_x96': f'0x{random.getrandbits(160):x}',
+                'liquidity': f'0x{random.getrandbits(128):x}',
+                'tick': random.randint(-887272, 887272),
+            }
+            for index in range(20000)
+        ],
+        total_event_count=20000,
+    )
+    print(f"{'encoding':<14}{'bytes':>12}{'encode ms':>12}{'decode ms':>12}{'encode MB/s':>14}{'decode MB/s':>14}")
+    for result in benchmark(response):
+        print(
+            f"{result['encoding']:<14}{result['bytes']:>12}{result['encode_ms']:>12.1f}{result['decode_ms']:>12.1f}"
+            f"{result['encode_mb_s']:>14.1f}{result['decode_mb_s']:>14.1f}"
+        )
@@ -1,3 +1,6 @@
+import base64
+import json
+
 def signed_hex_to_int(hex_str: str) -> int:
     if hex_str.startswith("0x"):
         hex_str = hex_str[2:]
@@ -92,4 +95,18 @@ def get_seconds_from_period(period: str) -> int:
             case '1y':
                 return 60 * 60 * 24 * 30 * 12
             case _:
-                return 0
\ No newline at end of file
+                return 0
+
+def encode_cursor(values: list) -> str:
+    """Encode the sort key of the last row on a page into an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor: str) -> list:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise Exception("Invalid cursor")
+    if not isinstance(values, list):
+        raise Exception("Invalid cursor")
+    return values
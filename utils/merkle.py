@@ -0,0 +1,100 @@
+import hashlib
+import json
+import secrets
+from typing import List
+
+# Domain separation keeps a leaf from ever being accepted as an inner node and vice versa.
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+HASH_SIZE = 32
+# Event types in the order that breaks ties between events at the same log position.
+EVENT_TYPES = ['swap', 'mint', 'burn', 'collect']
+
+def canonical_leaf(event: dict) -> bytes:
+    """Serialize an event deterministically, leaving out the miner-local row id."""
+    return json.dumps({key: value for key, value in event.items() if key != 'id'}, sort_keys=True, separators=(',', ':')).encode()
+
+def hash_leaf(leaf: bytes) -> bytes:
+    return hashlib.sha256(LEAF_PREFIX + leaf).digest()
+
+def hash_node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+def level_sizes(leaf_count: int) -> List[int]:
+    sizes = [leaf_count]
+    while sizes[-1] > 1:
+        sizes.append((sizes[-1] + 1) // 2)
+    return sizes
+
+class MerkleTree:
+    """SHA-256 Merkle tree whose unpaired last node on a level is carried up unchanged."""
+    def __init__(self, levels: List[List[bytes]]) -> None:
+        self.levels = levels
+
+    @classmethod
+    def from_leaves(cls, leaves: List[bytes]) -> 'MerkleTree':
+        levels = [[hash_leaf(leaf) for leaf in leaves]]
+        while len(levels[-1]) > 1:
+            nodes = levels[-1]
+            levels.append([hash_node(nodes[i], nodes[i + 1]) if i + 1 < len(nodes) else nodes[i] for i in range(0, len(nodes), 2)])
+        return cls(levels)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, leaf_count: int) -> 'MerkleTree':
+        levels, offset = [], 0
+        for size in level_sizes(leaf_count) if leaf_count else [0]:
+            levels.append([data[offset + i * HASH_SIZE:offset + (i + 1) * HASH_SIZE] for i in range(size)])
+            offset += size * HASH_SIZE
+        return cls(levels)
+
+    def to_bytes(self) -> bytes:
+        return b''.join(node for level in self.levels for node in level)
+
+    @property
+    def leaf_count(self) -> int:
+        return len(self.levels[0])
+
+    @property
+    def root(self) -> bytes:
+        return self.levels[-1][0] if self.leaf_count else hashlib.sha256(b'').digest()
+
+    def proof(self, index: int) -> List[bytes]:
+        """Sibling hashes from the leaf up to the root; carried-up levels contribute nothing."""
+        proof = []
+        for nodes in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(nodes):
+                proof.append(nodes[sibling])
+            index //= 2
+        return proof
+
+def verify_proof(leaf: bytes, index: int, leaf_count: int, proof: List[bytes], root: bytes) -> bool:
+    if not 0 <= index < leaf_count:
+        return False
+    node, proof = hash_leaf(leaf), list(proof)
+    for size in level_sizes(leaf_count)[:-1]:
+        if index % 2 == 1:
+            if not proof:
+                return False
+            node = hash_node(proof.pop(0), node)
+        elif index + 1 < size:
+            if not proof:
+                return False
+            node = hash_node(node, proof.pop(0))
+        index //= 2
+    return not proof and node == root
+
+def sample_indices(leaf_count: int, count: int) -> List[int]:
+    """
+    Pick distinct leaf indices to check, with fresh randomness.
+
+    Call this only after the miner has returned its root and leaf_count: indices derived from
+    anything the miner sees before committing would let it grind its tree until every sample
+    lands on a leaf it can defend.
+    """
+    return secrets.SystemRandom().sample(range(leaf_count), min(count, leaf_count))
+
+def leaf_sort_key(leaf: dict) -> tuple:
+    """Position of an event in a pool event tree: (block_number, log_index, transaction_hash, event type)."""
+    log_index = leaf['log_index'] if leaf.get('log_index') is not None else -1
+    return (leaf['block_number'], log_index, leaf['transaction_hash'], EVENT_TYPES.index(leaf['event_type']))
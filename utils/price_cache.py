@@ -0,0 +1,80 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Union
+
+from utils.config import get_price_cache_path
+from utils.log import log
+
+# Buckets this close to the present may still move with new blocks and are not cached.
+FINALITY_SECONDS = 120
+# Pools kept in the cache; the least recently used ones are dropped beyond this.
+MAX_POOLS = 2000
+
+class PriceRatioCache:
+    """
+    Local SQLite cache in front of UniswapFetcher.get_pool_price_ratios.
+
+    Ratios are stored per (pool, interval, bucket timestamp). A request only fetches the runs of
+    buckets it does not have yet, so a sliding one-day window costs one or two new buckets.
+    """
+    def __init__(self, uniswap_fetcher_rs, path: str = None, max_pools: int = MAX_POOLS) -> None:
+        self.uniswap_fetcher_rs = uniswap_fetcher_rs
+        self.max_pools = max_pools
+        path = path or get_price_cache_path()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS price_ratios ('
+                'pool_address TEXT NOT NULL, interval INTEGER NOT NULL, timestamp INTEGER NOT NULL, price_ratio TEXT NOT NULL, '
+                'PRIMARY KEY (pool_address, interval, timestamp)) WITHOUT ROWID'
+            )
+            self.connection.execute('CREATE TABLE IF NOT EXISTS pools (pool_address TEXT PRIMARY KEY, last_used REAL NOT NULL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS ix_pools_last_used ON pools (last_used)')
+
+    def cached(self, pool_address: str, start_timestamp: int, end_timestamp: int, interval: int) -> Dict[int, str]:
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT timestamp, price_ratio FROM price_ratios WHERE pool_address = ? AND interval = ? AND timestamp >= ? AND timestamp < ?',
+                (pool_address, interval, start_timestamp, end_timestamp),
+            ).fetchall()
+        return dict(rows)
+
+    def store(self, pool_address: str, interval: int, price_ratios: List[Dict[str, Union[int, str]]]) -> None:
+        final = time.time() - FINALITY_SECONDS
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO price_ratios (pool_address, interval, timestamp, price_ratio) VALUES (?, ?, ?, ?)',
+                [(pool_address, interval, ratio['timestamp'], str(ratio['price_ratio'])) for ratio in price_ratios if ratio['timestamp'] <= final],
+            )
+            self.connection.execute('INSERT OR REPLACE INTO pools (pool_address, last_used) VALUES (?, ?)', (pool_address, time.time()))
+            expired = self.connection.execute(
+                'SELECT pool_address FROM pools ORDER BY last_used DESC LIMIT -1 OFFSET ?', (self.max_pools,)
+            ).fetchall()
+            if expired:
+                self.connection.executemany('DELETE FROM price_ratios WHERE pool_address = ?', expired)
+                self.connection.executemany('DELETE FROM pools WHERE pool_address = ?', expired)
+                log(f'Evicted {len(expired)} pools from the price ratio cache')
+
+    def get_pool_price_ratios(self, pool_address: str, start_timestamp: int, end_timestamp: int, interval: int) -> List[Dict[str, Union[int, str]]]:
+        """Same result as UniswapFetcher.get_pool_price_ratios, fetching only the buckets not cached yet."""
+        ratios = self.cached(pool_address, start_timestamp, end_timestamp, interval)
+        missing = [timestamp for timestamp in range(start_timestamp, end_timestamp, interval) if timestamp not in ratios]
+        # Fetch each contiguous run of missing buckets with one call.
+        runs = []
+        for timestamp in missing:
+            if runs and timestamp == runs[-1][1]:
+                runs[-1][1] = timestamp + interval
+            else:
+                runs.append([timestamp, timestamp + interval])
+        fetched = []
+        for run_start, run_end in runs:
+            fetched += self.uniswap_fetcher_rs.get_pool_price_ratios(pool_address, run_start, run_end, interval)
+        self.store(pool_address, interval, fetched)
+        ratios.update({ratio['timestamp']: ratio['price_ratio'] for ratio in fetched})
+        return [{'timestamp': timestamp, 'price_ratio': ratios[timestamp]} for timestamp in sorted(ratios)]
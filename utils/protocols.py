@@ -1,16 +1,41 @@
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 from typing import Optional, Dict, Union
 
-class HealthCheckSynapse(BaseModel):
+class Synapse(BaseModel):
+    # Wire encoding the caller accepts for the response, see utils.encoding. Peers that
+    # predate this field ignore it and answer with plain JSON.
+    encoding: str = 'json'
+    # Ask list endpoints for one array per field instead of one object per row.
+    columnar: bool = False
+
+class ColumnarResponse(BaseModel):
+    # A columnar page carries `columns` and `row_count` in place of `data`; the rows are
+    # rebuilt here on validation, so readers of the model keep using `data`.
+    row_count: Optional[int] = None
+    columns: Optional[Dict[str, list]] = None
+
+    @model_validator(mode='before')
+    @classmethod
+    def expand_columns(cls, values):
+        if isinstance(values, dict) and values.get('columns') is not None:
+            columns = values['columns']
+            if any(len(column) != values.get('row_count') for column in columns.values()):
+                raise ValueError('Column lengths do not match row_count')
+            values = {**values, 'data': [dict(zip(columns, row)) for row in zip(*columns.values())], 'columns': None}
+        return values
+
+class HealthCheckSynapse(Synapse):
     class_name: str = 'HealthCheckSynapse'
 
 class HealthCheckResponse(BaseModel):
     class_name: str = 'HealthCheckResponse'
     time_completed: int
     pool_addresses: list[str]
+    token_pair_sync_lag: Optional[int] = None  # seconds the miner's token pairs trail the chain
+    capabilities: list[str] = []  # newer synapses the miner answers, e.g. 'PoolEventCommitmentSynapse'
     
-class PoolEventSynapse(BaseModel):
+class PoolEventSynapse(Synapse):
     class_name: str = 'PoolEventSynapse'
     pool_address: str
     start_datetime: int
@@ -21,7 +46,33 @@ class PoolEventResponse(BaseModel):
     data: list[dict]
     overall_data_hash: str
 
-class PoolMetricSynapse(BaseModel):
+class PoolEventCommitmentSynapse(Synapse):
+    class_name: str = 'PoolEventCommitmentSynapse'
+    pool_address: str
+    start_datetime: int
+    end_datetime: int
+
+class PoolEventCommitmentResponse(BaseModel):
+    class_name: str = 'PoolEventCommitmentResponse'
+    root: str
+    leaf_count: int
+
+class PoolEventProofSynapse(Synapse):
+    # Sent after the commitment: indices are drawn once root and leaf_count are fixed.
+    class_name: str = 'PoolEventProofSynapse'
+    pool_address: str
+    start_datetime: int
+    end_datetime: int
+    root: str
+    leaf_count: int
+    indices: list[int]
+
+class PoolEventProofResponse(BaseModel):
+    class_name: str = 'PoolEventProofResponse'
+    leaves: list[dict]
+    proofs: list[list[str]]
+
+class PoolMetricSynapse(Synapse):
     class_name: str = 'PoolMetricSynapse'
     timestamp: int
     interval: int
@@ -37,7 +88,7 @@ class PoolMetricResponse(BaseModel):
     token0_decimals: int = 1
     token1_decimals: int = 1
 
-class PoolMetricAPISynapse(BaseModel):
+class PoolMetricAPISynapse(Synapse):
     class_name: str = 'PoolMetricAPISynapse'
     pool_address: str
     interval: str
@@ -46,6 +97,8 @@ class PoolMetricAPISynapse(BaseModel):
     end_timestamp: Optional[int]
     page_limit: int
     page_number: int
+    cursor: Optional[str] = None
+    count_mode: str = 'exact'
 
 class PoolMetricAPI(BaseModel):
     timestamp: int
@@ -66,12 +119,14 @@ class TokenPairData(BaseModel):
     pool_address: str
     
     
-class PoolMetricAPIResponse(BaseModel):
+class PoolMetricAPIResponse(ColumnarResponse):
     class_name: str = 'PoolMetricAPIResponse'
     data: list[PoolMetricAPI]
     token_pair_data: TokenPairData
     total_pool_count: int
-class TokenMetricSynapse(BaseModel):
+    next_cursor: Optional[str] = None
+    total_count_exact: bool = True
+class TokenMetricSynapse(Synapse):
     class_name: str = 'TokenMetricSynapse'
     timestamp: int
     token_address: str
@@ -86,7 +141,7 @@ class TokenMetricResponse(BaseModel):
     total_volume: float = 0
     total_liquidity: float = 0
 
-class TokenMetricAPISynapse(BaseModel):
+class TokenMetricAPISynapse(Synapse):
     class_name: str = 'TokenMetricAPISynapse'
     token_address: str
     interval: str
@@ -95,6 +150,8 @@ class TokenMetricAPISynapse(BaseModel):
     end_timestamp: Optional[int]
     page_limit: int
     page_number: int
+    cursor: Optional[str] = None
+    count_mode: str = 'exact'
 
 class TokenMetricAPI(BaseModel):
     timestamp: int
@@ -109,13 +166,15 @@ class TokenData(BaseModel):
     symbol: str
     decimals: int
     
-class TokenMetricAPIResponse(BaseModel):
+class TokenMetricAPIResponse(ColumnarResponse):
     class_name: str = 'TokenMetricAPIResponse'
     data: list[TokenMetricAPI]
     token_data: TokenData
     total_token_count: int
+    next_cursor: Optional[str] = None
+    total_count_exact: bool = True
 
-class PredictionSynapse(BaseModel):
+class PredictionSynapse(Synapse):
     class_name: str = 'PredictionSynapse'
     timestamp: int
     token_address: str
@@ -124,7 +183,20 @@ class PredictionResponse(BaseModel):
     class_name: str = 'PredictionResponse'
     prices: list[float]
 
-class PredictionAPISynapse(BaseModel):
+class PredictionRequest(BaseModel):
+    timestamp: int
+    token_address: str
+
+class BatchPredictionSynapse(Synapse):
+    class_name: str = 'BatchPredictionSynapse'
+    requests: list[PredictionRequest]
+
+class BatchPredictionResponse(BaseModel):
+    class_name: str = 'BatchPredictionResponse'
+    # One entry per request, in order; None when the token has too little price history.
+    predictions: list[Optional[list[float]]]
+
+class PredictionAPISynapse(Synapse):
     class_name: str = 'PredictionAPISynapse'
     timestamp: int
     token_address: str
@@ -135,7 +207,7 @@ class PredictionAPIResponse(BaseModel):
     predicted_data: list[Dict[str, Union[int, float]]]
     token_symbol: str
 
-class CurrentPoolMetricSynapse(BaseModel):
+class CurrentPoolMetricSynapse(Synapse):
     class_name: str = 'CurrentPoolMetricSynapse'
     page_limit: int
     page_number: int
@@ -145,6 +217,8 @@ class CurrentPoolMetricSynapse(BaseModel):
     search_query: str
     sort_by: str
     sort_order: str
+    cursor: Optional[str] = None
+    count_mode: str = 'exact'
 
 class CurrentPoolMetric(BaseModel):
     pool_address: str
@@ -159,11 +233,13 @@ class CurrentPoolMetric(BaseModel):
     fee: int
     token0_price: float
     token1_price: float
-class CurrentPoolMetricResponse(BaseModel):
+class CurrentPoolMetricResponse(ColumnarResponse):
     class_name: str = 'CurrentPoolMetricResponse'
     data: list[CurrentPoolMetric]
     overall_data_hash: str
     total_pool_count: int
+    next_cursor: Optional[str] = None
+    total_count_exact: bool = True
 
 class PoolEvent(BaseModel):
     timestamp: int
@@ -175,7 +251,7 @@ class PoolEvent(BaseModel):
     event_type: str
     transaction_hash: str
 
-class RecentPoolEventSynapse(BaseModel):
+class RecentPoolEventSynapse(Synapse):
     class_name: str = 'RecentPoolEventSynapse'
     page_limit: int = 10
     filter_by: str = 'all'
@@ -185,10 +261,12 @@ class RecentPoolEventResponse(BaseModel):
     data: list[PoolEvent]
     overall_data_hash: str
 
-class CurrentTokenMetricSynapse(BaseModel):
+class CurrentTokenMetricSynapse(Synapse):
     class_name: str = 'CurrentTokenMetricSynapse'
     page_limit: int
     page_number: int
+    cursor: Optional[str] = None
+    count_mode: str = 'exact'
     search_query: str
     sort_by: str
 
@@ -199,59 +277,79 @@ class CurrentTokenMetric(BaseModel):
     total_volume: float
     total_liquidity: float
 
-class CurrentTokenMetricResponse(BaseModel):
+class CurrentTokenMetricResponse(ColumnarResponse):
     class_name: str = 'CurrentTokenMetricResponse'
     data: list[CurrentTokenMetric]
     total_token_count: int
+    next_cursor: Optional[str] = None
+    total_count_exact: bool = True
 
-class SwapEventAPISynapse(BaseModel):
+class SwapEventAPISynapse(Synapse):
     class_name: str = 'SwapEventAPISynapse'
     pool_address: str
     start_timestamp: int
     end_timestamp: int
     page_limit: Optional[int]
     page_number: Optional[int]
+    cursor: Optional[str] = None
+    count_mode: str = 'exact'
 
-class SwapEventAPIResponse(BaseModel):
+class SwapEventAPIResponse(ColumnarResponse):
     class_name: str = 'SwapEventAPIResponse'
     data: list[dict]
     total_event_count: int
+    next_cursor: Optional[str] = None
+    total_count_exact: bool = True
 
-class MintEventAPISynapse(BaseModel):
+class MintEventAPISynapse(Synapse):
     class_name: str = 'MintEventAPISynapse'
     pool_address: str
     start_timestamp: int
     end_timestamp: int
     page_limit: Optional[int]
     page_number: Optional[int]
+    cursor: Optional[str] = None
+    count_mode: str = 'exact'
     
-class MintEventAPIResponse(BaseModel):
+class MintEventAPIResponse(ColumnarResponse):
     class_name: str = 'MintEventAPIResponse'
     data: list[dict]
     total_event_count: int
+    next_cursor: Optional[str] = None
+    total_count_exact: bool = True
 
-class BurnEventAPISynapse(BaseModel):
+class BurnEventAPISynapse(Synapse):
     class_name: str = 'BurnEventAPISynapse'
     pool_address: str
     start_timestamp: int
     end_timestamp: int
     page_limit: Optional[int]
     page_number: Optional[int]
+    cursor: Optional[str] = None
+    count_mode: str = 'exact'
     
-class BurnEventAPIResponse(BaseModel):
+class BurnEventAPIResponse(ColumnarResponse):
     class_name: str = 'BurnEventAPIResponse'
     data: list[dict]
     total_event_count: int
+    next_cursor: Optional[str] = None
+    total_count_exact: bool = True
 
 class_dict = {
     'HealthCheckSynapse': HealthCheckSynapse,
     'HealthCheckResponse': HealthCheckResponse,
     'PoolEventSynapse': PoolEventSynapse,
     'PoolEventResponse': PoolEventResponse,
+    'PoolEventCommitmentSynapse': PoolEventCommitmentSynapse,
+    'PoolEventCommitmentResponse': PoolEventCommitmentResponse,
+    'PoolEventProofSynapse': PoolEventProofSynapse,
+    'PoolEventProofResponse': PoolEventProofResponse,
     'PoolMetricSynapse': PoolMetricSynapse,
     'PoolMetricResponse': PoolMetricResponse,
     'PredictionSynapse': PredictionSynapse,
     'PredictionResponse': PredictionResponse,
+    'BatchPredictionSynapse': BatchPredictionSynapse,
+    'BatchPredictionResponse': BatchPredictionResponse,
     'CurrentPoolMetricSynapse': CurrentPoolMetricSynapse,
     'CurrentPoolMetricResponse': CurrentPoolMetricResponse,
     'RecentPoolEventSynapse': RecentPoolEventSynapse,
@@ -0,0 +1,111 @@
+import threading
+from array import array
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from utils.utils import is_stablecoin
+
+# Pairs added since the last rebuild live in a small side table until there are this many
+# (or more than 1% of the graph's edges), then everything is folded back into the CSR arrays.
+MIN_PENDING_EDGES = 1024
+
+class TokenGraph:
+    """
+    Undirected token pair graph with integer token ids and CSR adjacency.
+
+    Routes to the nearest stablecoin are memoized per token. Each memoized route remembers the
+    few tokens where a new pair could shorten it, so adding pools elsewhere in the graph, even
+    to hub tokens such as WETH, keeps the cache warm.
+    """
+    def __init__(self, pairs: Iterable[Tuple[str, str]] = ()) -> None:
+        self.lock = threading.RLock()
+        self.ids: Dict[str, int] = {}
+        self.tokens: List[str] = []
+        self.stablecoins: Set[int] = set()
+        self.offsets = array('I', [0])
+        self.neighbors = array('I')
+        self.pending: Dict[int, List[int]] = {}
+        self.pending_count = 0
+        self.routes: Dict[int, Optional[Tuple[int, ...]]] = {}
+        self.dependents: Dict[int, Set[int]] = {}
+        self.add_pairs(pairs)
+
+    def token_id(self, token: str) -> int:
+        if token not in self.ids:
+            self.ids[token] = len(self.tokens)
+            self.tokens.append(token)
+            if is_stablecoin(token):
+                self.stablecoins.add(self.ids[token])
+        return self.ids[token]
+
+    def neighbours(self, token_id: int) -> Iterable[int]:
+        if token_id + 1 < len(self.offsets):
+            yield from self.neighbors[self.offsets[token_id]:self.offsets[token_id + 1]]
+        yield from self.pending.get(token_id, ())
+
+    def add_pairs(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        with self.lock:
+            for token0, token1 in pairs:
+                a, b = self.token_id(token0), self.token_id(token1)
+                self.pending.setdefault(a, []).append(b)
+                self.pending.setdefault(b, []).append(a)
+                self.pending_count += 1
+                # A new pair only matters to routes that depend on one of its ends.
+                for source in self.dependents.pop(a, set()) | self.dependents.pop(b, set()):
+                    self.routes.pop(source, None)
+            if self.pending_count >= max(MIN_PENDING_EDGES, len(self.neighbors) // 200):
+                self.compact()
+
+    def compact(self) -> None:
+        """Fold pending pairs into the CSR arrays."""
+        with self.lock:
+            offsets, neighbors = array('I', [0]), array('I')
+            for token_id in range(len(self.tokens)):
+                # Stablecoins first, so searches through hub tokens stop on their first neighbour.
+                neighbors.extend(sorted(set(self.neighbours(token_id)), key=lambda neighbour: neighbour not in self.stablecoins))
+                offsets.append(len(neighbors))
+            self.offsets, self.neighbors = offsets, neighbors
+            self.pending, self.pending_count = {}, 0
+
+    def search(self, source: int) -> Tuple[Optional[Tuple[int, ...]], Set[int]]:
+        """
+        Shortest hop path from source to a stablecoin, and the tokens a new pair must touch to shorten it.
+
+        Those are the tokens expanded at a smaller depth than the one the stablecoin was reached
+        from; a pair at any other token can at best produce another route of the same length.
+        """
+        if source in self.stablecoins:
+            return (source,), set()
+        previous = {source: source}
+        depth = {source: 0}
+        expanded = []
+        queue = deque([source])
+        while queue:
+            token_id = queue.popleft()
+            expanded.append(token_id)
+            for neighbour in self.neighbours(token_id):
+                if neighbour in previous:
+                    continue
+                previous[neighbour] = token_id
+                depth[neighbour] = depth[token_id] + 1
+                if neighbour in self.stablecoins:
+                    path = [neighbour]
+                    while path[-1] != source:
+                        path.append(previous[path[-1]])
+                    return tuple(reversed(path)), {expanded_id for expanded_id in expanded if depth[expanded_id] < depth[token_id]}
+                queue.append(neighbour)
+        return None, set(expanded)
+
+    def route(self, token: str) -> List[Tuple[str, str]]:
+        """Token pairs along the shortest route from token to a stablecoin; empty when there is none."""
+        with self.lock:
+            source = self.ids.get(token)
+            if source is None:
+                return []
+            if source not in self.routes:
+                path, expanded = self.search(source)
+                self.routes[source] = path
+                for token_id in expanded:
+                    self.dependents.setdefault(token_id, set()).add(source)
+            path = self.routes[source] or ()
+            return [(self.tokens[a], self.tokens[b]) for a, b in zip(path, path[1:])]